@@ -75,3 +75,7 @@ class Config:
     @staticmethod
     def get_address_for_receive_seac():
         return os.environ.get('ADDRESS_FOR_RECEIVE_SEAC')
+
+    @staticmethod
+    def get_slow_query():
+        return float(os.environ.get('SLOWQUERY') or 1)
@@ -5,6 +5,7 @@ import sys
 
 from node import Node, decode_advance_area_table, decode_advance_bonus_table
 from config import Config as C
+from query import query
 
 class DB:
     def __init__(self, mysql_args):  
@@ -92,9 +93,53 @@ class DB:
         finally:
             await self.pool.release(conn)
 
+    async def execute(self, name, args=None):
+        conn, cur = await self.get_mysql_cursor()
+        try:
+            return await query.execute(cur, name, args)
+        except Exception as e:
+            logger.error("mysql {} failure:{} args:{}".format(name, e.args, args))
+            raise e
+        finally:
+            await self.pool.release(conn)
+
+    async def fetchone(self, name, args=None):
+        conn, cur = await self.get_mysql_cursor()
+        try:
+            await query.execute(cur, name, args)
+            return await cur.fetchone()
+        except Exception as e:
+            logger.error("mysql {} failure:{} args:{}".format(name, e.args, args))
+            raise e
+        finally:
+            await self.pool.release(conn)
+
+    async def fetchall(self, name, args=None):
+        conn, cur = await self.get_mysql_cursor()
+        try:
+            await query.execute(cur, name, args)
+            return await cur.fetchall()
+        except Exception as e:
+            logger.error("mysql {} failure:{} args:{}".format(name, e.args, args))
+            raise e
+        finally:
+            await self.pool.release(conn)
+
+    @staticmethod
+    def insert_statement(table, fields):
+        '''one parameterized INSERT per (table, column set), built on first use'''
+        return query.derive('%s.insert(%s)' % (table, ','.join(fields)),
+                lambda: "INSERT INTO %s(%s) VALUES (%s);" % (table, ','.join(fields), ','.join(['%s'] * len(fields))))
+
+    @staticmethod
+    def update_statement(table, fields, key):
+        '''one parameterized UPDATE ... WHERE key=%s per (table, column set, key), built on first use'''
+        return query.derive('%s.update(%s).by_%s' % (table, ','.join(fields), key),
+                lambda: "UPDATE %s SET %s WHERE %s=%%s;" % (table, ','.join(['%s=%%s' % f for f in fields]), key))
+
     async def get_status(self, name):
         try:
-            result = await self.mysql_query_one("SELECT update_height FROM status WHERE name='%s';" % name)
+            result = await self.fetchone('status.get', (name,))
             if result:
                 uh = result[0]
                 logger.info('database %s height: %s' % (name,uh))
@@ -106,33 +151,21 @@ class DB:
             raise e
 
     async def update_status(self, name, height):
-        sql = "INSERT INTO status(name,update_height) VALUES ('%s',%s) ON DUPLICATE KEY UPDATE update_height=%s;" % (name,height,height)
-        await self.mysql_insert_one(sql)
+        await self.execute('status.set', (name,height))
 
     async def insert_node(self, node_dict):
         '''插入节点'''
-        fields = []
-        values = []
-        for k in node_dict:
-            fields.append(k)
-            if isinstance(node_dict[k], str):
-                values.append("'{}'".format(node_dict[k]))
-            else:
-                values.append("{}".format(node_dict[k]))
-
-        sql = "INSERT INTO node({}) VALUES ({});".format(','.join(fields), ','.join(values))
-        await self.mysql_insert_one(sql)
+        fields = list(node_dict.keys())
+        await self.execute(self.insert_statement('node', fields), [node_dict[k] for k in fields])
 
     async def get_max_node_layer(self):
-        sql = 'SElECT max(layer) FROM node;'
-        r = await self.mysql_query_one(sql)
+        r = await self.fetchone('node.max_layer')
         if r and r[0]:
             return r[0]
         return 0
 
     async def get_node_for_bonus(self, layer):
-        sql = "SELECT id,status,referrer,address,amount,days,layer,nextbonustime,nodelevel,performance,teamlevelinfo,referrals,bonusadvancetable,areaadvancetable,burned,signin,smallareaburned FROM node WHERE layer = %s;" % layer
-        results = await self.mysql_query_many(sql)
+        results = await self.fetchall('node.by_layer', (layer,))
         nodes = []
         for r in results:
             node = Node()
@@ -160,8 +193,7 @@ class DB:
 
     async def get_node_by_address(self, address):
         '''根据地址查询节点'''
-        sql = "SELECT id,status,referrer,address,amount,days,layer,nextbonustime,nodelevel,performance,teamlevelinfo,referrals,bonusadvancetable,areaadvancetable,burned,signin,smallareaburned FROM node WHERE address = '%s';" % address
-        results = await self.mysql_query_many(sql)
+        results = await self.fetchall('node.by_address', (address,))
         for r in results:
             node = Node()
             node.id = r[0]
@@ -188,17 +220,11 @@ class DB:
 
     async def update_node_status_exit(self):
         '''节点到期，更新节点状态为-2'''
-        sql = 'UPDATE node node1, (SELECT id FROM node WHERE status=days) node2 ' \
-              'SET status=-2,nextbonustime=0 ' \
-              'WHERE node1.id=node2.id;'
-        conn, _ = await self.mysql_execute(sql)
-        if conn:
-            await self.pool.release(conn)
+        await self.execute('node.exit')
 
     async def get_nodes_by_status(self, status):
         '''根据状态查出节点'''
-        sql = "SELECT id,txid,address,amount,refundtxid,penalty FROM node WHERE status = %s;" % status
-        results = await self.mysql_query_many(sql)
+        results = await self.fetchall('node.by_status', (status,))
         nodes = []
         for r in results:
             node = {}
@@ -213,46 +239,21 @@ class DB:
 
     async def update_node_by_id(self, node_dict):
         '''更新节点数据'''
-        update_fields = []
-        for k in node_dict:
-            if k == 'id':
-                continue
-            if isinstance(node_dict[k], str):
-                update_fields.append("{}='{}'".format(k, node_dict[k]))
-            else:
-                update_fields.append("{}={}".format(k, node_dict[k]))
-
-        sql = "UPDATE node SET {} WHERE id = {};".format(','.join(update_fields), node_dict['id'])
-        conn, _ = await self.mysql_execute(sql)
-        if conn:
-            await self.pool.release(conn)
+        fields = [k for k in node_dict if k != 'id']
+        await self.execute(self.update_statement('node', fields, 'id'), [node_dict[k] for k in fields] + [node_dict['id']])
 
     async def update_node_by_address(self, node_dict):
         '''更新节点数据'''
-        update_fields = []
-        for k in node_dict:
-            if k == 'id':
-                continue
-            if isinstance(node_dict[k], str):
-                update_fields.append("{}='{}'".format(k, node_dict[k]))
-            else:
-                update_fields.append("{}={}".format(k, node_dict[k]))
-
-        sql = "UPDATE node SET {} WHERE address = '{}';".format(','.join(update_fields), node_dict['address'])
-        conn, _ = await self.mysql_execute(sql)
-        if conn:
-            await self.pool.release(conn)
+        fields = [k for k in node_dict if k != 'id']
+        await self.execute(self.update_statement('node', fields, 'address'), [node_dict[k] for k in fields] + [node_dict['address']])
 
     async def insert_node_bonus(self, address, locked_bonus, referrals_bonus, signin_bonus, team_bonus, amount, total, remain, bonus_time):
         '''插入分红记记录'''
-        sql = 'INSERT INTO node_bonus(address,lockedbonus,teambonus,amount,total,remain,bonustime,referralsbonus, signinbonus) ' \
-              'VALUES("{}","{}","{}","{}","{}","{}",{},"{}","{}");'.format(address, locked_bonus, team_bonus, amount, total, remain, bonus_time, referrals_bonus, signin_bonus)
-        await self.mysql_insert_one(sql)
+        await self.execute('node_bonus.insert', (address, str(locked_bonus), str(team_bonus), str(amount), str(total), str(remain), bonus_time, str(referrals_bonus), str(signin_bonus)))
 
     async def get_lastest_node_bonus(self, address):
         '''获得节点最新分红记录'''
-        sql = 'SELECT total,remain,bonustime,id,lockedbonus,teambonus,referralsbonus,signinbonus FROM node_bonus WHERE address="{}" ORDER BY bonustime DESC LIMIT 1;'.format(address)
-        r = await self.mysql_query_one(sql)
+        r = await self.fetchone('node_bonus.latest', (address,))
         b = {}
         if r:
             b['total'] = r[0]
@@ -267,19 +268,8 @@ class DB:
 
     async def update_node_bonus_by_id(self, node_bonus):
         '''更新节点收益表'''
-        update_fields = []
-        for k in node_bonus:
-            if k == 'id':
-                continue
-            if isinstance(node_bonus[k], str):
-                update_fields.append("{}='{}'".format(k, node_bonus[k]))
-            else:
-                update_fields.append("{}={}".format(k, node_bonus[k]))
-
-        sql = "UPDATE node_bonus SET {} WHERE id = {};".format(','.join(update_fields), node_bonus['id'])
-        conn, _ = await self.mysql_execute(sql)
-        if conn:
-            await self.pool.release(conn)
+        fields = [k for k in node_bonus if k != 'id']
+        await self.execute(self.update_statement('node_bonus', fields, 'id'), [node_bonus[k] for k in fields] + [node_bonus['id']])
 
     async def add_node_bonus(self, node, bonus_time):
         '''增加分红记录，并更新节点状态'''
@@ -323,22 +313,12 @@ class DB:
             update_field['status'] = node.status+1
             update_field['nextbonustime'] = bonus_time + C.get_bonus_interval()
 
-        update_fields = []
-        for k in update_field:
-            if isinstance(update_field[k], str):
-                update_fields.append("{}='{}'".format(k, update_field[k]))
-            else:
-                update_fields.append("{}={}".format(k, update_field[k]))
-
-        sql = "UPDATE node SET {} WHERE id = {};".format(','.join(update_fields), node.id)
-        conn, _ = await self.mysql_execute(sql)
-        if conn:
-            await self.pool.release(conn)
+        fields = list(update_field.keys())
+        await self.execute(self.update_statement('node', fields, 'id'), [update_field[k] for k in fields] + [node.id])
 
     async def get_node_updates(self):
         '''获得节点的更新数据'''
-        sql = "SELECT id,address,operation,referrer,amount,days,penalty,txid FROM node_update ORDER BY timepoint ASC;"
-        results = await self.mysql_query_many(sql)
+        results = await self.fetchall('node_update.all')
         updates = []
         for r in results:
             update = {}
@@ -355,36 +335,28 @@ class DB:
 
     async def del_node_update(self, id):
         '''删除用户节点更新记录'''
-        sql = "DELETE FROM node_update WHERE id = {};".format(id)
-        conn, _ = await self.mysql_execute(sql)
-        if conn:
-            await self.pool.release(conn)
+        await self.execute('node_update.delete', (id,))
 
     async def insert_node_withdraw(self, node_withdraw):
         '''插入收益提取记录'''
-        sql = 'INSERT INTO node_withdraw(address,txid,amount,timepoint,status) ' \
-              'VALUES("{}","{}","{}",{},{});'.format(node_withdraw['address'], node_withdraw['txid'],
-                        node_withdraw['amount'], node_withdraw['timepoint'], node_withdraw['status'])
-        await self.mysql_insert_one(sql)
+        await self.execute('node_withdraw.insert', (node_withdraw['address'], node_withdraw['txid'],
+                        str(node_withdraw['amount']), node_withdraw['timepoint'], node_withdraw['status']))
 
     async def is_txid_used(self, txid):
         '''txid是否使用过'''
-        sql = "SELECT txid from node_used_txid WHERE txid='{}';".format(txid)
-        r = await self.mysql_query_one(sql)
+        r = await self.fetchone('node_used_txid.get', (txid,))
         if r and r[0]:
             return True
         return False
 
     async def record_used_txid(self, txid, timepoint):
         '''记录使用过的txid'''
-        sql = "INSERT INTO node_used_txid(txid,timepoint) VALUES ('{}',{})".format(txid, timepoint)
-        await self.mysql_insert_one(sql)
+        await self.execute('node_used_txid.insert', (txid, timepoint))
 
     async def get_tx_history_by_txid(self, txid):
         '''获取交易历史'''
         if 64 == len(txid): txid = '0x' + txid
-        sql = "SELECT operation,address,value,asset FROM history WHERE txid='{}';".format(txid)
-        results = await self.mysql_query_many(sql)
+        results = await self.fetchall('history.by_txid', (txid,))
         histories = []
         for r in results:
             item = {
@@ -398,22 +370,12 @@ class DB:
 
     async def insert_node_update_history(self, history_dict):
         '''插入节点更新历史'''
-        fields = []
-        values = []
-        for k in history_dict:
-            fields.append(k)
-            if isinstance(history_dict[k], str):
-                values.append("'{}'".format(history_dict[k]))
-            else:
-                values.append("{}".format(history_dict[k]))
-
-        sql = "INSERT INTO node_update_history({}) VALUES ({});".format(','.join(fields), ','.join(values))
-        await self.mysql_insert_one(sql)
+        fields = list(history_dict.keys())
+        await self.execute(self.insert_statement('node_update_history', fields), [history_dict[k] for k in fields])
 
     async def get_node_withdraws_by_status(self, status):
         '''根据状态查出提现记录'''
-        sql = "SELECT id,txid,address,amount FROM node_withdraw WHERE status = %s;" % status
-        results = await self.mysql_query_many(sql)
+        results = await self.fetchall('node_withdraw.by_status', (status,))
         nodes = []
         for r in results:
             node = {}
@@ -426,37 +388,17 @@ class DB:
 
     async def update_node_withdraw_by_id(self, node_dict):
         '''更新提现记录'''
-        update_fields = []
-        for k in node_dict:
-            if k == 'id':
-                continue
-            if isinstance(node_dict[k], str):
-                update_fields.append("{}='{}'".format(k, node_dict[k]))
-            else:
-                update_fields.append("{}={}".format(k, node_dict[k]))
-
-        sql = "UPDATE node_withdraw SET {} WHERE id = {};".format(','.join(update_fields), node_dict['id'])
-        conn, _ = await self.mysql_execute(sql)
-        if conn:
-            await self.pool.release(conn)
+        fields = [k for k in node_dict if k != 'id']
+        await self.execute(self.update_statement('node_withdraw', fields, 'id'), [node_dict[k] for k in fields] + [node_dict['id']])
 
     async def del_node_bonus_by_address(self, address):
         '''删除地址分红记录'''
-        sql = "DELETE FROM node_bonus WHERE address='{}';".format(address)
-        conn, _ = await self.mysql_execute(sql)
-        if conn:
-            await self.pool.release(conn)
+        await self.execute('node_bonus.delete', (address,))
 
     async def del_node_withdraw_by_address(self, address):
         '''删除地址提现记录'''
-        sql = "DELETE FROM node_withdraw WHERE address='{}';".format(address)
-        conn, _ = await self.mysql_execute(sql)
-        if conn:
-            await self.pool.release(conn)
+        await self.execute('node_withdraw.delete', (address,))
 
     async def del_node_signature_by_address(self, address):
         '''删除地址签名'''
-        sql = "DELETE FROM node_signature WHERE address='{}';".format(address)
-        conn, _ = await self.mysql_execute(sql)
-        if conn:
-            await self.pool.release(conn)
+        await self.execute('node_signature.delete', (address,))
@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import time
+from logzero import logger
+from config import Config as C
+
+
+class Query:
+    '''
+    named, parameterized statements, same scheme as sync/Query.py: values
+    are bound by the driver, never formatted into the text.
+    statements whose columns depend on the caller (update a dict of fields)
+    are built once per column set by derive() and then reused.
+    every call is timed per name, calls slower than slow seconds are logged.
+    '''
+    def __init__(self, statements, slow=1.0):
+        self.statements = statements
+        self.slow = slow
+        self.stats = {} #name -> [calls, rows, seconds, max seconds]
+
+    def derive(self, name, build):
+        if name not in self.statements: self.statements[name] = build()
+        return name
+
+    def record(self, name, cost, rows, args=None):
+        s = self.stats.get(name)
+        if s is None: s = self.stats[name] = [0, 0, 0.0, 0.0]
+        s[0] += 1
+        s[1] += rows
+        s[2] += cost
+        if cost > s[3]: s[3] = cost
+        if cost > self.slow:
+            logger.warning('slow query %s %.3fs %s rows: %s %s' % (name, cost, rows, self.statements[name], '' if args is None else str(args)[:200]))
+
+    async def execute(self, cur, name, args=None):
+        time_a = time.time()
+        try:
+            await cur.execute(self.statements[name], args)
+        finally:
+            self.record(name, time.time() - time_a, max(cur.rowcount, 0), args)
+        return cur.rowcount
+
+    def log(self):
+        top = sorted(self.stats.items(), key=lambda kv: kv[1][2], reverse=True)[:10]
+        if not top: return
+        logger.info('queries: %s' % ', '.join('%s calls=%s rows=%s total=%.3fs max=%.3fs' % ((name,) + tuple(s)) for name,s in top))
+
+
+STATEMENTS = {
+    'status.get':               "SELECT update_height FROM status WHERE name=%s;",
+    'status.set':               "INSERT INTO status(name,update_height) VALUES (%s,%s) ON DUPLICATE KEY UPDATE update_height=VALUES(update_height);",
+    'node.max_layer':           "SELECT max(layer) FROM node;",
+    'node.by_layer':            "SELECT id,status,referrer,address,amount,days,layer,nextbonustime,nodelevel,performance,teamlevelinfo,referrals,bonusadvancetable,areaadvancetable,burned,signin,smallareaburned FROM node WHERE layer=%s;",
+    'node.by_address':          "SELECT id,status,referrer,address,amount,days,layer,nextbonustime,nodelevel,performance,teamlevelinfo,referrals,bonusadvancetable,areaadvancetable,burned,signin,smallareaburned FROM node WHERE address=%s;",
+    'node.exit':                "UPDATE node node1, (SELECT id FROM node WHERE status=days) node2 SET status=-2,nextbonustime=0 WHERE node1.id=node2.id;",
+    'node.by_status':           "SELECT id,txid,address,amount,refundtxid,penalty FROM node WHERE status=%s;",
+    'node_bonus.insert':        "INSERT INTO node_bonus(address,lockedbonus,teambonus,amount,total,remain,bonustime,referralsbonus,signinbonus) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s);",
+    'node_bonus.latest':        "SELECT total,remain,bonustime,id,lockedbonus,teambonus,referralsbonus,signinbonus FROM node_bonus WHERE address=%s ORDER BY bonustime DESC LIMIT 1;",
+    'node_bonus.delete':        "DELETE FROM node_bonus WHERE address=%s;",
+    'node_update.all':          "SELECT id,address,operation,referrer,amount,days,penalty,txid FROM node_update ORDER BY timepoint ASC;",
+    'node_update.delete':       "DELETE FROM node_update WHERE id=%s;",
+    'node_withdraw.insert':     "INSERT INTO node_withdraw(address,txid,amount,timepoint,status) VALUES (%s,%s,%s,%s,%s);",
+    'node_withdraw.by_status':  "SELECT id,txid,address,amount FROM node_withdraw WHERE status=%s;",
+    'node_withdraw.delete':     "DELETE FROM node_withdraw WHERE address=%s;",
+    'node_signature.delete':    "DELETE FROM node_signature WHERE address=%s;",
+    'node_used_txid.get':       "SELECT txid FROM node_used_txid WHERE txid=%s;",
+    'node_used_txid.insert':    "INSERT INTO node_used_txid(txid,timepoint) VALUES (%s,%s);",
+    'history.by_txid':          "SELECT operation,address,value,asset FROM history WHERE txid=%s;",
+}
+
+query = Query(STATEMENTS, C.get_slow_query())
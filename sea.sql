@@ -64,15 +64,43 @@ CREATE TABLE IF NOT EXISTS balance (
   INDEX idx_asset_value_address (asset, value, address)
 );
 
+CREATE TABLE IF NOT EXISTS ledger (
+  id INT UNSIGNED AUTO_INCREMENT,
+  address VARCHAR(34) NOT NULL,
+  asset VARCHAR(64) NOT NULL,
+  units DECIMAL(65,0) NOT NULL,	#integer base units
+  height INT UNSIGNED NOT NULL,	#last height applied
+  PRIMARY KEY (id),
+  UNIQUE INDEX uidx_address_asset (address, asset)
+);
+
+CREATE TABLE IF NOT EXISTS ledger_flag (
+  id INT UNSIGNED AUTO_INCREMENT,
+  name VARCHAR(20) NOT NULL,	#the crawler keeping the ledger
+  asset VARCHAR(64) NOT NULL,	#balances refreshed through upt instead
+  PRIMARY KEY (id),
+  UNIQUE INDEX uidx_name_asset (name, asset)
+);
+
 CREATE TABLE IF NOT EXISTS upt (
   id INT UNSIGNED AUTO_INCREMENT,
   address VARCHAR(34) NOT NULL,
   asset VARCHAR(64) NOT NULL,
   update_height INT UNSIGNED NOT NULL,
   chain VARCHAR(20) DEFAULT 'NEO' NOT NULL,
+  since INT UNSIGNED DEFAULT 0 NOT NULL,	#height it became stale at
+  requested INT UNSIGNED DEFAULT 0 NOT NULL,	#unix time of the last api request
+  changed TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (id),
-  UNIQUE INDEX uidx_address_asset (address, asset)
+  UNIQUE INDEX uidx_address_asset (address, asset),
+  INDEX idx_chain_update_height (chain, update_height),
+  INDEX idx_chain_changed (chain, changed)
 );
+#upgrade an older upt:
+#ALTER TABLE upt ADD COLUMN since INT UNSIGNED DEFAULT 0 NOT NULL, ADD COLUMN requested INT UNSIGNED DEFAULT 0 NOT NULL,
+#  ADD COLUMN changed TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+#  ADD INDEX idx_chain_update_height (chain, update_height), ADD INDEX idx_chain_changed (chain, changed);
+#UPDATE upt SET since=update_height;
 
 CREATE TABLE IF NOT EXISTS status (
   id INT UNSIGNED AUTO_INCREMENT,
@@ -112,3 +140,18 @@ CREATE TABLE IF NOT EXISTS oep4_history (
   INDEX idx_address_asset_timepoint (address, asset, timepoint),
   INDEX idx_address_dest_asset_op_timepoint (address, dest, asset, operation, timepoint)
 );
+
+CREATE TABLE IF NOT EXISTS dead_letter (
+  id INT UNSIGNED AUTO_INCREMENT,
+  name VARCHAR(20) NOT NULL,	#crawler
+  kind VARCHAR(10) NOT NULL,	#block, tx or events
+  item VARCHAR(66) NOT NULL,	#height or txid
+  height INT UNSIGNED NOT NULL,
+  error VARCHAR(256) NOT NULL,
+  attempts INT UNSIGNED DEFAULT 1 NOT NULL,
+  resolved TINYINT UNSIGNED DEFAULT 0 NOT NULL,
+  last_failed TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (id),
+  UNIQUE INDEX uidx_name_kind_item (name, kind, item),
+  INDEX idx_name_resolved_height (name, resolved, height)
+);
@@ -0,0 +1,107 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import dbm
+import zlib
+import asyncio
+from binascii import unhexlify
+from logzero import logger
+from RpcClient import RpcError
+from Retry import Retry
+from Codec import codec
+from Metrics import metrics
+
+
+class AppLog:
+    '''
+    application logs of InvocationTransactions by txid, reduced to what the
+    crawlers read: {'txid', 'vmstate', 'notifications'}.
+    from the nodes of the rpc pool when it is given (getapplicationlog in
+    batches, needs the ApplicationLogs plugin), else from the supernode
+    /{net}/log/{txid}, at most concurrency requests at once.
+    with a path every log fetched is kept in a dbm file (zlib compressed
+    json), a resync reads them from there instead of asking again.
+    a log nobody has is left out of the result. counters applog.hits,
+    applog.fetched and applog.missing.
+    '''
+    def __init__(self, session, super_node_uri, net, rpc=None, concurrency=10, path=None, retries=3, deadline=180):
+        self.session = session
+        self.super_node_uri = super_node_uri
+        self.net = net
+        self.rpc = rpc
+        self.sem = asyncio.Semaphore(value=max(1, concurrency))
+        self.retry = Retry('applog', retries, 0.5, 30, deadline)
+        self.store = dbm.open(path, 'c') if path else None
+
+    @staticmethod
+    def key(txid):
+        if txid.startswith('0x'): txid = txid[2:]
+        return unhexlify(txid)
+
+    @staticmethod
+    def compact(txid, j):
+        '''both the flat and the executions (ApplicationLogs 2.9+) format'''
+        if 'executions' in j.keys(): j = j['executions'][0] if j['executions'] else {}
+        return {'txid':txid, 'vmstate':j.get('vmstate', ''), 'notifications':j.get('notifications', [])}
+
+    def load(self, txid):
+        if self.store is None: return None
+        v = self.store.get(self.key(txid))
+        if v is None: return None
+        return codec.loads(zlib.decompress(v))
+
+    def save(self, txid, log):
+        if self.store is None: return
+        self.store[self.key(txid)] = zlib.compress(codec.dumps(log))
+
+    async def get_from_super_node(self, txid):
+        url = '%s/%s/log/%s' % (self.super_node_uri, self.net, txid)
+        async def attempt():
+            async with self.sem:
+                async with self.session.get(url, timeout=120) as resp:
+                    if resp.status >= 500: raise RpcError('visit {} get http status {}'.format(url, resp.status))
+                    if 200 != resp.status: return None
+                    j = codec.loads(await resp.read())
+                    return None if 'error' in j.keys() else j
+        return await self.retry.run(attempt)
+
+    async def get_from_node(self, txids):
+        try:
+            return await self.rpc.batch('getapplicationlog', [[txid] for txid in txids])
+        except Exception as e:
+            #one unknown txid fails its whole chunk, find it
+            logger.warning('get {} application logs failure: {}, get them one by one'.format(len(txids), e))
+            async def one(txid):
+                async with self.sem:
+                    return await self.rpc.call('getapplicationlog', [txid])
+            return await asyncio.gather(*[one(txid) for txid in txids], return_exceptions=True)
+
+    async def get_many(self, txids):
+        '''{txid:log} of the txids a log was found for'''
+        logs = {}
+        missing = []
+        for txid in txids:
+            log = self.load(txid)
+            if log is None: missing.append(txid)
+            else: logs[txid] = log
+        metrics.incr('applog.hits', len(logs))
+        if not missing: return logs
+        if self.rpc is not None:
+            results = await self.get_from_node(missing)
+        else:
+            results = await asyncio.gather(*[self.get_from_super_node(txid) for txid in missing], return_exceptions=True)
+        for txid, j in zip(missing, results):
+            if isinstance(j, Exception) or not isinstance(j, dict):
+                if isinstance(j, Exception): logger.error('get application log of {} failure: {}'.format(txid, j))
+                metrics.incr('applog.missing')
+                continue
+            logs[txid] = self.compact(txid, j)
+            self.save(txid, logs[txid])
+            metrics.incr('applog.fetched')
+        return logs
+
+    def close(self):
+        if self.store is not None: self.store.close()
+        self.store = None
@@ -0,0 +1,73 @@
+import os
+import unittest
+import asyncio
+import shutil
+import tempfile
+
+from AppLog import AppLog
+from RpcClient import RpcError
+from Metrics import metrics
+
+loop = asyncio.new_event_loop()
+
+def async_test(coro):
+    def wrapper(*args, **kwargs):
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+def txid(i):
+    return '0x%064x' % i
+
+def log(i):
+    '''ApplicationLogs 2.9+ format'''
+    return {'txid':txid(i), 'executions':[{'vmstate':'HALT, BREAK', 'notifications':[{'contract':'0x%040x' % i, 'state':{'type':'Array', 'value':[]}}]}]}
+
+
+class FakeRpc:
+    '''knows the logs of the txids in logs, a batch with any other fails as a whole'''
+    def __init__(self, logs):
+        self.logs = logs
+        self.calls = 0
+
+    async def call(self, method, params):
+        self.calls += 1
+        if params[0] not in self.logs: raise RpcError('unknown transaction')
+        return self.logs[params[0]]
+
+    async def batch(self, method, params_list):
+        self.calls += 1
+        if any(p[0] not in self.logs for p in params_list): raise RpcError('unknown transaction')
+        return [self.logs[p[0]] for p in params_list]
+
+
+class TestAppLog(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_compact(self):
+        self.assertEqual({'txid':txid(1), 'vmstate':'HALT, BREAK', 'notifications':log(1)['executions'][0]['notifications']}, AppLog.compact(txid(1), log(1)))
+        self.assertEqual({'txid':txid(2), 'vmstate':'FAULT', 'notifications':[]}, AppLog.compact(txid(2), {'txid':txid(2), 'vmstate':'FAULT'}))
+
+    @async_test
+    async def test_store_and_missing(self):
+        rpc = FakeRpc({txid(i):log(i) for i in range(3)})
+        path = os.path.join(self.path, 'logs')
+        a = AppLog(None, None, 'testnet', rpc, path=path)
+        logs = await a.get_many([txid(i) for i in range(4)])
+        self.assertEqual([txid(i) for i in range(3)], sorted(logs.keys()))
+        self.assertEqual('HALT, BREAK', logs[txid(2)]['vmstate'])
+        a.close()
+        rpc.calls = 0
+        a = AppLog(None, None, 'testnet', rpc, path=path)
+        hits = metrics.counters.get('applog.hits', 0)
+        self.assertEqual(logs, await a.get_many([txid(i) for i in range(3)]))
+        self.assertEqual(0, rpc.calls)
+        self.assertEqual(hits + 3, metrics.counters['applog.hits'])
+        a.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import asyncio
+from logzero import logger
+from CommonTool import CommonTool as CT
+from Metrics import metrics
+
+
+class AssetRegistry:
+    '''
+    decimals and type of every asset (hex id without 0x) for all crawlers of
+    a process. loaded from the assets table by refresh() in prepare(),
+    afterwards the rows with a greater id are read when an unknown asset
+    shows up, at most once per REFRESH seconds. what the table does not
+    have comes from fetch(asset), a contract whose fetch gives None (FAULT,
+    not a token) is remembered for NEGATIVE_TTL seconds; without a fetch
+    nothing is remembered, the asset may be inserted by another crawler
+    any moment. concurrent lookups of one asset
+    share one fetch. counters registry.hits, registry.fetches and
+    registry.negative_hits.
+    '''
+    REFRESH = 5
+    NEGATIVE_TTL = 600
+
+    def __init__(self):
+        self.decimals = {}
+        self.types = {}
+        self.negative = {} #asset -> expiry
+        self.pending = {} #asset -> future of its fetch
+        self.last_id = 0
+        self.refreshed = None
+
+    def __len__(self):
+        return len(self.decimals)
+
+    def set(self, asset, decimals, type=None):
+        self.decimals[asset] = decimals
+        if type is not None: self.types[asset] = type
+        self.negative.pop(asset, None)
+
+    def load(self, rows):
+        '''rows of (id, asset, type, decimals)'''
+        for r in rows:
+            self.set(r[1], int(r[3]), r[2])
+            self.last_id = max(self.last_id, r[0])
+
+    async def refresh(self, crawler):
+        self.refreshed = CT.now()
+        rows = await crawler.mysql_fetchall('assets.since', (self.last_id,))
+        if rows:
+            self.load(rows)
+            logger.info('asset registry: %s assets, last id %s' % (len(self.decimals), self.last_id))
+
+    async def get_decimals(self, crawler, asset, fetch=None):
+        '''None for an asset with no decimals, crawler runs the assets.since query'''
+        if asset in self.decimals:
+            metrics.incr('registry.hits')
+            return self.decimals[asset]
+        if self.negative.get(asset, 0) > CT.now():
+            metrics.incr('registry.negative_hits')
+            return None
+        if asset not in self.pending:
+            self.pending[asset] = asyncio.ensure_future(self.lookup(crawler, asset, fetch))
+        try:
+            return await asyncio.shield(self.pending[asset])
+        finally:
+            if self.pending.get(asset) is not None and self.pending[asset].done(): del self.pending[asset]
+
+    async def lookup(self, crawler, asset, fetch):
+        if self.refreshed is None or CT.now() - self.refreshed >= self.REFRESH:
+            await self.refresh(crawler)
+            if asset in self.decimals: return self.decimals[asset]
+        if fetch is None: return None
+        metrics.incr('registry.fetches')
+        decimals = await fetch(asset)
+        if decimals is None:
+            self.negative[asset] = CT.now() + self.NEGATIVE_TTL
+            return None
+        self.decimals[asset] = decimals
+        return decimals
+
+
+registry = AssetRegistry()
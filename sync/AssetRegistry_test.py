@@ -0,0 +1,75 @@
+import unittest
+import asyncio
+
+from AssetRegistry import AssetRegistry
+
+loop = asyncio.new_event_loop()
+
+def async_test(coro):
+    def wrapper(*args, **kwargs):
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+
+class FakeCrawler:
+    '''assets table of rows (id, asset, type, decimals)'''
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    async def mysql_fetchall(self, name, args=None):
+        self.queries += 1
+        return [r for r in self.rows if r[0] > args[0]]
+
+
+class FakeFetch:
+    def __init__(self, decimals):
+        self.decimals = decimals
+        self.calls = []
+
+    async def __call__(self, asset):
+        self.calls.append(asset)
+        await asyncio.sleep(0.01)
+        return self.decimals.get(asset)
+
+
+class TestAssetRegistry(unittest.TestCase):
+    @async_test
+    async def test_load_and_refresh(self):
+        r = AssetRegistry()
+        c = FakeCrawler([(1, 'a' * 40, 'NEP5', 8), (2, 'b' * 40, 'NEP5', 0)])
+        self.assertEqual(0, await r.get_decimals(c, 'b' * 40))
+        self.assertEqual((1, 2, 'NEP5'), (c.queries, r.last_id, r.types['a' * 40]))
+        c.rows.append((3, 'c' * 40, 'OEP4', 9))
+        r.refreshed -= r.REFRESH
+        self.assertEqual(9, await r.get_decimals(c, 'c' * 40))
+        self.assertEqual(2, c.queries)
+
+    @async_test
+    async def test_fetch_coalesced_and_negative(self):
+        r = AssetRegistry()
+        c = FakeCrawler([])
+        f = FakeFetch({'d' * 40: 2})
+        results = await asyncio.gather(*[r.get_decimals(c, a, f) for a in ['d' * 40, 'd' * 40, 'e' * 40, 'e' * 40]])
+        self.assertEqual([2, 2, None, None], results)
+        self.assertEqual(['d' * 40, 'e' * 40], f.calls)
+        self.assertIsNone(await r.get_decimals(c, 'e' * 40, f)) #remembered
+        self.assertEqual(2, len(f.calls))
+        r.negative['e' * 40] = 0
+        f.decimals['e' * 40] = 4
+        self.assertEqual(4, await r.get_decimals(c, 'e' * 40, f))
+        self.assertEqual(1, c.queries)
+
+    @async_test
+    async def test_table_only_not_remembered(self):
+        r = AssetRegistry()
+        c = FakeCrawler([])
+        await r.refresh(c) #prepare()
+        self.assertIsNone(await r.get_decimals(c, 'f' * 40))
+        c.rows.append((1, 'f' * 40, 'OEP4', 6)) #inserted by OEP4History
+        r.refreshed -= r.REFRESH
+        self.assertEqual(6, await r.get_decimals(c, 'f' * 40))
+
+
+if __name__ == '__main__':
+    unittest.main()
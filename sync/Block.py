@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+'''
+compact NEO block model held in Crawler.cache instead of the getblock json.
+only what the handlers read is kept: scripts, witnesses, attributes and
+the rest of the json are dropped while decoding, tx scripts are kept for
+contract deploys only. to_json gives back a subset of the verbose json,
+from_json reads both. the BlockStore keeps the verbose json as fetched.
+'''
+
+import sys
+from collections import namedtuple
+
+
+Coin = namedtuple('Coin', 'txid vout') #a vin or a claim
+Vout = namedtuple('Vout', 'n asset value address')
+
+CREATE = '68134e656f2e436f6e74726163742e437265617465' #SYSCALL Neo.Contract.Create
+
+intern = sys.intern
+
+
+def vouts_from_json(vouts):
+    return tuple(Vout(v['n'], intern(v['asset']), v['value'], v['address']) for v in vouts)
+
+def is_deploy(script):
+    return script is not None and script.endswith(CREATE)
+
+
+class Tx:
+    __slots__ = ('txid', 'type', 'sys_fee', 'vin', 'vout', 'claims', 'script', 'asset')
+
+    def __init__(self, txid, type, sys_fee=0, vin=(), vout=(), claims=(), script=None, asset=None):
+        self.txid = txid
+        self.type = type
+        self.sys_fee = sys_fee #int GAS
+        self.vin = vin
+        self.vout = vout
+        self.claims = claims
+        self.script = script #InvocationTransaction deploying a contract
+        self.asset = asset #RegisterTransaction
+
+    @classmethod
+    def from_json(cls, d):
+        script = d.get('script')
+        return cls(d['txid'], intern(d['type']), int(float(d['sys_fee'])),
+                tuple(Coin(v['txid'], v['vout']) for v in d['vin']),
+                vouts_from_json(d['vout']),
+                tuple(Coin(c['txid'], c['vout']) for c in d.get('claims', ())),
+                script if is_deploy(script) else None,
+                d.get('asset'))
+
+    def to_json(self):
+        d = {'txid':self.txid, 'type':self.type, 'sys_fee':str(self.sys_fee),
+                'vin':[c._asdict() for c in self.vin],
+                'vout':[v._asdict() for v in self.vout]}
+        if self.claims: d['claims'] = [c._asdict() for c in self.claims]
+        if self.script is not None: d['script'] = self.script
+        if self.asset is not None: d['asset'] = self.asset
+        return d
+
+
+class Block:
+    __slots__ = ('index', 'time', 'size', 'tx', 'sys_fee', 'total_sys_fee')
+
+    def __init__(self, index, time, size, tx):
+        self.index = index
+        self.time = time
+        self.size = size
+        self.tx = tx
+        self.sys_fee = None #set by UTXO.update_sys_fee
+        self.total_sys_fee = None
+
+    @classmethod
+    def from_json(cls, d):
+        return cls(d['index'], d['time'], d.get('size', 0), tuple(Tx.from_json(tx) for tx in d['tx']))
+
+    def to_json(self):
+        return {'index':self.index, 'time':self.time, 'size':self.size, 'tx':[tx.to_json() for tx in self.tx]}
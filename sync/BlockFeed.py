@@ -0,0 +1,54 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import asyncio
+
+
+class BlockFeed:
+    '''
+    share fetched blocks between the handlers of one process.
+    a block is fetched once and kept until every handler close enough to
+    need it (start <= height < start+keep) has released it; a handler
+    trailing by more than keep blocks fetches on its own (from the
+    BlockStore when configured) and never holds the others back.
+    '''
+    def __init__(self, fetch, keep):
+        self.fetch = fetch
+        self.keep = keep
+        self.positions = {}
+        self.blocks = {} #height -> [future, index in future result, names of handlers waiting]
+
+    def register(self, name, start):
+        self.positions[name] = start
+
+    def waiting_for(self, height):
+        return set([n for n,p in self.positions.items() if p <= height < p + self.keep])
+
+    async def get_blocks(self, name, heights):
+        missing = [h for h in heights if h not in self.blocks.keys()]
+        if missing:
+            future = asyncio.ensure_future(self.fetch(missing))
+            for i in range(len(missing)):
+                self.blocks[missing[i]] = [future, i, self.waiting_for(missing[i])]
+        entries = [self.blocks[h] for h in heights]
+        for entry in entries: entry[2].add(name)
+        try:
+            return [(await entry[0])[entry[1]] for entry in entries]
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            for h in heights:
+                f = self.blocks[h][0] if h in self.blocks.keys() else None
+                if f is not None and f.done() and (f.cancelled() or f.exception() is not None):
+                    del self.blocks[h]
+            raise
+
+    def release(self, name, heights):
+        self.positions[name] = max(heights) + 1
+        for h in heights:
+            entry = self.blocks.get(h)
+            if entry is None: continue
+            entry[2].discard(name)
+            if not entry[2]: del self.blocks[h]
@@ -0,0 +1,64 @@
+import unittest
+import asyncio
+
+from BlockFeed import BlockFeed
+
+loop = asyncio.new_event_loop()
+
+def async_test(coro):
+    def wrapper(*args, **kwargs):
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+
+class TestBlockFeed(unittest.TestCase):
+    def setUp(self):
+        self.fetched = []
+
+    async def fetch(self, heights):
+        self.fetched.extend(heights)
+        await asyncio.sleep(0)
+        return [{'index':h} for h in heights]
+
+    @async_test
+    async def test_fetch_once(self):
+        feed = BlockFeed(self.fetch, 100)
+        feed.register('utxo', 0)
+        feed.register('history', 0)
+        a, b = await asyncio.gather(feed.get_blocks('utxo', [0,1,2]), feed.get_blocks('history', [0,1,2]))
+        self.assertEqual([{'index':h} for h in range(3)], a)
+        self.assertIs(a[0], b[0])
+        self.assertEqual([0,1,2], self.fetched)
+        feed.release('utxo', [0,1,2])
+        self.assertEqual(3, len(feed.blocks))
+        feed.release('history', [0,1,2])
+        self.assertEqual(0, len(feed.blocks))
+
+    @async_test
+    async def test_lagging_handler(self):
+        feed = BlockFeed(self.fetch, 10)
+        feed.register('utxo', 1000)
+        feed.register('asset', 0)
+        await feed.get_blocks('utxo', [1000,1001])
+        feed.release('utxo', [1000,1001])
+        self.assertEqual(0, len(feed.blocks))
+        await feed.get_blocks('asset', [0,1])
+        self.assertEqual(2, len(feed.blocks))
+        feed.release('asset', [0,1])
+        self.assertEqual(0, len(feed.blocks))
+
+    @async_test
+    async def test_failure(self):
+        async def broken(heights):
+            raise ValueError('node down')
+        feed = BlockFeed(broken, 10)
+        feed.register('utxo', 0)
+        with self.assertRaises(ValueError):
+            await feed.get_blocks('utxo', [0,1])
+        self.assertEqual(0, len(feed.blocks))
+        feed.fetch = self.fetch
+        self.assertEqual([{'index':0},{'index':1}], await feed.get_blocks('utxo', [0,1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import os
+import zlib
+import mmap
+import fcntl
+import struct
+from collections import OrderedDict
+from Codec import codec
+
+fdatasync = getattr(os, 'fdatasync', os.fsync)
+
+
+class BlockStore:
+    '''
+    append-only local block store shared by every crawler on the host.
+    heights are grouped into segments of SEGMENT_BLOCKS, each segment has
+    NNNNNNNN.dat: zlib compressed json blocks appended in fetch order
+    NNNNNNNN.idx: one (offset, length) record per height, length 0 means missing
+    writers serialize on flock(.dat), readers mmap both files. only the
+    open_segments most recently used stay open, a resync touches hundreds.
+    '''
+    SEGMENT_BLOCKS = 10000
+    RECORD = struct.Struct('<QI')
+
+    def __init__(self, path, level=6, open_segments=8):
+        self.path = path
+        self.level = level
+        self.open_segments = max(1, open_segments)
+        self.segments = OrderedDict()
+        os.makedirs(path, exist_ok=True)
+
+    def segment_path(self, seg, ext):
+        return os.path.join(self.path, '%08d.%s' % (seg, ext))
+
+    def open_segment(self, seg):
+        if seg in self.segments:
+            self.segments.move_to_end(seg)
+            return self.segments[seg]
+        while len(self.segments) >= self.open_segments:
+            self.close_segment(self.segments.popitem(last=False)[1])
+        idx_size = self.SEGMENT_BLOCKS * self.RECORD.size
+        idx_fd = os.open(self.segment_path(seg, 'idx'), os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(idx_fd).st_size < idx_size: os.ftruncate(idx_fd, idx_size)
+        dat_fd = os.open(self.segment_path(seg, 'dat'), os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        s = {'idx_fd':idx_fd, 'dat_fd':dat_fd, 'idx':mmap.mmap(idx_fd, idx_size), 'dat':None}
+        self.segments[seg] = s
+        return s
+
+    def locate(self, height):
+        seg, slot = divmod(height, self.SEGMENT_BLOCKS)
+        s = self.open_segment(seg)
+        offset, length = self.RECORD.unpack_from(s['idx'], slot * self.RECORD.size)
+        return s, slot, offset, length
+
+    def has(self, height):
+        return self.locate(height)[3] > 0
+
+    def get(self, height):
+        s, slot, offset, length = self.locate(height)
+        if 0 == length: return None
+        if s['dat'] is None or offset + length > len(s['dat']):
+            if s['dat'] is not None: s['dat'].close()
+            s['dat'] = mmap.mmap(s['dat_fd'], 0, access=mmap.ACCESS_READ)
+        return codec.loads(zlib.decompress(s['dat'][offset:offset+length]))
+
+    def put(self, height, block):
+        return height in self.put_many({height:block})
+
+    def get_many(self, heights):
+        return {h:b for h,b in ((h, self.get(h)) for h in heights) if b is not None}
+
+    def missing(self, s, heights):
+        return [h for h in heights if 0 == self.RECORD.unpack_from(s['idx'], h % self.SEGMENT_BLOCKS * self.RECORD.size)[1]]
+
+    def put_many(self, blocks):
+        '''heights written, the others were there already; one flock and one fdatasync per segment'''
+        segs = {}
+        for h in sorted(blocks): segs.setdefault(h // self.SEGMENT_BLOCKS, []).append(h)
+        written = []
+        for seg, heights in sorted(segs.items()):
+            s = self.open_segment(seg)
+            data = {h:zlib.compress(codec.dumps(blocks[h]), self.level) for h in self.missing(s, heights)}
+            if not data: continue
+            fcntl.flock(s['dat_fd'], fcntl.LOCK_EX)
+            try:
+                heights = self.missing(s, data.keys()) #not written by another crawler meanwhile
+                if not heights: continue
+                offset = os.lseek(s['dat_fd'], 0, os.SEEK_END)
+                buf = memoryview(b''.join(data[h] for h in heights))
+                while buf: buf = buf[os.write(s['dat_fd'], buf):]
+                #data on disk first, index last: a crash never leaves an index entry pointing at garbage
+                fdatasync(s['dat_fd'])
+                for h in heights:
+                    os.pwrite(s['idx_fd'], self.RECORD.pack(offset, len(data[h])), h % self.SEGMENT_BLOCKS * self.RECORD.size)
+                    offset += len(data[h])
+                written.extend(heights)
+            finally:
+                fcntl.flock(s['dat_fd'], fcntl.LOCK_UN)
+        return written
+
+    @staticmethod
+    def close_segment(s):
+        s['idx'].close()
+        if s['dat'] is not None: s['dat'].close()
+        os.close(s['idx_fd'])
+        os.close(s['dat_fd'])
+
+    def close(self):
+        for s in self.segments.values(): self.close_segment(s)
+        self.segments = OrderedDict()
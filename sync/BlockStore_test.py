@@ -0,0 +1,62 @@
+import unittest
+import shutil
+import tempfile
+
+from BlockStore import BlockStore
+
+
+def fake_block(height):
+    return {'index':height, 'time':1500000000+height, 'tx':[{'txid':'0x%064x' % height, 'type':'MinerTransaction', 'vin':[], 'vout':[]}]}
+
+
+class TestBlockStore(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_put_get(self):
+        s = BlockStore(self.path)
+        self.assertIsNone(s.get(5))
+        self.assertTrue(s.put(5, fake_block(5)))
+        self.assertFalse(s.put(5, fake_block(6)))
+        self.assertEqual(fake_block(5), s.get(5))
+        self.assertFalse(s.has(4))
+        s.close()
+
+    def test_segments_and_reopen(self):
+        s = BlockStore(self.path)
+        heights = [0, 1, BlockStore.SEGMENT_BLOCKS-1, BlockStore.SEGMENT_BLOCKS, 3*BlockStore.SEGMENT_BLOCKS+7]
+        s.put_many({h:fake_block(h) for h in reversed(heights)})
+        s.close()
+        s = BlockStore(self.path)
+        self.assertEqual({h:fake_block(h) for h in heights}, s.get_many(heights + [2]))
+        s.close()
+
+    def test_open_segments_bounded(self):
+        s = BlockStore(self.path, open_segments=2)
+        heights = [i * BlockStore.SEGMENT_BLOCKS + i for i in range(5)]
+        self.assertEqual(heights, s.put_many({h:fake_block(h) for h in heights}))
+        self.assertEqual(2, len(s.segments))
+        self.assertEqual({h:fake_block(h) for h in heights}, s.get_many(heights))
+        self.assertEqual([heights[1]+1], s.put_many({heights[1]:fake_block(0), heights[1]+1:fake_block(1)}))
+        self.assertEqual(fake_block(heights[1]), s.get(heights[1]))
+        self.assertEqual(2, len(s.segments))
+        s.close()
+
+    def test_shared(self):
+        reader = BlockStore(self.path)
+        writer = BlockStore(self.path)
+        self.assertIsNone(reader.get(1))
+        writer.put(0, fake_block(0))
+        self.assertEqual(fake_block(0), reader.get(0))
+        writer.put(1, fake_block(1))
+        self.assertEqual(fake_block(1), reader.get(1))
+        self.assertFalse(reader.put(1, fake_block(1)))
+        reader.close()
+        writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import shutil
+import asyncio
+import tempfile
+import unittest
+
+from Block import Block, Coin, Vout, CREATE
+from RawBlock import parse_block, NEO, GAS
+from RawBlock_test import block, miner, contract, invocation, claim, SPENT
+from BlockStore import BlockStore
+from Crawler import Crawler
+
+
+class FakeNode:
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+    async def batch(self, method, params, min_height=None):
+        return [self.blocks[p[0]] for p in params]
+
+
+class StoreCrawler(Crawler):
+    '''Crawler with compact blocks, a BlockStore and no node but FakeNode'''
+    def __init__(self, path, blocks):
+        self.compact_blocks = True
+        self.raw_blocks = False
+        self.store = BlockStore(path)
+        self.rpc = FakeNode(blocks)
+
+
+class TestBlock(unittest.TestCase):
+    def verbose(self):
+        raw, header = block(9, [miner(1), contract(), invocation(2 * 10**8), claim()])
+        return parse_block(raw)
+
+    def test_from_json(self):
+        d = self.verbose()
+        b = Block.from_json(d)
+        self.assertEqual((9, d['time'], d['size']), (b.index, b.time, b.size))
+        self.assertEqual([tx['txid'] for tx in d['tx']], [tx.txid for tx in b.tx])
+        c = b.tx[1]
+        self.assertEqual((Coin('0x' + SPENT[::-1].hex(), 3),), c.vin)
+        self.assertEqual([Vout(0, NEO, '5', d['tx'][1]['vout'][0]['address']), Vout(1, GAS, '1.5', d['tx'][1]['vout'][1]['address'])], list(c.vout))
+        self.assertEqual(((), None, None), (c.claims, c.script, c.asset))
+        self.assertEqual(2, b.tx[2].sys_fee)
+        self.assertIsNone(b.tx[2].script) #not a deploy, dropped
+        self.assertEqual(2, len(b.tx[3].claims))
+        self.assertIsNone(b.sys_fee)
+
+    def test_deploy_script_is_kept(self):
+        d = self.verbose()
+        d['tx'][2]['script'] += CREATE
+        self.assertEqual(d['tx'][2]['script'], Block.from_json(d).tx[2].script)
+
+    def test_round_trip(self):
+        b = Block.from_json(self.verbose())
+        j = b.to_json()
+        self.assertNotIn('scripts', j['tx'][1])
+        self.assertEqual(j, Block.from_json(j).to_json())
+
+
+class TestStoredBlock(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_store_keeps_verbose(self):
+        raw, header = block(9, [miner(1), contract(), invocation(2 * 10**8), claim()])
+        d = parse_block(raw)
+        c = StoreCrawler(self.path, {9:d})
+        loop = asyncio.new_event_loop()
+        b = loop.run_until_complete(c.get_blocks([9]))[0]
+        self.assertIsInstance(b, Block)
+        self.assertEqual(d, c.store.get(9)) #scripts and all, not to_json
+        c.rpc.blocks = {}
+        b2 = loop.run_until_complete(c.get_blocks([9]))[0]
+        self.assertEqual(b.to_json(), b2.to_json())
+        c.store.close()
+        loop.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
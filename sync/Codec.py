@@ -0,0 +1,58 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import json
+import importlib
+from decimal import Decimal
+from Config import Config as C
+
+
+def default(o):
+    '''Decimal as its plain string, like every amount in the api; other objects as their __dict__'''
+    if isinstance(o, Decimal): return format(o, 'f')
+    return o.__dict__
+
+
+class Codec:
+    '''
+    json codec: the first of BACKENDS installed (JSONCODEC picks one).
+    loads takes the response bytes as they are, dumps returns utf-8 bytes.
+    ujson is used for decoding only, its Decimal handling differs.
+    what the fast backend can not handle (integers beyond 64 bits) goes
+    through the standard library.
+    '''
+    BACKENDS = ['orjson', 'ujson', 'json']
+
+    def __init__(self, prefer=None):
+        self.use(prefer)
+
+    def use(self, prefer=None):
+        for name in ([prefer] if prefer else []) + self.BACKENDS:
+            try:
+                self.module = importlib.import_module(name)
+                self.name = name
+                break
+            except ImportError:
+                pass
+        if 'orjson' == self.name:
+            self.option = self.module.OPT_NON_STR_KEYS
+
+    def loads(self, s):
+        if 'json' == self.name: return json.loads(s)
+        try:
+            return self.module.loads(s)
+        except ValueError:
+            return json.loads(s)
+
+    def dumps(self, obj):
+        if 'orjson' == self.name:
+            try:
+                return self.module.dumps(obj, default=default, option=self.option)
+            except TypeError:
+                pass
+        return json.dumps(obj, ensure_ascii=False, separators=(',',':'), default=default).encode('utf-8')
+
+
+codec = Codec(C.get_json_codec())
@@ -0,0 +1,44 @@
+import unittest
+import json
+from decimal import Decimal
+
+from Codec import Codec
+
+
+class Asset:
+    def __init__(self):
+        self.name = 'NEO'
+        self.decimals = 0
+
+
+class TestCodec(unittest.TestCase):
+    def codecs(self):
+        return [Codec(name) for name in Codec.BACKENDS]
+
+    def test_loads_bytes(self):
+        raw = '{"jsonrpc":"2.0","id":1,"result":{"index":7,"name":"小蚁股"}}'.encode('utf-8')
+        for c in self.codecs():
+            self.assertEqual({'jsonrpc':'2.0', 'id':1, 'result':{'index':7, 'name':'小蚁股'}}, c.loads(raw), c.name)
+            self.assertEqual(c.loads(raw), c.loads(raw.decode('utf-8')))
+
+    def test_dumps(self):
+        obj = {'result':True, 'data':{'balance':Decimal('1.50000000'), 'small':Decimal('1E-8'), 'asset':Asset(), 'name':'小蚁股'}}
+        expected = {'result':True, 'data':{'balance':'1.50000000', 'small':'0.00000001', 'asset':{'name':'NEO', 'decimals':0}, 'name':'小蚁股'}}
+        for c in self.codecs():
+            b = c.dumps(obj)
+            self.assertIsInstance(b, bytes)
+            self.assertEqual(expected, json.loads(b.decode('utf-8')), c.name)
+
+    def test_big_integers(self):
+        '''nep5 totalsupply and balances can exceed 64 bits'''
+        raw = b'{"amount":340282366920938463463374607431768211456}'
+        for c in self.codecs():
+            self.assertEqual({'amount':2**128}, c.loads(raw), c.name)
+            self.assertEqual({'amount':2**128}, json.loads(c.dumps({'amount':2**128})), c.name)
+
+    def test_unknown_backend(self):
+        self.assertIn(Codec('nosuchjson').name, Codec.BACKENDS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -53,3 +53,144 @@ class Config:
     @staticmethod
     def get_super_node():
         return os.environ.get('SUPERNODE')
+
+    @staticmethod
+    def get_handlers():
+        return (os.environ.get('HANDLERS') or 'utxo,history,asset').split(',')
+
+    @staticmethod
+    def get_block_store():
+        return os.environ.get('BLOCKSTORE')
+
+    @staticmethod
+    def get_batch_target():
+        return float(os.environ.get('BATCHTARGET') or 30)
+
+    @staticmethod
+    def get_window_bytes():
+        return int(os.environ.get('WINDOWMB') or 512) * 1024 * 1024
+
+    @staticmethod
+    def get_max_rss():
+        rss = os.environ.get('MAXRSSMB')
+        return int(rss) * 1024 * 1024 if rss else None
+
+    @staticmethod
+    def get_rpc_batch():
+        return int(os.environ.get('RPCBATCH') or 100)
+
+    @staticmethod
+    def get_transactional():
+        return os.environ.get('TRANSACTIONAL', '').lower() in ['1', 'true', 'yes']
+
+    @staticmethod
+    def get_raw_blocks():
+        return os.environ.get('RAWBLOCKS', '').lower() in ['1', 'true', 'yes']
+
+    @staticmethod
+    def get_json_codec():
+        return os.environ.get('JSONCODEC')
+
+    @staticmethod
+    def get_sys_fee_file():
+        return os.environ.get('SYSFEEFILE')
+
+    @staticmethod
+    def get_tx_cache_size():
+        return int(os.environ.get('TXCACHESIZE') or 500000)
+
+    @staticmethod
+    def get_tx_cache_file():
+        return os.environ.get('TXCACHEFILE')
+
+    @staticmethod
+    def get_applog_node():
+        return os.environ.get('APPLOGNODE', '').lower() in ['1', 'true', 'yes']
+
+    @staticmethod
+    def get_applog_concurrency():
+        return int(os.environ.get('APPLOGCONCURRENCY') or 10)
+
+    @staticmethod
+    def get_applog_file():
+        return os.environ.get('APPLOGFILE')
+
+    @staticmethod
+    def get_nep5_batch():
+        return int(os.environ.get('NEP5BATCH') or 40)
+
+    @staticmethod
+    def get_nep5_ledger():
+        return os.environ.get('NEP5LEDGER', '').lower() in ['1', 'true', 'yes']
+
+    @staticmethod
+    def get_nep5_flagged():
+        return [a for a in (os.environ.get('NEP5FLAGGED') or '').split(',') if a]
+
+    @staticmethod
+    def get_nep5_verify():
+        return int(os.environ.get('NEP5VERIFY') or 0)
+
+    @staticmethod
+    def get_ont_ledger():
+        return os.environ.get('ONTLEDGER', '').lower() in ['1', 'true', 'yes']
+
+    @staticmethod
+    def get_ont_verify():
+        return int(os.environ.get('ONTVERIFY') or 0)
+
+    @staticmethod
+    def get_oep4_concurrency():
+        return int(os.environ.get('OEP4CONCURRENCY') or 20)
+
+    @staticmethod
+    def get_global_balance_size():
+        return int(os.environ.get('GLOBALBALANCESIZE') or 1000000)
+
+    @staticmethod
+    def get_global_verify():
+        return int(os.environ.get('GLOBALVERIFY') or 0)
+
+    @staticmethod
+    def get_utxo_index_size():
+        return int(os.environ.get('UTXOINDEXSIZE') or 20000000)
+
+    @staticmethod
+    def get_slow_query():
+        return float(os.environ.get('SLOWQUERY') or 1)
+
+    @staticmethod
+    def get_rpc_retries():
+        return int(os.environ.get('RPCRETRIES') or 3)
+
+    @staticmethod
+    def get_rpc_deadline():
+        return float(os.environ.get('RPCDEADLINE') or 180)
+
+    @staticmethod
+    def get_sql_retries():
+        return int(os.environ.get('SQLRETRIES') or 5)
+
+    @staticmethod
+    def get_sql_deadline():
+        return float(os.environ.get('SQLDEADLINE') or 600)
+
+    @staticmethod
+    def get_batch_retries():
+        return int(os.environ.get('BATCHRETRIES') or 5)
+
+    @staticmethod
+    def get_dead_letter_after():
+        return int(os.environ.get('DEADLETTERAFTER') or 5)
+
+    @staticmethod
+    def get_dead_letter_replay():
+        return float(os.environ.get('DEADLETTERREPLAY') or 600)
+
+    @staticmethod
+    def get_dead_letter_max():
+        return int(os.environ.get('DEADLETTERMAX') or 10)
+
+    @staticmethod
+    def get_bench_db():
+        return os.environ.get('BENCHDB') or 'sea_bench'
@@ -9,8 +9,10 @@ import uvloop
 import asyncio
 import aiohttp
 import aiomysql
+import heapq
+import random
 import hashlib
-from random import randint
+import pymysql
 from binascii import hexlify, unhexlify
 from logzero import logger
 from base58 import b58encode, b58decode
@@ -19,10 +21,35 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 from Config import Config as C
 from CommonTool import CommonTool as CT
+from RpcPool import RpcPool
+from RpcClient import RpcError
+from Retry import Retry
+from RawBlock import parse_block
+from Block import Block
+from BlockStore import BlockStore
+from Window import AdaptiveWindow
+from Metrics import metrics
+from Query import query
+from Codec import codec
 from pytz import utc
 
 
+#too many connections, lock wait timeout, deadlock, can't connect, server gone away, lost connection
+TRANSIENT_SQL_ERRORS = (1040, 1205, 1213, 2003, 2006, 2013)
+
+def transient_sql_error(e):
+    if isinstance(e, (asyncio.TimeoutError, pymysql.err.InterfaceError)): return True
+    return isinstance(e, pymysql.err.OperationalError) and bool(e.args) and e.args[0] in TRANSIENT_SQL_ERRORS
+
+
 class Crawler:
+    WINDOW_FACTOR = 2 #blocks in flight or waiting = WINDOW_FACTOR * max_tasks
+    SQL_RETRY = Retry('sql', C.get_sql_retries(), 0.5, 30, C.get_sql_deadline(), transient_sql_error)
+    SQL_ONCE = Retry('sql', 1, deadline=C.get_sql_deadline()) #inside a batch transaction the batch is retried instead
+    DEAD_LETTER_AFTER = C.get_dead_letter_after() #failed fetches of a block before it is reported
+    raw_blocks = False #getblock [h,0] and parse locally: fewer bytes, more cpu; NEO crawlers only
+    compact_blocks = False #Block model instead of the getblock json, NEO crawlers only
+
     def __init__(self, name, mysql_args, neo_uri, loop, super_node_uri, tasks='1000'):
         self.name = name
         self.start_time = CT.now()
@@ -35,30 +62,35 @@ class Crawler:
         self.sem = asyncio.Semaphore(value=self.max_tasks)
         #self.session = aiohttp.ClientSession(loop=loop, headers={"Connection": "close"})
         self.session = aiohttp.ClientSession(loop=loop)
+        self.rpc = RpcPool(self.session, [neo_uri], C.get_rpc_batch(), retries=C.get_rpc_retries(), deadline=C.get_rpc_deadline())
+        self.store = BlockStore(C.get_block_store()) if C.get_block_store() else None
+        self.feed = None
+        self.transactional = C.get_transactional()
+        self.txn = None
+        self.raw_blocks = C.get_raw_blocks()
+        self.compact_blocks = True
         self.super_node_uri = super_node_uri
         self.scheduler = AsyncIOScheduler(job_defaults = {
                         'coalesce': True,
                         'max_instances': 1,
                         'misfire_grace_time': 2
             })
-        self.scheduler.add_job(self.update_neo_uri, 'interval', seconds=10, args=[], id='update_neo_uri', timezone=utc)
+        self.scheduler.add_job(self.update_rpc_pool, 'interval', seconds=10, args=[], id='update_rpc_pool', timezone=utc)
+        self.scheduler.add_job(metrics.log, 'interval', seconds=60, args=[], id='log_metrics', timezone=utc)
+        self.scheduler.add_job(query.log, 'interval', seconds=60, args=[], id='log_queries', timezone=utc)
         self.scheduler.start()
 
     async def get_super_node_info(self):
         async with self.session.get(self.super_node_uri) as resp:
             if 200 != resp.status:
-                logger.error('Unable to fetch supernode info')
-                sys.exit(1)
-            j = await resp.json()
+                raise RpcError('Unable to fetch supernode info, http status {}'.format(resp.status))
+            j = codec.loads(await resp.read())
             return j
 
-    async def update_neo_uri(self):
-        heightA = await self.get_block_count()
+    async def update_rpc_pool(self):
         info = await self.get_super_node_info()
-        heightB = info['height']
-        if heightA < heightB:
-            self.neo_uri = info['fast'][randint(0,len(info['fast'])-1)]
-        logger.info('heightA:%s heightB:%s neo_uri:%s' % (heightA,heightB,self.neo_uri))
+        for uri in info['fast']: self.rpc.add(uri)
+        logger.info('supernode height:%s rpc endpoints:%s' % (info['height'], self.rpc.stats()))
 
     @staticmethod
     def integer_to_num_str(int_str, decimals=8):
@@ -66,6 +98,12 @@ class Crawler:
         d = D(int_str)
         return CT.sci_to_str(str(d/D(math.pow(10, decimals))))
 
+    @staticmethod
+    def block_size(block):
+        '''raw size reported by the node, used for the window byte budget'''
+        if isinstance(block, Block): return block.size or 1024
+        return block.get('size') or block.get('Size') or 1024
+
     @staticmethod
     def hash256(b):
         return hashlib.sha256(hashlib.sha256(b).digest()).digest()
@@ -103,7 +141,7 @@ class Crawler:
     @classmethod
     def hex_to_num_str(cls, hs, decimals=8):
         if isinstance(decimals, str): decimals = int(decimals)
-        if not isinstance(decimals, int): sys.exit(1)
+        if not isinstance(decimals, int): raise ValueError('wrong type for decimals {}'.format(decimals))
         bs = unhexlify(hs)
         return CT.sci_to_str(str(D(cls.bytes_to_num(bs))/D(math.pow(10, decimals))))
 
@@ -220,33 +258,51 @@ class Crawler:
                 'description':description,
                 }
 
+    def decode_block(self, block):
+        '''getblock json (or the subset an older BlockStore kept) -> what goes into self.cache'''
+        return Block.from_json(block) if self.compact_blocks else block
+
     async def get_block(self, height):
-        async with self.session.post(self.neo_uri, timeout=60,
-                json={'jsonrpc':'2.0','method':'getblock','params':[height,1],'id':1}) as resp:
-            if 200 != resp.status:
-                logger.error('Unable to fetch block {}, http status: {}'.format(height, resp.status))
-                sys.exit(1)
-            j = await resp.json()
-            return j['result']
+        if self.raw_blocks:
+            return self.decode_block(parse_block(await self.rpc.call('getblock', [height,0], min_height=height+1)))
+        return self.decode_block(await self.rpc.call('getblock', [height,1], min_height=height+1))
+
+    async def rpc_get_blocks(self, heights):
+        '''the verbose json of the blocks as fetched, not decoded yet'''
+        if self.raw_blocks:
+            raws = await self.rpc.batch('getblock', [[h,0] for h in heights], min_height=max(heights)+1)
+            blocks = []
+            for h, raw in zip(heights, raws):
+                try:
+                    blocks.append(parse_block(raw))
+                except ValueError as e: #unknown format, let the node decode it
+                    logger.warning('parse raw block {} failure: {}, get it verbose'.format(h, e))
+                    metrics.incr('raw_block.fallbacks')
+                    blocks.append(await self.rpc.call('getblock', [h,1], min_height=h+1))
+            return blocks
+        return await self.rpc.batch('getblock', [[h,1] for h in heights], min_height=max(heights)+1)
+
+    async def get_blocks(self, heights):
+        '''the BlockStore keeps blocks as fetched, every crawler slims its own copy'''
+        if self.store is None:
+            return [self.decode_block(b) for b in await self.rpc_get_blocks(heights)]
+        blocks = self.store.get_many(heights)
+        missing = [h for h in heights if h not in blocks.keys()]
+        if missing:
+            fetched = dict(zip(missing, await self.rpc_get_blocks(missing)))
+            self.store.put_many(fetched)
+            blocks.update(fetched)
+        return [self.decode_block(blocks[h]) for h in heights]
 
     async def get_block_count(self):
-        async with self.session.post(self.neo_uri, timeout=60,
-                json={'jsonrpc':'2.0','method':'getblockcount','params':[],'id':1}) as resp:
-            if 200 != resp.status:
-                logger.error('Unable to fetch blockcount')
-                sys.exit(1)
-            j = await resp.json()
-            return j['result']
+        return await self.rpc.get_block_count()
 
     async def get_transaction(self, txid):
         async with self.sem:
-            async with self.session.post(self.neo_uri, timeout=60,
-                    json={'jsonrpc':'2.0','method':'getrawtransaction','params':[txid,1],'id':1}) as resp:
-                if 200 != resp.status:
-                    logger.error('Unable to fetch transaction {}'.format(txid))
-                    sys.exit(1)
-                j = await resp.json()
-                return j['result']
+            return await self.rpc.call('getrawtransaction', [txid,1])
+
+    async def get_transactions(self, txids):
+        return await self.rpc.batch('getrawtransaction', [[txid,1] for txid in txids])
 
     async def get_mysql_pool(self):
         try:
@@ -260,63 +316,72 @@ class Crawler:
             logger.error("mysql connet failure:{}".format(e.args[0]))
             return False
 
-    async def get_mysql_cursor(self):
+    async def get_mysql_cursor(self, detached=False):
+        if self.txn is not None and not detached:
+            #one connection for the whole batch, statements take turns on it
+            await self.txn_lock.acquire()
+            return self.txn, await self.txn.cursor()
         conn = await self.pool.acquire()
         cur  = await conn.cursor()
         return conn, cur
 
-    async def get_status(self):
-        conn, cur = await self.get_mysql_cursor()
+    async def release_mysql_cursor(self, conn):
+        if conn is self.txn:
+            self.txn_lock.release()
+        else:
+            await self.pool.release(conn)
+
+    async def begin_batch(self):
+        if not self.transactional: return
+        self.txn_lock = asyncio.Lock()
+        self.txn = await self.pool.acquire()
+        await self.txn.begin()
+
+    async def commit_batch(self):
+        if self.txn is None: return
         try:
-            await cur.execute("SELECT update_height FROM status WHERE name='%s';" % self.name)
-            result = await cur.fetchone()
-            if result:
-                uh = result[0]
-                logger.info('database %s height: %s' % (self.name,uh))
-                return uh
-            logger.info('database %s height: -1' % self.name)
-            return -1
-        except Exception as e:
-            logger.error("mysql SELECT failure:{}".format(e.args[0]))
-            sys.exit(1)
+            await self.txn.commit()
         finally:
-            await self.pool.release(conn)
+            await self.pool.release(self.txn)
+            self.txn = None
 
-    async def get_total_sys_fee(self, height):
-        if -1 == height: return 0
-        conn, cur = await self.get_mysql_cursor()
+    async def rollback_batch(self):
+        if self.txn is None: return
         try:
-            await cur.execute("SELECT total_sys_fee FROM block WHERE height=%s;" % height)
-            result = await cur.fetchone()
-            if result:
-                h = result[0]
-                logger.info('database block height: %s' % h)
-                return h
-            logger.error('Unable to get block {}'.format(height))
-            sys.exit(1)
+            if not self.txn.closed: await self.txn.rollback()
         except Exception as e:
-            logger.error("mysql SELECT failure:{}".format(e.args[0]))
-            sys.exit(1)
+            logger.error('rollback failure:{}'.format(e))
+            self.txn.close()
         finally:
-            await self.pool.release(conn)
+            await self.pool.release(self.txn)
+            self.txn = None
+
+    async def get_status(self):
+        result = await self.mysql_fetchone('status.get', (self.name,))
+        if result:
+            uh = result[0]
+            logger.info('database %s height: %s' % (self.name,uh))
+            return uh
+        logger.info('database %s height: -1' % self.name)
+        return -1
+
+    async def get_total_sys_fee(self, height):
+        if -1 == height: return 0
+        result = await self.mysql_fetchone('block.total_sys_fee', (height,))
+        if result:
+            h = result[0]
+            logger.info('database block height: %s' % h)
+            return h
+        raise ValueError('Unable to get block {}'.format(height))
 
     async def get_invokefunction(self, contract, func):
-        async with self.session.post(self.neo_uri, timeout=60,
-                json={'jsonrpc':'2.0','method':'invokefunction','params':[contract, func],'id':1}) as resp:
-            if 200 != resp.status:
-                logger.error('Unable to get invokefunction')
-                sys.exit(1)
-            j = await resp.json()
-            return j['result']
+        return await self.rpc.call('invokefunction', [contract, func])
+
+    async def get_invokefunctions(self, contract, funcs):
+        return await self.rpc.batch('invokefunction', [[contract, func] for func in funcs])
 
     async def get_invokefunction_with_extra_arg(self, contract, func, arg):
-        async with self.session.post(self.neo_uri, timeout=60,
-                json={'jsonrpc':'2.0','method':'invokefunction','params':[contract, func, arg],'id':1}) as resp:
-            if 200 != resp.status:
-                logger.error('invokefunction_extra_arg contract:{},func:{},arg:{}'.format(contract,func,arg))
-                sys.exit(1)
-            j = await resp.json()
-            return j['result']
+        return await self.rpc.call('invokefunction', [contract, func, arg])
 
     async def get_decimals(self, contract):
         d = await self.get_invokefunction(contract, 'decimals')
@@ -332,128 +397,316 @@ class Crawler:
         if 'state' in d.keys() and d['state'].startswith('HALT'):
             return d['stack'][0] #eg:{"type":"ByteArray","value":""} or {"type":"ByteArray","value":"159a390f"}
         return {"type":"ByteArray","value":""}
-        logger.error('get_nep5_balance contract:{},address:{}'.format(contract,address))
-        sys.exit(1)
 
     async def get_global_balance(self, address):
-        async with self.session.post(self.neo_uri, timeout=60,
-                json={'jsonrpc':'2.0','method':'getaccountstate','params':[address],'id':10}) as resp:
-            if 200 != resp.status:
-                logger.error('Unable to getaccountstate {}, http status: {}'.format(address, resp.status))
-                sys.exit(1)
-            j = await resp.json()
-            return j['result']['balances']
+        j = await self.rpc.call('getaccountstate', [address])
+        return j['balances']
+
+    async def get_global_balances(self, addresses):
+        results = await self.rpc.batch('getaccountstate', [[address] for address in addresses])
+        return [j['balances'] for j in results]
 
     async def update_status(self, height):
-        sql="INSERT INTO status(name,update_height) VALUES ('%s',%s) ON DUPLICATE KEY UPDATE update_height=%s;" % (self.name,height,height)
-        await self.mysql_insert_one(sql)
+        await self.mysql_execute('status.set', (self.name,height))
 
     async def cache_block(self, height):
         self.cache[height] = await self.get_block(height)
 
-    async def mysql_insert_one(self, sql):
-        conn, cur = await self.get_mysql_cursor()
-        #logger.info('SQL:%s' % sql)
+    async def mysql_run(self, name, func, detached=False):
+        '''
+        func(cur) on a cursor of the batch transaction, or of the pool when there
+        is none or detached is set. outside a transaction transient errors are
+        retried on a new connection; inside one the error is raised at once, MySQL
+        may have rolled it back already, and the whole batch is retried instead.
+        a connection cut off by an error or the deadline is closed, not reused.
+        '''
+        async def attempt():
+            conn, cur = await self.get_mysql_cursor(detached)
+            try:
+                return await func(cur)
+            except asyncio.CancelledError:
+                conn.close()
+                raise
+            except Exception as e:
+                if transient_sql_error(e): conn.close()
+                raise
+            finally:
+                await self.release_mysql_cursor(conn)
+        retry = self.SQL_RETRY if detached or self.txn is None else self.SQL_ONCE
         try:
-            await cur.execute(sql)
-            num = cur.rowcount
-            #logger.info('%s row affected' % num)
-            return num
+            return await retry.run(attempt)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.info('SQL:%s' % sql)
-            logger.error("mysql INSERT failure:{}".format(e))
-            sys.exit(1)
-        finally:
-            await self.pool.release(conn)
+            logger.error("mysql {} failure:{}".format(name, e))
+            raise
 
-    async def mysql_query_one(self, sql):
-        conn, cur = await self.get_mysql_cursor()
-        logger.info('SQL:%s' % sql)
-        try:
-            await cur.execute(sql)
-            return await cur.fetchall()
-        except Exception as e:
-            logger.error("mysql QUERY failure:{}".format(e.args[0]))
-            sys.exit(1)
-        finally:
-            await self.pool.release(conn)
+    async def mysql_execute(self, name, args=None, n=None, width=1, detached=False):
+        return await self.mysql_run(name, lambda cur:query.execute(cur, name, args, n, width), detached)
 
-    async def mysql_insert_many(self, sql, data):
-        conn, cur = await self.get_mysql_cursor()
-        logger.info('SQL MANY:%s' % sql)
-        try:
-            await cur.executemany(sql, data)
-            num = cur.rowcount
-            #logger.info('%s row affected' % num)
+    async def mysql_fetchall(self, name, args=None, n=None, width=1):
+        async def func(cur):
+            await query.execute(cur, name, args, n, width)
+            return await cur.fetchall()
+        return await self.mysql_run(name, func)
+
+    async def mysql_fetchone(self, name, args=None):
+        async def func(cur):
+            await query.execute(cur, name, args)
+            return await cur.fetchone()
+        return await self.mysql_run(name, func)
+
+    async def get_max_packet(self):
+        '''bytes one statement may use, 80% of max_allowed_packet'''
+        if getattr(self, 'max_packet', None) is None:
+            r = await self.mysql_fetchone('max_allowed_packet')
+            self.max_packet = int(r[0]) * 8 // 10
+        return self.max_packet
+
+    async def mysql_execute_many(self, name, seq):
+        '''one round trip per max_packet bytes for INSERT ... VALUES statements, one per row otherwise'''
+        if not seq: return 0
+        max_packet = await self.get_max_packet()
+        async def func(cur):
+            cur.max_stmt_length = max_packet
+            return await query.executemany(cur, name, seq)
+        return await self.mysql_run(name, func)
+
+    async def mysql_join_update(self, table, rows):
+        '''set-based UPDATE: load rows into temporary table on one connection, then run <table>.apply which JOINs it'''
+        max_packet = await self.get_max_packet()
+        async def func(cur):
+            await query.execute(cur, table + '.drop')
+            await query.execute(cur, table + '.create')
+            cur.max_stmt_length = max_packet
+            await query.executemany(cur, table + '.insert', rows)
+            num = await query.execute(cur, table + '.apply')
+            await query.execute(cur, table + '.drop')
             return num
-        except Exception as e:
-            logger.error("mysql INSERT failure:{}".format(e.args[0]))
-            sys.exit(1)
-        finally:
-            await self.pool.release(conn)
+        return await self.mysql_run(table, func)
 
     async def update_addresses(self, height, uas, chain):
-        sql = "INSERT INTO upt(address,asset,update_height,chain) VALUES ('%s','%s',%s,'%s') ON DUPLICATE KEY UPDATE update_height=%s"
-        data = [(ua[0],ua[1],height,chain,height) for ua in uas]
-        await asyncio.gather(*[self.mysql_insert_one(sql % d) for d in data])
+        rows = [(ua[0],ua[1],height,chain,height) for ua in sorted(uas)] #same key order in every writer, no deadlock
+        await self.mysql_execute_many('upt.touch', rows)
 
     async def update_address_balances(self, data):
-        sql = "INSERT INTO balance(address,asset,value,last_updated_height) VALUES ('%s','%s','%s',%s) ON DUPLICATE KEY UPDATE value='%s',last_updated_height=%s"
-        #await self.mysql_insert_many(sql, data)
-        await asyncio.gather(*[self.mysql_insert_one(sql % d) for d in data])
+        '''data: (address, asset, value, height) rows'''
+        await self.mysql_execute_many('balance.set', sorted(data))
 
     async def update_upts(self, upts, height):
-        sql = "DELETE FROM upt where address='%s' AND asset='%s' AND update_height<%s;"
-        data = [(upt[0], upt[1], height) for upt in upts]
-        await asyncio.gather(*[self.mysql_insert_one(sql % d) for d in data])
+        await self.mysql_execute_many('upt.done', [(upt[0], upt[1], height) for upt in upts])
+
+    def add_dead_letter(self, kind, item, height, error):
+        '''
+        kind "tx" or "events" item of block height keeps failing: deal_with leaves
+        it out so the rest of the batch moves on. it is written with the batch and
+        the whole height is replayed later, deal_with must be idempotent for that.
+        '''
+        logger.error('dead letter %s %s %s at %s: %s' % (self.name, kind, item, height, error))
+        metrics.incr('%s.dead_letters' % self.name)
+        self.dead_letters.append((self.name, kind, str(item), height, str(error)[:256]))
+
+    async def prepare(self):
+        '''called once the mysql pool is ready, before the first batch'''
+        pass
 
     async def deal_with(self):
         pass
 
-    async def infinite_loop(self):
+    async def record_fetch(self, statement, heights, error=''):
+        '''dead letters of blocks are written at once, outside any batch transaction'''
+        try:
+            if 'dead_letter.add' == statement:
+                await self.mysql_execute(statement, (self.name, 'block', str(heights[0]), heights[0], error[:256]), detached=True)
+            else:
+                await self.mysql_execute(statement, [self.name] + heights, n=len(heights), detached=True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error('record fetch of {} failure: {}'.format(heights, e))
+
+    async def fetch_blocks(self, heights):
+        try:
+            if self.feed is None:
+                blocks = await self.get_blocks(heights)
+            else:
+                blocks = await self.feed.get_blocks(self.name, heights)
+            for i in range(len(heights)):
+                self.fetched[heights[i]] = blocks[i]
+                self.sizes[heights[i]] = self.block_size(blocks[i])
+                self.window.add_bytes(self.sizes[heights[i]])
+            self.fetched_event.set()
+            recovered = [h for h in heights if self.failures.pop(h, 0) >= self.DEAD_LETTER_AFTER]
+            if recovered: await self.record_fetch('dead_letter.fetched', recovered)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error('fetch blocks {}-{} failure: {}, retry later'.format(heights[0], heights[-1], e))
+            self.window.failure()
+            for h in heights: self.failures[h] = self.failures.get(h, 0) + 1
+            for h in heights: #once, when it crosses the threshold
+                if self.failures[h] == self.DEAD_LETTER_AFTER: await self.record_fetch('dead_letter.add', [h], str(e))
+            wait = random.uniform(0, min(60, 2 ** min(self.failures[heights[0]], 6)))
+            metrics.incr('fetch.retries', len(heights))
+            metrics.incr('fetch.time_lost', wait)
+            await asyncio.sleep(wait)
+            for h in heights: heapq.heappush(self.refetch, h) #keep their window slots
+            self.window.wake()
+        finally:
+            for h in heights: self.fetching.pop(h, None)
+
+    async def fetcher(self):
+        '''keep up to window.size heights in flight or fetched-but-unprocessed'''
+        next_height = self.start
+        current_height = 0
         while True:
-            current_height = await self.get_block_count()
-            time_a = CT.now()
-            if self.start < current_height:
-                stop = self.start + self.max_tasks
-                if stop >= current_height:
-                    stop = current_height
-                self.processing.extend([i for i in range(self.start,stop)])
-                self.max_height = max(self.processing)
-                self.min_height = self.processing[0]
-                await asyncio.wait([self.cache_block(h) for h in self.processing])
-                if self.processing != sorted(self.cache.keys()):
-                    msg = 'can not cache so much blocks one time(cache != processing)'
-                    logger.error(msg)
-                    self.max_tasks -= 10
-                    if self.max_tasks > 0:
-                        del self.processing
-                        del self.cache
-                        self.processing = []
-                        self.cache = {}
-                        continue
-                    else:
-                        sys.exit(1)
-                
-                await self.deal_with()
+            if not self.refetch and next_height >= current_height:
+                current_height = await self.get_block_count()
+                if next_height >= current_height:
+                    await asyncio.sleep(0.5)
+                    continue
+            heights = []
+            if self.refetch:
+                #one by one, a block which keeps failing must not hold back the rest of its batch
+                heights.append(heapq.heappop(self.refetch))
+            while not self.refetch and len(heights) < self.rpc.batch_size and next_height < current_height and self.window.available():
+                self.window.hold()
+                heights.append(next_height)
+                next_height += 1
+            if not heights:
+                await self.window.wait()
+                continue
+            task = asyncio.ensure_future(self.fetch_blocks(heights))
+            for h in heights: self.fetching[h] = task
+
+    def next_stop(self):
+        '''end(exclusive) of the contiguous fetched range starting at self.start'''
+        stop = self.start
+        while stop in self.fetched and stop - self.start < self.max_tasks:
+            stop += 1
+        return stop
+
+    def range_ready(self, stop):
+        if stop == self.start: return False
+        if stop - self.start >= self.max_tasks: return True
+        #stop keeps failing: commit what is before it instead of waiting
+        if self.failures.get(stop, 0) >= self.DEAD_LETTER_AFTER: return True
+        #near the tip: nothing more is on the way for this range
+        return stop not in self.fetching and stop not in self.refetch
+
+    async def run_batch(self, replay=False):
+        '''deal_with, its dead letters and the new status; one transaction in transactional mode'''
+        self.dead_letters = []
+        await self.begin_batch()
+        try:
+            await self.deal_with()
+            if replay: await self.mysql_execute('dead_letter.replayed', [self.name] + self.processing, n=len(self.processing))
+            await self.mysql_execute_many('dead_letter.add', self.dead_letters)
+            if not replay: await self.update_status(self.max_height)
+            await self.commit_batch()
+        except BaseException:
+            await self.rollback_batch()
+            raise
+
+    async def replay_dead_letters(self):
+        '''run deal_with again on synced heights which still have dead letters; what fails again is reopened'''
+        rows = await self.mysql_fetchall('dead_letter.due', (self.name, C.get_dead_letter_max(), self.start, self.max_tasks))
+        if not rows: return
+        heights = [r[0] for r in rows]
+        logger.info('replay dead letters of %s at heights %s' % (self.name, heights))
+        try:
+            self.processing = heights
+            self.cache = dict(zip(heights, await self.get_blocks(heights)))
+            self.max_height = self.start - 1
+            self.min_height = heights[0]
+            await self.run_batch(replay=True)
+        finally:
+            self.processing = []
+            self.cache = {}
+
+    async def infinite_loop(self):
+        self.fetched = {}
+        self.fetching = {}
+        self.refetch = []
+        self.failures = {} #height -> failed fetches in a row
+        batch_retry = Retry('%s.batch' % self.name, C.get_batch_retries(), 1, 60)
+        next_replay = 0
+        self.fetched_event = asyncio.Event()
+        self.sizes = {}
+        self.window = AdaptiveWindow(self.WINDOW_FACTOR * self.max_tasks, minimum=self.WINDOW_FACTOR,
+                target=C.get_batch_target(), byte_budget=C.get_window_bytes(), max_rss=C.get_max_rss())
+        fetcher = asyncio.ensure_future(self.fetcher())
+        try:
+            while True:
+                if CT.now() >= next_replay:
+                    next_replay = CT.now() + C.get_dead_letter_replay()
+                    try:
+                        await self.replay_dead_letters()
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        logger.error('replay dead letters of {} failure: {}'.format(self.name, e))
+                self.fetched_event.clear()
+                stop = self.next_stop()
+                if not self.range_ready(stop):
+                    try:
+                        await asyncio.wait_for(self.fetched_event.wait(), 0.5)
+                    except asyncio.TimeoutError:
+                        pass
+                    if fetcher.done(): fetcher.result()
+                    continue
+
+                time_a = CT.now()
+                self.processing = [i for i in range(self.start, stop)]
+                self.cache = {h:self.fetched.pop(h) for h in self.processing}
+                self.max_height = stop - 1
+                self.min_height = self.start
+
+                #a failed batch is rolled back and run again from the blocks already fetched
+                await batch_retry.run(self.run_batch)
 
                 time_b = CT.now()
-                logger.info('reached %s ,cost %.6fs to sync %s blocks ,total cost: %.6fs' % 
-                        (self.max_height, time_b-time_a, stop-self.start, time_b-self.start_time))
-                await self.update_status(self.max_height)
-                self.start = self.max_height + 1
+                logger.info('reached %s ,cost %.6fs to sync %s blocks ,total cost: %.6fs, window %s/%s blocks %.1fMB' % 
+                        (self.max_height, time_b-time_a, stop-self.start, time_b-self.start_time,
+                            self.window.held, self.window.size, self.window.bytes/1024/1024))
+                if self.feed is not None: self.feed.release(self.name, self.processing)
+                self.window.release(len(self.processing), sum([self.sizes.pop(h) for h in self.processing]))
+                self.window.success(time_b-time_a, stop-self.start >= self.max_tasks)
+                self.max_tasks = max(1, self.window.size // self.WINDOW_FACTOR)
+                metrics.gauge('%s.window' % self.name, self.window.size)
+                metrics.gauge('%s.window_bytes' % self.name, self.window.bytes)
+                metrics.gauge('%s.batch' % self.name, self.max_tasks)
+                self.start = stop
                 del self.processing
                 del self.cache
                 self.processing = []
                 self.cache = {}
-            else:
-               await asyncio.sleep(0.5)
+        finally:
+            fetcher.cancel()
+            for task in set(self.fetching.values()): task.cancel()
+
+    def share_io(self, other):
+        '''run inside another crawler's process: use its session, rpc pool, block store and feed'''
+        self.scheduler.shutdown(wait=False)
+        self.loop.create_task(self.session.close())
+        self.session = other.session
+        self.rpc = other.rpc
+        self.store = other.store
+        self.feed = other.feed
+
+    async def close_io(self):
+        '''block store, mysql pool and http session, in that order'''
+        if self.store is not None: self.store.close()
+        self.pool.close()
+        await self.pool.wait_closed()
+        await self.session.close()
 
     async def crawl(self):
         self.pool = await self.get_mysql_pool()
         if not self.pool:
             sys.exit(1)
         try:
+            await self.prepare()
             self.start = await self.get_status()
             self.start += 1
             logger.info('start infinite loop from height: %s' % self.start)
@@ -461,6 +714,4 @@ class Crawler:
         except Exception as e:
             logger.error('CRAWL EXCEPTION: {}'.format(e.args[0]))
         finally:
-            self.pool.close()
-            await self.pool.wait_closed()
-            await self.session.close()
+            await self.close_io()
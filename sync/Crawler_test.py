@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from Crawler import Crawler
+from Window import AdaptiveWindow
+
+loop = asyncio.new_event_loop()
+
+def async_test(coro):
+    def wrapper(*args, **kwargs):
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+
+class FailingCrawler(Crawler):
+    '''Crawler whose node never returns a block, fetch state only'''
+    def __init__(self):
+        self.name = 'fake'
+        self.feed = None
+        self.fetching = {}
+        self.refetch = []
+        self.failures = {}
+        self.window = AdaptiveWindow(10)
+        self.recorded = []
+
+    async def get_blocks(self, heights):
+        raise ValueError('node down')
+
+    async def record_fetch(self, statement, heights, error=''):
+        self.recorded.append((statement, heights))
+
+
+class TestFetch(unittest.TestCase):
+    @async_test
+    async def test_dead_letter_once(self):
+        c = FailingCrawler()
+        with mock.patch('asyncio.sleep', new=mock.AsyncMock()):
+            await c.fetch_blocks([7, 8])
+            for i in range(2 * Crawler.DEAD_LETTER_AFTER):
+                await c.fetch_blocks([7])
+        self.assertEqual([('dead_letter.add', [7])], c.recorded)
+        self.assertEqual(2 * Crawler.DEAD_LETTER_AFTER + 1, c.failures[7])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+from collections import OrderedDict
+from decimal import Decimal as D
+
+
+class GlobalBalances:
+    '''
+    balance of global assets (NEO, GAS, ...) by (address, asset without 0x),
+    the sum of the unspent outputs in Fixed8, kept in memory for the most
+    recently changed capacity keys. UTXO works out the new sums of a batch
+    with apply, writes them to balance and only then update()s them here,
+    so a rolled back batch leaves nothing behind. a key this does not know
+    is summed from utxos instead.
+    '''
+    FIXED8 = 100000000
+
+    def __init__(self, capacity=1000000):
+        self.capacity = capacity
+        self.sums = OrderedDict()
+
+    def __len__(self):
+        return len(self.sums)
+
+    def __contains__(self, key):
+        return key in self.sums
+
+    @classmethod
+    def fixed8(cls, value):
+        return int(D(value) * cls.FIXED8)
+
+    @classmethod
+    def to_str(cls, fixed8):
+        '''exact decimal string, no exponent and no trailing zeros'''
+        q, r = divmod(abs(fixed8), cls.FIXED8)
+        s = str(q) + ('.' + ('%08d' % r).rstrip('0') if r else '')
+        return '-' + s if fixed8 < 0 else s
+
+    @classmethod
+    def deltas(cls, outputs, spent):
+        '''{(address, asset): fixed8 change} of new and spent (address, asset, value)'''
+        result = {}
+        for address, asset, value in outputs:
+            result[(address, asset)] = result.get((address, asset), 0) + cls.fixed8(value)
+        for address, asset, value in spent:
+            result[(address, asset)] = result.get((address, asset), 0) - cls.fixed8(value)
+        return result
+
+    def apply(self, deltas):
+        '''new sums of the keys known here, the keys to sum from utxos'''
+        sums = {}
+        unknown = []
+        for k, d in deltas.items():
+            if k in self.sums: sums[k] = self.sums[k] + d
+            else: unknown.append(k)
+        return sums, unknown
+
+    def get(self, key):
+        return self.sums.get(key)
+
+    def update(self, sums):
+        for k, v in sums.items():
+            self.sums[k] = v
+            self.sums.move_to_end(k)
+        while len(self.sums) > self.capacity:
+            self.sums.popitem(last=False)
+
+    def discard(self, key):
+        self.sums.pop(key, None)
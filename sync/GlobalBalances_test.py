@@ -0,0 +1,33 @@
+import unittest
+
+from GlobalBalances import GlobalBalances
+
+
+class TestGlobalBalances(unittest.TestCase):
+    def test_to_str(self):
+        self.assertEqual('100', GlobalBalances.to_str(GlobalBalances.fixed8('100')))
+        self.assertEqual('0.00000001', GlobalBalances.to_str(GlobalBalances.fixed8('1E-8')))
+        self.assertEqual('12345678901.2', GlobalBalances.to_str(GlobalBalances.fixed8('12345678901.20000000')))
+        self.assertEqual('0', GlobalBalances.to_str(0))
+        self.assertEqual('-1.5', GlobalBalances.to_str(-150000000))
+
+    def test_deltas(self):
+        d = GlobalBalances.deltas([('A', 'neo', '10'), ('A', 'neo', '5'), ('B', 'gas', '0.1')], [('A', 'neo', '12'), ('C', 'gas', '1')])
+        self.assertEqual({('A', 'neo'):300000000, ('B', 'gas'):10000000, ('C', 'gas'):-100000000}, d)
+
+    def test_apply_update(self):
+        b = GlobalBalances(2)
+        b.update({('A', 'neo'):100})
+        sums, unknown = b.apply({('A', 'neo'):-40, ('B', 'neo'):7})
+        self.assertEqual({('A', 'neo'):60}, sums)
+        self.assertEqual([('B', 'neo')], unknown)
+        self.assertEqual(100, b.get(('A', 'neo'))) #not before update
+        b.update({('A', 'neo'):60, ('B', 'neo'):7})
+        b.update({('C', 'neo'):1})
+        self.assertEqual(2, len(b))
+        self.assertNotIn(('A', 'neo'), b)
+        self.assertEqual(7, b.get(('B', 'neo')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import random
+from logzero import logger
+from Metrics import metrics
+
+
+class Ledger:
+    '''
+    token balances kept from the transfer events a crawler decodes, in
+    integer base units, in the ledger table. a batch add()s its transfers,
+    write() sums them by (address, asset, height) and adds them in height
+    order; a row is only added to when its height is greater than the last
+    height applied to the row, so a batch run again (retry, resync) does
+    not count twice. a replay of dead letters is at heights already
+    applied: there only the transfers of the txids given are added, the
+    ones which were left out before. a None address (mint, burn) is left
+    out. assets in flagged (mint/burn without events, rebasing, ...) are
+    not kept, their balances are refreshed through upt instead, and so
+    are those not in assets when it is given. an asset flag()ged later is
+    stored in ledger_flag, and its rows dropped, for good.
+    the ledger needs to have seen every transfer of a key: it is only
+    enabled when the crawler starts from height 0 or had it enabled before.
+    a replay adds without the height guard, so it is only enabled in
+    transactional mode, where the replay and its dead letters commit as one.
+    the status row <name>_ledger is ON while the crawler keeps it and OFF
+    for good once it ran without it; another process (upt) load()s that to
+    know which assets are kept, whatever its own settings.
+    '''
+    CHUNK = 1000
+    ON, OFF = 1, 0
+
+    def __init__(self, crawler, flagged=(), assets=None, name=None):
+        self.crawler = crawler
+        self.name = name or crawler.name
+        self.flagged = set(flagged)
+        self.assets = None if assets is None else set(assets)
+        self.enabled = False
+        self.transfers = []
+
+    @property
+    def status_name(self):
+        return '%s_ledger' % self.name
+
+    async def enable(self):
+        '''by the crawler keeping it, when the ledger is turned on'''
+        if not self.crawler.transactional:
+            logger.error('the %s ledger needs TRANSACTIONAL, a replay would add its transfers twice without it' % self.name)
+            await self.disable()
+            return False
+        row = await self.crawler.mysql_fetchone('status.get', (self.status_name,))
+        if row is None:
+            if await self.crawler.get_status() >= 0:
+                logger.error('%s has synced without the ledger, resync it from height 0 to enable the ledger' % self.name)
+                return False
+            await self.crawler.mysql_execute('status.set', (self.status_name, self.ON))
+        elif self.ON != row[0]:
+            logger.error('%s has run without the ledger, resync it from height 0 to enable the ledger' % self.name)
+            return False
+        await self.load_flags()
+        self.enabled = True
+        return True
+
+    async def disable(self):
+        '''by the crawler keeping it, when it runs without: what it kept goes stale from now on'''
+        row = await self.crawler.mysql_fetchone('status.get', (self.status_name,))
+        if row is None or self.OFF == row[0]: return
+        logger.warning('%s ledger turned off for good, its balances are refreshed through upt' % self.name)
+        await self.crawler.mysql_execute('status.set', (self.status_name, self.OFF))
+
+    async def load(self):
+        '''by another process: whether the crawler of that name keeps the ledger, and its flags'''
+        row = await self.crawler.mysql_fetchone('status.get', (self.status_name,))
+        await self.load_flags()
+        self.enabled = row is not None and self.ON == row[0]
+        return self.enabled
+
+    async def load_flags(self):
+        for r in await self.crawler.mysql_fetchall('ledger_flag.get', (self.name,)):
+            self.flagged.add(r[0])
+
+    def is_kept(self, asset):
+        return self.enabled and asset not in self.flagged and (self.assets is None or asset in self.assets)
+
+    async def flag(self, asset, refresh):
+        '''
+        not kept any more, after a restart too. every holder of the asset is
+        given to refresh (upt) as (address, asset), then its rows are dropped
+        '''
+        if asset in self.flagged: return
+        logger.warning('%s ledger: %s flagged, its balances are refreshed through upt from now on' % (self.name, asset))
+        await self.crawler.mysql_execute('ledger_flag.add', (self.name, asset))
+        self.flagged.add(asset)
+        holders = await self.crawler.mysql_fetchall('ledger.holders', (asset,))
+        await refresh([(r[0], asset) for r in holders])
+        await self.crawler.mysql_execute('ledger.drop', (asset,))
+
+    def add(self, txid, height, asset, from_address, to_address, units):
+        self.transfers.append((txid, height, asset, from_address, to_address, units))
+
+    def discard(self, txid):
+        '''a tx left out of the batch, a replay adds all of it'''
+        self.transfers = [t for t in self.transfers if t[0] != txid]
+
+    def clear(self):
+        self.transfers = []
+
+    @staticmethod
+    def deltas(transfers, txids=None):
+        '''{(address, asset, height): units}, of the transfers of txids only when given'''
+        result = {}
+        for txid, height, asset, from_address, to_address, units in transfers:
+            if txids is not None and txid not in txids: continue
+            if from_address is not None:
+                k = (from_address, asset, height)
+                result[k] = result.get(k, 0) - units
+            if to_address is not None:
+                k = (to_address, asset, height)
+                result[k] = result.get(k, 0) + units
+        return result
+
+    async def write(self, txids=None):
+        '''{(address, asset): units} of the keys the transfers of the batch changed'''
+        deltas = self.deltas(self.transfers, txids)
+        self.clear()
+        if not deltas: return {}
+        rows = [(k[0], k[1], str(v), k[2]) for k, v in sorted(deltas.items())]
+        await self.crawler.mysql_execute_many('ledger.replay' if txids is not None else 'ledger.add', rows)
+        keys = sorted(set((k[0], k[1]) for k in deltas))
+        result = {}
+        for i in range(0, len(keys), self.CHUNK):
+            chunk = keys[i:i+self.CHUNK]
+            args = [x for k in chunk for x in k]
+            for r in await self.crawler.mysql_fetchall('ledger.get', args, n=len(chunk), width=2):
+                result[(r[0], r[1])] = int(r[2])
+        metrics.incr('%s.ledger_keys' % self.name, len(result))
+        return result
+
+    @staticmethod
+    def sample(keys, n):
+        keys = sorted(keys)
+        return random.sample(keys, min(n, len(keys)))
@@ -0,0 +1,133 @@
+import unittest
+import asyncio
+
+from Ledger import Ledger
+
+loop = asyncio.new_event_loop()
+
+def async_test(coro):
+    def wrapper(*args, **kwargs):
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+
+class FakeCrawler:
+    '''the ledger table as a dict, with what ledger.add and ledger.replay do to it'''
+    def __init__(self, height=-1, transactional=True):
+        self.name = 'history'
+        self.height = height
+        self.transactional = transactional
+        self.status = {}
+        self.flags = set() #(name, asset)
+        self.rows = {} #(address, asset) -> [units, height]
+
+    async def get_status(self):
+        return self.height
+
+    async def mysql_fetchone(self, name, args):
+        return (self.status[args[0]],) if args[0] in self.status else None
+
+    async def mysql_execute(self, name, args):
+        if 'status.set' == name: self.status[args[0]] = args[1]
+        if 'ledger_flag.add' == name: self.flags.add(tuple(args))
+        if 'ledger.drop' == name: self.rows = {k:v for k, v in self.rows.items() if k[1] != args[0]}
+
+    async def mysql_execute_many(self, name, rows):
+        for address, asset, units, height in rows:
+            r = self.rows.setdefault((address, asset), [0, -1])
+            if 'ledger.replay' == name or r[1] < height: r[0] += int(units)
+            r[1] = max(r[1], height)
+
+    async def mysql_fetchall(self, name, args, n=None, width=1):
+        if 'ledger_flag.get' == name: return [(f[1],) for f in self.flags if f[0] == args[0]]
+        if 'ledger.holders' == name: return [(k[0],) for k in self.rows if k[1] == args[0]]
+        keys = [(args[i], args[i+1]) for i in range(0, len(args), 2)]
+        return [(k[0], k[1], self.rows[k][0]) for k in keys if k in self.rows]
+
+
+class TestLedger(unittest.TestCase):
+    @async_test
+    async def test_enable(self):
+        c = FakeCrawler(-1)
+        self.assertTrue(await Ledger(c).enable())
+        self.assertEqual({'history_ledger':Ledger.ON}, c.status)
+        c.height = 500
+        self.assertTrue(await Ledger(c).enable()) #had it before
+        self.assertFalse(await Ledger(FakeCrawler(500)).enable())
+        self.assertFalse(await Ledger(FakeCrawler(-1, transactional=False)).enable())
+
+    @async_test
+    async def test_turned_off(self):
+        for off in [lambda c:Ledger(c).disable(), lambda c:Ledger(c).enable()]:
+            c = FakeCrawler(-1)
+            await Ledger(c).enable()
+            c.height = 500
+            self.assertTrue(await Ledger(c, name='history').load()) #upt, whatever its own settings
+            c.transactional = False
+            await off(c) #run without it, or without TRANSACTIONAL
+            self.assertEqual({'history_ledger':Ledger.OFF}, c.status)
+            c.transactional = True
+            self.assertFalse(await Ledger(c).enable()) #for good
+            self.assertFalse(await Ledger(c, name='history').load())
+
+    @async_test
+    async def test_flag_is_stored(self):
+        c = FakeCrawler()
+        l = Ledger(c)
+        await l.enable()
+        l.add('t1', 5, 'x', None, 'A', 100)
+        l.add('t1', 5, 'y', None, 'A', 100)
+        l.add('t2', 6, 'x', 'A', 'B', 40)
+        await l.write()
+        refreshed = []
+        async def refresh(uas): refreshed.extend(uas)
+        await l.flag('x', refresh)
+        self.assertEqual([('A', 'x'), ('B', 'x')], sorted(refreshed)) #every holder
+        self.assertFalse(l.is_kept('x'))
+        self.assertEqual([('A', 'y')], list(c.rows.keys())) #no stale row to add to
+        l = Ledger(c) #restarted
+        await l.enable()
+        self.assertFalse(l.is_kept('x'))
+        self.assertTrue(l.is_kept('y'))
+        u = Ledger(FakeCrawler(), name='history') #what upt sees
+        u.crawler.status, u.crawler.flags = c.status, c.flags
+        self.assertTrue(await u.load())
+        self.assertFalse(u.is_kept('x'))
+        self.assertTrue(u.is_kept('y'))
+
+    def test_deltas(self):
+        transfers = [('t1', 5, 'x', None, 'A', 100), ('t2', 5, 'x', 'A', 'B', 30), ('t3', 6, 'x', 'B', None, 10)]
+        self.assertEqual({('A', 'x', 5):70, ('B', 'x', 5):30, ('B', 'x', 6):-10}, Ledger.deltas(transfers))
+        self.assertEqual({('A', 'x', 5):-30, ('B', 'x', 5):30}, Ledger.deltas(transfers, {'t2'}))
+
+    @async_test
+    async def test_write_twice(self):
+        c = FakeCrawler()
+        l = Ledger(c, ['y'])
+        await l.enable()
+        self.assertFalse(l.is_kept('y'))
+        for i in range(2): #the batch run again
+            l.add('t1', 5, 'x', None, 'A', 100)
+            l.add('t2', 6, 'x', 'A', 'B', 30)
+            self.assertEqual({('A', 'x'):70, ('B', 'x'):30}, await l.write())
+        l.add('t3', 5, 'x', 'B', 'A', 1) #a dead letter of height 5
+        l.add('t1', 5, 'x', None, 'A', 100)
+        self.assertEqual({('A', 'x'):71, ('B', 'x'):29}, await l.write({'t3'}))
+        self.assertEqual([], l.transfers)
+
+    @async_test
+    async def test_assets_discard(self):
+        l = Ledger(FakeCrawler(), assets=['ont', 'ong'])
+        self.assertFalse(l.is_kept('ong')) #not enabled
+        await l.enable()
+        self.assertTrue(l.is_kept('ong'))
+        self.assertFalse(l.is_kept('x'))
+        l.add('t1', 5, 'ong', 'A', 'B', 10)
+        l.add('t2', 5, 'ong', 'A', 'C', 1)
+        l.add('t2', 5, 'ont', 'C', 'A', 2)
+        l.discard('t2') #dead letter, all of it comes with the replay
+        self.assertEqual({('A', 'ong'):-10, ('B', 'ong'):10}, await l.write())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+from logzero import logger
+
+
+class Metrics:
+    '''process wide counters and gauges, logged periodically by the crawlers'''
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+
+    def incr(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def snapshot(self):
+        s = dict(self.counters)
+        s.update(self.gauges)
+        return s
+
+    def log(self):
+        logger.info('metrics: %s' % ', '.join(('%s=%.3f' if isinstance(v, float) else '%s=%s') % (k, v) for k,v in sorted(self.snapshot().items())))
+
+
+metrics = Metrics()
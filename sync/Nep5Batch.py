@@ -0,0 +1,83 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import asyncio
+from binascii import hexlify, unhexlify
+from base58 import b58decode
+from logzero import logger
+from Metrics import metrics
+
+
+PUSH1 = b'\x51'
+PACK = b'\xc1'
+APPCALL = b'\x67'
+EMPTY = {"type":"ByteArray","value":""}
+
+
+def push_bytes(b):
+    if len(b) > 75: raise ValueError('push of {} bytes'.format(len(b)))
+    return bytes([len(b)]) + b
+
+def address_hash(address):
+    '''script hash of an address as the vm sees it, None for a wrong address'''
+    try:
+        raw = b58decode(address)
+    except Exception:
+        return None
+    if 25 != len(raw): return None
+    return raw[1:-4]
+
+def stack_units(item):
+    '''integer of a balanceOf result, None for a type no token returns'''
+    if 'Integer' == item['type']: return int(item['value'] or 0)
+    if 'ByteArray' == item['type']: return int.from_bytes(unhexlify(item['value']), 'little')
+    return None
+
+def balance_of(contract, address):
+    '''what invokefunction builds for contract balanceOf [Hash160 address]'''
+    return push_bytes(address_hash(address)) + PUSH1 + PACK + push_bytes(b'balanceOf') + APPCALL + unhexlify(contract)[::-1]
+
+def balance_of_script(pairs):
+    '''one script for many (contract, address), the results stay on the stack in the same order'''
+    return hexlify(b''.join(balance_of(c, a) for c, a in pairs)).decode('utf-8')
+
+
+class Nep5Batch:
+    '''
+    balanceOf of many (contract, address) pairs in one invokescript. pairs
+    go size at a time; a script that FAULTs (out of the gas an invoke may
+    burn, or one contract throwing) or leaves the wrong number of items on
+    the stack is cut in two halves until a single pair is left, which goes
+    through crawler.get_nep5_balance like before. the result for a pair is
+    a stack item, {"type":"ByteArray","value":""} if its call failed.
+    counters nep5batch.scripts, nep5batch.pairs, nep5batch.splits and
+    nep5batch.singles.
+    '''
+    def __init__(self, crawler, size=40):
+        self.crawler = crawler
+        self.size = max(1, size)
+
+    async def invoke(self, pairs):
+        if 1 == len(pairs):
+            metrics.incr('nep5batch.singles')
+            return [await self.crawler.get_nep5_balance(*pairs[0])]
+        metrics.incr('nep5batch.scripts')
+        d = await self.crawler.rpc.call('invokescript', [balance_of_script(pairs)])
+        if 'state' in d.keys() and d['state'].startswith('HALT') and len(d['stack']) == len(pairs):
+            return d['stack']
+        logger.warning('invokescript of {} balanceOf got {} consuming {} gas, split it'.format(len(pairs), d.get('state'), d.get('gas_consumed')))
+        metrics.incr('nep5batch.splits')
+        half = len(pairs) // 2
+        results = await asyncio.gather(self.invoke(pairs[:half]), self.invoke(pairs[half:]))
+        return results[0] + results[1]
+
+    async def get_balances(self, pairs):
+        '''{(contract, address): stack item}, pairs with a wrong address are left out'''
+        pairs = [p for p in set(pairs) if address_hash(p[1]) is not None]
+        if not pairs: return {}
+        metrics.incr('nep5batch.pairs', len(pairs))
+        chunks = [pairs[i:i+self.size] for i in range(0, len(pairs), self.size)]
+        results = await asyncio.gather(*[self.invoke(chunk) for chunk in chunks])
+        return {p:r for chunk, items in zip(chunks, results) for p, r in zip(chunk, items)}
@@ -0,0 +1,90 @@
+import unittest
+import asyncio
+from binascii import hexlify, unhexlify
+from base58 import b58encode
+
+from Nep5Batch import Nep5Batch, balance_of_script, address_hash
+
+loop = asyncio.new_event_loop()
+
+def async_test(coro):
+    def wrapper(*args, **kwargs):
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+def address(i):
+    '''checksum is not checked by address_hash'''
+    result = b58encode(b'\x17' + (b'%020d' % i) + b'\x00' * 4)
+    return result.decode('utf8') if isinstance(result, bytes) else result
+
+CONTRACT = 'ecc6b20d3ccac1ee9ef109af5a7cdb85706b1df9'
+BAD = 'ceab719b8baa2310f232ee0d277c061704541cfb'
+
+
+class FakeNode:
+    '''runs balanceOf scripts, faults past max_calls in a script or on calling BAD'''
+    def __init__(self, max_calls):
+        self.max_calls = max_calls
+        self.scripts = 0
+        self.singles = 0
+        self.rpc = self
+
+    @staticmethod
+    def balance(contract, sh):
+        return {'type':'Integer', 'value':str(int(sh[-4:]) + len(contract))}
+
+    def run(self, script):
+        b = unhexlify(script)
+        stack = []
+        while b:
+            sh, contract = b[1:21], hexlify(b[34:54][::-1]).decode()
+            assert b[21:34] == b'\x51\xc1\x09balanceOf\x67'
+            if BAD == contract: return {'state':'FAULT, BREAK', 'stack':[]}
+            stack.append(self.balance(contract, sh))
+            b = b[54:]
+        if len(stack) > self.max_calls: return {'state':'FAULT, BREAK', 'gas_consumed':'10', 'stack':[]}
+        return {'state':'HALT, BREAK', 'stack':stack}
+
+    async def call(self, method, params):
+        assert 'invokescript' == method
+        self.scripts += 1
+        return self.run(params[0])
+
+    async def get_nep5_balance(self, contract, address):
+        self.singles += 1
+        if BAD == contract: return {"type":"ByteArray","value":""}
+        return self.balance(contract, address_hash(address))
+
+
+class TestNep5Batch(unittest.TestCase):
+    def test_script(self):
+        a = address(7)
+        self.assertEqual('14' + hexlify(address_hash(a)).decode() + '51c1' + '0962616c616e63654f66' + '67' + 'f91d6b7085db7c5aaf09f19eeec1ca3c0db2c6ec',
+                balance_of_script([(CONTRACT, a)]))
+        self.assertIsNone(address_hash('not an address'))
+
+    @async_test
+    async def test_one_script_per_chunk(self):
+        node = FakeNode(100)
+        pairs = [(CONTRACT, address(i)) for i in range(90)]
+        r = await Nep5Batch(node, 40).get_balances(pairs)
+        self.assertEqual(3, node.scripts)
+        self.assertEqual(0, node.singles)
+        self.assertEqual(90, len(r))
+        self.assertEqual(str(12 + 40), r[(CONTRACT, address(12))]['value'])
+
+    @async_test
+    async def test_split(self):
+        node = FakeNode(10)
+        pairs = [(CONTRACT, address(i)) for i in range(40)] + [(BAD, address(1)), ('zz', 'not an address')]
+        r = await Nep5Batch(node, 50).get_balances(pairs)
+        self.assertEqual(40, len([p for p in r if CONTRACT == p[0]]))
+        self.assertEqual('', r[(BAD, address(1))]['value'])
+        self.assertNotIn(('zz', 'not an address'), r)
+        self.assertLess(node.singles, 8) #BAD and a few neighbours cut down to one
+        self.assertEqual(str(33 + 40), r[(CONTRACT, address(33))]['value'])
+        self.assertLess(node.scripts, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import asyncio
+from ontology.contract.neo.oep4 import Oep4
+from ontology.exception.exception import SDKException
+from Metrics import metrics
+
+
+class Oep4Client:
+    '''
+    OEP4 balanceOf, decimals, name and symbol without the blocking http of
+    the ontology sdk: the sdk only builds the transaction, it goes to the
+    node as a sendrawtransaction pre-exec through the rpc pool, at most
+    concurrency at once. a call the node does not execute (not a token,
+    FAULT, wrong address) gives None, errors of the rpc pool are raised.
+    counters oep4.calls and oep4.failures.
+    '''
+    def __init__(self, rpc, concurrency=20):
+        self.rpc = rpc
+        self.sem = asyncio.Semaphore(value=max(1, concurrency))
+
+    @staticmethod
+    def to_int(hs):
+        '''little endian like the vm, an empty result is 0: right for balanceOf only'''
+        return int.from_bytes(bytes.fromhex(hs), 'little')
+
+    @staticmethod
+    def to_str(hs):
+        return bytes.fromhex(hs).decode('utf-8')
+
+    async def pre_exec(self, tx):
+        '''Result of the pre-exec, a hex string'''
+        async with self.sem:
+            metrics.incr('oep4.calls')
+            r = await self.rpc.call('sendrawtransaction', [tx.serialize(is_hex=True), 1])
+        if not isinstance(r, dict) or 1 != r.get('State') or not isinstance(r.get('Result'), str):
+            metrics.incr('oep4.failures')
+            return None
+        return r['Result']
+
+    async def balance_of(self, asset, address):
+        try:
+            tx = Oep4(asset).new_balance_of_tx(address)
+        except SDKException:
+            return None
+        r = await self.pre_exec(tx)
+        return None if r is None else self.to_int(r)
+
+    async def decimals(self, asset):
+        r = await self.pre_exec(Oep4(asset).new_decimals_tx())
+        return None if not r else self.to_int(r) #no decimals is no token, not 0
+
+    async def info(self, asset):
+        '''(decimals, name, symbol), None if any of them fails'''
+        o4 = Oep4(asset)
+        rs = await asyncio.gather(*[self.pre_exec(tx) for tx in [o4.new_decimals_tx(), o4.new_name_tx(), o4.new_symbol_tx()]])
+        if any(r is None for r in rs) or not rs[0]: return None
+        try:
+            return self.to_int(rs[0]), self.to_str(rs[1]), self.to_str(rs[2])
+        except ValueError: #not utf8, not hex
+            return None
@@ -0,0 +1,122 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+from aiomysql.cursors import RE_INSERT_VALUES
+from logzero import logger
+from Config import Config as C
+from CommonTool import CommonTool as CT
+from Metrics import metrics
+
+
+class Query:
+    '''
+    named, parameterized statements.
+    values are never formatted into the text: they are passed as args and
+    escaped by the driver, so a statement is built once and reused for any
+    value. "{}" in a statement is an IN list, expanded to n placeholders
+    (or n "(%s,%s)" groups for width 2) and cached per (name, n, width).
+    executemany on an INSERT ... VALUES (%s,...) statement is sent by the
+    driver as multi-row INSERTs of at most max_stmt_length bytes.
+    every call is timed per name, calls slower than slow seconds are logged.
+    '''
+    def __init__(self, statements, slow=1.0):
+        self.statements = statements
+        self.slow = slow
+        self.cache = {}
+        self.stats = {} #name -> [calls, rows, seconds, max seconds]
+
+    def sql(self, name, n=None, width=1):
+        if n is None: return self.statements[name]
+        key = (name, n, width)
+        s = self.cache.get(key)
+        if s is None:
+            item = '%s' if 1 == width else '(' + ','.join(['%s'] * width) + ')'
+            s = self.cache[key] = self.statements[name].format(','.join([item] * n))
+        return s
+
+    def batchable(self, name):
+        return RE_INSERT_VALUES.match(self.statements[name]) is not None
+
+    def record(self, name, cost, rows, args=None):
+        s = self.stats.get(name)
+        if s is None: s = self.stats[name] = [0, 0, 0.0, 0.0]
+        s[0] += 1
+        s[1] += rows
+        s[2] += cost
+        if cost > s[3]: s[3] = cost
+        if cost > self.slow:
+            metrics.incr('sql.slow')
+            logger.warning('slow query %s %.3fs %s rows: %s %s' % (name, cost, rows, self.statements[name], '' if args is None else str(args)[:200]))
+
+    async def execute(self, cur, name, args=None, n=None, width=1):
+        sql = self.sql(name, n, width)
+        time_a = CT.now()
+        try:
+            await cur.execute(sql, args)
+        finally:
+            self.record(name, CT.now() - time_a, max(cur.rowcount, 0), args)
+        return cur.rowcount
+
+    async def executemany(self, cur, name, seq):
+        if not seq: return 0
+        time_a = CT.now()
+        try:
+            await cur.executemany(self.statements[name], seq)
+        finally:
+            self.record(name, CT.now() - time_a, len(seq))
+        return cur.rowcount
+
+    def log(self):
+        top = sorted(self.stats.items(), key=lambda kv: kv[1][2], reverse=True)[:10]
+        if not top: return
+        logger.info('queries: %s' % ', '.join('%s calls=%s rows=%s total=%.3fs max=%.3fs' % ((name,) + tuple(s)) for name,s in top))
+
+
+STATEMENTS = {
+    'status.get':           "SELECT update_height FROM status WHERE name=%s;",
+    'status.set':           "INSERT INTO status(name,update_height) VALUES (%s,%s) ON DUPLICATE KEY UPDATE update_height=VALUES(update_height);",
+    'max_allowed_packet':   "SELECT @@max_allowed_packet;",
+    'block.total_sys_fee':  "SELECT total_sys_fee FROM block WHERE height=%s;",
+    'block.total_sys_fees': "SELECT height,total_sys_fee FROM block WHERE height>=%s ORDER BY height LIMIT %s;",
+    'block.insert':         "INSERT IGNORE INTO block(height,sys_fee,total_sys_fee) VALUES (%s,%s,%s);",
+    'utxos.insert':         "INSERT IGNORE INTO utxos(txid,index_n,address,value,asset,height) VALUES (%s,%s,%s,%s,%s,%s);",
+    'utxos.spend':          "UPDATE utxos SET spent_txid=%s,spent_height=%s,status=0 WHERE txid=%s AND index_n=%s;",
+    'utxos.claim':          "UPDATE utxos SET claim_txid=%s,claim_height=%s WHERE txid=%s AND index_n=%s;",
+    'utxos.unspent':        "SELECT txid,index_n,address,asset,value FROM utxos WHERE status=1 ORDER BY id;",
+    'utxos.by_outpoints':   "SELECT txid,index_n,address,asset,value FROM utxos WHERE (txid,index_n) IN ({});",
+    'utxos.sums':           "SELECT address,asset,SUM(CAST(value AS DECIMAL(30,8))) FROM utxos WHERE (address,asset) IN ({}) AND status<>0 GROUP BY address,asset;",
+    'tmp_vins.drop':        "DROP TEMPORARY TABLE IF EXISTS tmp_vins;",
+    'tmp_vins.create':      "CREATE TEMPORARY TABLE tmp_vins (txid CHAR(66) NOT NULL, index_n SMALLINT UNSIGNED NOT NULL, spent_txid CHAR(66) NOT NULL, spent_height INT UNSIGNED NOT NULL, PRIMARY KEY (txid,index_n)) ENGINE=MEMORY;",
+    'tmp_vins.insert':      "INSERT IGNORE INTO tmp_vins VALUES (%s,%s,%s,%s);",
+    'tmp_vins.apply':       "UPDATE utxos u JOIN tmp_vins t ON u.txid=t.txid AND u.index_n=t.index_n SET u.spent_txid=t.spent_txid,u.spent_height=t.spent_height,u.status=0;",
+    'tmp_claims.drop':      "DROP TEMPORARY TABLE IF EXISTS tmp_claims;",
+    'tmp_claims.create':    "CREATE TEMPORARY TABLE tmp_claims (txid CHAR(66) NOT NULL, index_n SMALLINT UNSIGNED NOT NULL, claim_txid CHAR(66) NOT NULL, claim_height INT UNSIGNED NOT NULL, PRIMARY KEY (txid,index_n)) ENGINE=MEMORY;",
+    'tmp_claims.insert':    "INSERT IGNORE INTO tmp_claims VALUES (%s,%s,%s,%s);",
+    'tmp_claims.apply':     "UPDATE utxos u JOIN tmp_claims t ON u.txid=t.txid AND u.index_n=t.index_n SET u.claim_txid=t.claim_txid,u.claim_height=t.claim_height;",
+    'history.insert':       "INSERT IGNORE INTO history(txid,operation,index_n,address,value,timepoint,asset) VALUES (%s,%s,%s,%s,%s,%s,%s);",
+    'oep4_history.insert':  "INSERT IGNORE INTO oep4_history(txid,operation,index_n,address,value,dest,timepoint,asset) VALUES (%s,%s,%s,%s,%s,%s,%s,%s);",
+    'assets.insert':        "INSERT IGNORE INTO assets(asset,type,name,symbol,version,decimals,contract_name) VALUES (%s,%s,%s,%s,%s,%s,%s);",
+    'assets.since':         "SELECT id,asset,type,decimals FROM assets WHERE id>%s ORDER BY id;",
+    'upt.touch':            "INSERT INTO upt(address,asset,update_height,chain,since) VALUES (%s,%s,%s,%s,%s) ON DUPLICATE KEY UPDATE update_height=VALUES(update_height);",
+    'upt.stale':            "SELECT address,asset FROM upt WHERE chain=%s AND update_height<%s ORDER BY update_height LIMIT %s;",
+    'upt.changed':          "SELECT address,asset,update_height,since,requested,UNIX_TIMESTAMP(changed) FROM upt WHERE chain=%s AND changed>=FROM_UNIXTIME(%s);",
+    'upt.done':             "DELETE FROM upt WHERE address=%s AND asset=%s AND update_height<%s;",
+    'upt.retry':            "UPDATE upt SET update_height=%s WHERE address=%s AND asset=%s AND update_height<%s;",
+    'dead_letter.add':      "INSERT INTO dead_letter(name,kind,item,height,error) VALUES (%s,%s,%s,%s,%s) ON DUPLICATE KEY UPDATE attempts=attempts+1,error=VALUES(error),resolved=0;",
+    'dead_letter.due':      "SELECT DISTINCT height FROM dead_letter WHERE name=%s AND kind<>'block' AND resolved=0 AND attempts<%s AND height<%s ORDER BY height LIMIT %s;",
+    'dead_letter.replayed': "UPDATE dead_letter SET resolved=1 WHERE name=%s AND kind<>'block' AND height IN ({});",
+    'dead_letter.open_txs': "SELECT item FROM dead_letter WHERE name=%s AND kind='tx' AND resolved=0 AND height IN ({});",
+    'dead_letter.fetched':  "UPDATE dead_letter SET resolved=1 WHERE name=%s AND kind='block' AND height IN ({});",
+    'ledger.add':           "INSERT INTO ledger(address,asset,units,height) VALUES (%s,%s,%s,%s) ON DUPLICATE KEY UPDATE units=IF(height<VALUES(height),units+VALUES(units),units),height=GREATEST(height,VALUES(height));",
+    'ledger.replay':        "INSERT INTO ledger(address,asset,units,height) VALUES (%s,%s,%s,%s) ON DUPLICATE KEY UPDATE units=units+VALUES(units),height=GREATEST(height,VALUES(height));",
+    'ledger.get':           "SELECT address,asset,units FROM ledger WHERE (address,asset) IN ({});",
+    'ledger.holders':       "SELECT address FROM ledger WHERE asset=%s;",
+    'ledger.drop':          "DELETE FROM ledger WHERE asset=%s;",
+    'ledger_flag.add':      "INSERT IGNORE INTO ledger_flag(name,asset) VALUES (%s,%s);",
+    'ledger_flag.get':      "SELECT asset FROM ledger_flag WHERE name=%s;",
+    'balance.set':          "INSERT INTO balance(address,asset,value,last_updated_height) VALUES (%s,%s,%s,%s) ON DUPLICATE KEY UPDATE value=VALUES(value),last_updated_height=VALUES(last_updated_height);",
+}
+
+query = Query(STATEMENTS, C.get_slow_query())
@@ -0,0 +1,253 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+'''
+NEO 2.x block and transaction deserializer for getblock [height,0].
+parse_block returns the same dict as getblock [height,1] for every field
+the crawlers read, txids and the block hash are computed locally. what the
+node adds from its own state (confirmations, nextblockhash, net_fee) is
+left out; sys_fee comes from the tx itself or SYSTEM_FEE below.
+'''
+
+import json
+import struct
+import hashlib
+from binascii import unhexlify
+from CommonTool import CommonTool as CT
+
+
+TX_TYPES = {
+        0x00:'MinerTransaction',
+        0x01:'IssueTransaction',
+        0x02:'ClaimTransaction',
+        0x20:'EnrollmentTransaction',
+        0x40:'RegisterTransaction',
+        0x80:'ContractTransaction',
+        0x90:'StateTransaction',
+        0xd0:'PublishTransaction',
+        0xd1:'InvocationTransaction',
+        }
+
+#protocol.json SystemFee of mainnet and testnet, in GAS
+SYSTEM_FEE = {
+        'EnrollmentTransaction':1000,
+        'IssueTransaction':500,
+        'PublishTransaction':500,
+        'RegisterTransaction':10000,
+        }
+
+NEO = '0xc56f33fc6ecfcd0c225c4ab356fee59390af8560be0e930faebe74a6daff7c9b'
+GAS = '0x602c79718b16e442de58778e148d0b1084e3b2dffd5de6b7b16cee7969282de7'
+
+ATTRIBUTE_USAGES = {0x00:'ContractHash', 0x02:'ECDH02', 0x03:'ECDH03', 0x20:'Script', 0x30:'Vote', 0x81:'DescriptionUrl', 0x90:'Description', 0xf0:'Remark'}
+ATTRIBUTE_USAGES.update({0xa0+i:'Hash%s' % i for i in range(1, 16)})
+ATTRIBUTE_USAGES.update({0xf0+i:'Remark%s' % i for i in range(1, 16)})
+
+ASSET_TYPES = {0x00:'GoverningToken', 0x01:'UtilityToken', 0x08:'Currency', 0x40:'CreditFlag', 0x60:'Token', 0x80:'DutyFlag', 0x90:'Share', 0x98:'Invoice'}
+
+STATE_TYPES = {0x40:'Account', 0x48:'Validator'}
+
+PARAMETER_TYPES = {0x00:'Signature', 0x01:'Boolean', 0x02:'Integer', 0x03:'Hash160', 0x04:'Hash256', 0x05:'ByteArray',
+        0x06:'PublicKey', 0x07:'String', 0x10:'Array', 0xf0:'InteropInterface', 0xff:'Void'}
+
+U16 = struct.Struct('<H')
+U32 = struct.Struct('<I')
+U64 = struct.Struct('<Q')
+I64 = struct.Struct('<q')
+COIN = struct.Struct('<32sH') #prevhash, index
+OUTPUT = struct.Struct('<32sq20s') #asset, Fixed8 value, script hash
+
+ADDRESS_CACHE_SIZE = 100000
+addresses = {} #script hash -> address, base58 is the slowest step of a parse
+
+
+def fixed8(v):
+    '''Fixed8.ToString(): 150000000 -> "1.5"'''
+    sign = '-' if v < 0 else ''
+    q, r = divmod(abs(v), 100000000)
+    if not r: return '%s%d' % (sign, q)
+    return ('%s%d.%08d' % (sign, q, r)).rstrip('0')
+
+def uint256(b):
+    return '0x' + b[::-1].hex()
+
+def address(sh):
+    a = addresses.get(sh)
+    if a is None:
+        if len(addresses) >= ADDRESS_CACHE_SIZE: addresses.clear()
+        a = addresses[sh] = CT.scripthash_to_address(sh.hex())
+    return a
+
+def script_hash(script):
+    return '0x' + hashlib.new('ripemd160', hashlib.sha256(script).digest()).digest()[::-1].hex()
+
+
+class Reader:
+    '''
+    no bounds checks on the hot path: reading past the end raises IndexError
+    or struct.error, or leaves pos beyond the end, parse_block turns all of
+    them into ValueError.
+    '''
+    __slots__ = ('data', 'pos')
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, n):
+        self.pos += n
+        return self.data[self.pos-n:self.pos]
+
+    def unpack(self, s):
+        v = s.unpack_from(self.data, self.pos)
+        self.pos += s.size
+        return v if len(v) > 1 else v[0]
+
+    def byte(self):
+        self.pos += 1
+        return self.data[self.pos-1]
+
+    def varint(self):
+        b = self.byte()
+        if b < 0xfd: return b
+        if 0xfd == b: return self.unpack(U16)
+        if 0xfe == b: return self.unpack(U32)
+        return self.unpack(U64)
+
+    def varbytes(self):
+        return self.read(self.varint())
+
+    def varstring(self):
+        return self.varbytes().decode('utf8')
+
+    def ecpoint(self):
+        '''compressed encoding, like ECPoint.ToString()'''
+        b = self.byte()
+        if 0x00 == b: return '00'
+        if b in (0x02, 0x03): return '%02x' % b + self.read(32).hex()
+        if 0x04 == b:
+            xy = self.read(64)
+            return ('02' if 0 == xy[-1] % 2 else '03') + xy[:32].hex()
+        raise ValueError('bad ECPoint prefix {}'.format(b))
+
+    def coin(self):
+        prevhash, index = self.unpack(COIN)
+        return {'txid':uint256(prevhash), 'vout':index}
+
+    def output(self, n):
+        asset, value, sh = self.unpack(OUTPUT)
+        return {'n':n, 'asset':uint256(asset), 'value':fixed8(value), 'address':address(sh)}
+
+    def witness(self):
+        return {'invocation':self.varbytes().hex(), 'verification':self.varbytes().hex()}
+
+    def attribute(self):
+        usage = self.byte()
+        name = ATTRIBUTE_USAGES.get(usage)
+        if name is None: raise ValueError('bad attribute usage {}'.format(usage))
+        if usage in (0x02, 0x03): data = bytes([usage]) + self.read(32)
+        elif 0x20 == usage: data = self.read(20)
+        elif 0x81 == usage: data = self.read(self.byte())
+        elif 0x90 == usage or usage >= 0xf0: data = self.varbytes()
+        else: data = self.read(32)
+        return {'usage':name, 'data':data.hex()}
+
+
+def parse_exclusive(r, tx):
+    '''type specific fields, between version and attributes'''
+    t = tx['type']
+    if 'MinerTransaction' == t:
+        tx['nonce'] = r.unpack(U32)
+    elif 'ClaimTransaction' == t:
+        tx['claims'] = [r.coin() for i in range(r.varint())]
+    elif 'EnrollmentTransaction' == t:
+        tx['pubkey'] = r.ecpoint()
+    elif 'RegisterTransaction' == t:
+        asset_type = r.byte()
+        name = r.varstring()
+        try:
+            name = json.loads(name) if name else None
+        except ValueError:
+            pass
+        tx['asset'] = {
+                'type':ASSET_TYPES.get(asset_type, asset_type),
+                'name':name,
+                'amount':fixed8(r.unpack(I64)),
+                'precision':r.byte(),
+                'owner':r.ecpoint(),
+                'admin':address(r.read(20)),
+                }
+    elif 'StateTransaction' == t:
+        tx['descriptors'] = [{
+                'type':STATE_TYPES.get(r.byte()),
+                'key':r.varbytes().hex(),
+                'field':r.varstring(),
+                'value':r.varbytes().hex(),
+                } for i in range(r.varint())]
+    elif 'PublishTransaction' == t:
+        script = r.varbytes()
+        parameters = [PARAMETER_TYPES.get(p, p) for p in r.varbytes()]
+        returntype = PARAMETER_TYPES.get(r.byte())
+        needstorage = bool(r.byte()) if tx['version'] >= 1 else False
+        tx['contract'] = {
+                'code':{'hash':script_hash(script), 'script':script.hex(), 'parameters':parameters, 'returntype':returntype},
+                'needstorage':needstorage,
+                'name':r.varstring(),
+                'version':r.varstring(),
+                'author':r.varstring(),
+                'email':r.varstring(),
+                'description':r.varstring(),
+                }
+    elif 'InvocationTransaction' == t:
+        tx['script'] = r.varbytes().hex()
+        tx['gas'] = fixed8(r.unpack(I64)) if tx['version'] >= 1 else '0'
+
+def system_fee(tx):
+    t = tx['type']
+    if 'InvocationTransaction' == t: return tx['gas']
+    if 'IssueTransaction' == t and (tx['version'] >= 1 or all(o['asset'] in (NEO, GAS) for o in tx['vout'])): return '0'
+    return str(SYSTEM_FEE.get(t, 0))
+
+def parse_transaction(r):
+    start = r.pos
+    t = r.byte()
+    if t not in TX_TYPES: raise ValueError('bad transaction type {} at {}'.format(t, start))
+    tx = {'txid':None, 'size':0, 'type':TX_TYPES[t], 'version':r.byte()}
+    parse_exclusive(r, tx)
+    tx['attributes'] = [r.attribute() for i in range(r.varint())]
+    tx['vin'] = [r.coin() for i in range(r.varint())]
+    tx['vout'] = [r.output(i) for i in range(r.varint())]
+    tx['txid'] = uint256(CT.hash256(r.data[start:r.pos]))
+    tx['sys_fee'] = system_fee(tx)
+    tx['scripts'] = [r.witness() for i in range(r.varint())]
+    tx['size'] = r.pos - start
+    return tx
+
+def parse_block(data):
+    '''data: bytes or the hex string returned by getblock [height,0]'''
+    if isinstance(data, str): data = unhexlify(data)
+    try:
+        return read_block(Reader(data))
+    except (IndexError, struct.error) as e:
+        raise ValueError('unexpected end of data: {}'.format(e))
+
+def read_block(r):
+    data = r.data
+    block = {
+            'version':r.unpack(U32),
+            'previousblockhash':uint256(r.read(32)),
+            'merkleroot':uint256(r.read(32)),
+            'time':r.unpack(U32),
+            'index':r.unpack(U32),
+            'nonce':'%016x' % r.unpack(U64),
+            'nextconsensus':address(r.read(20)),
+            }
+    block['hash'] = uint256(CT.hash256(data[:r.pos]))
+    if 1 != r.byte(): raise ValueError('block {} has no witness'.format(block['index']))
+    block['script'] = r.witness()
+    block['tx'] = [parse_transaction(r) for i in range(r.varint())]
+    if r.pos != len(data): raise ValueError('block {} ends at {} of {} bytes'.format(block['index'], r.pos, len(data)))
+    block['size'] = len(data)
+    return block
@@ -0,0 +1,88 @@
+import unittest
+import struct
+import hashlib
+
+from RawBlock import parse_block, parse_transaction, Reader, fixed8, NEO, GAS
+from CommonTool import CommonTool as CT
+
+def varbytes(b):
+    return bytes([len(b)]) + b
+
+def hash160(b):
+    return hashlib.new('ripemd160', hashlib.sha256(b).digest()).digest()
+
+def register(asset_type, name, precision, admin):
+    '''the genesis RegisterTransaction of NEO or GAS'''
+    name = name.encode('utf8')
+    return bytes([0x40, 0, asset_type]) + varbytes(name) + struct.pack('<q', 10**16) + bytes([precision, 0]) + hash160(admin) + b'\x00\x00\x00'
+
+SH = hash160(b'\x51')
+SPENT = bytes(range(32))
+WITNESS = b'\x01' + varbytes(b'\x40' + b'\x11' * 64) + varbytes(b'\x21' + b'\x02' * 33 + b'\xac')
+
+def contract():
+    '''1 Script attribute, 1 vin, 2 vouts, 1 witness'''
+    return (bytes([0x80, 0]) + b'\x01\x20' + SH + b'\x01' + SPENT + struct.pack('<H', 3) +
+            b'\x02' + bytes.fromhex(NEO[2:])[::-1] + struct.pack('<q', 5 * 10**8) + SH +
+            bytes.fromhex(GAS[2:])[::-1] + struct.pack('<q', 150000000) + SH + WITNESS)
+
+def invocation(gas):
+    script = bytes.fromhex('0568656c6c6f')
+    return bytes([0xd1, 1]) + varbytes(script) + struct.pack('<q', gas) + b'\x00\x00\x00' + WITNESS
+
+def claim():
+    return bytes([0x02, 0]) + b'\x02' + SPENT + b'\x00\x00' + SPENT + b'\x01\x00' + b'\x00\x00\x00' + WITNESS
+
+def miner(nonce):
+    return bytes([0, 0]) + struct.pack('<I', nonce) + b'\x00\x00\x00\x00'
+
+def block(index, txs):
+    header = struct.pack('<I', 0) + SPENT + SPENT[::-1] + struct.pack('<IIQ', 1468595301 + index, index, 2083236893) + SH
+    return header + WITNESS + bytes([len(txs)]) + b''.join(txs), header
+
+
+class TestRawBlock(unittest.TestCase):
+    def test_genesis_txids(self):
+        tx = parse_transaction(Reader(miner(2083236893) + b'\x00'))
+        self.assertEqual('0xfb5bd72b2d6792d75dc2f1084ffa9e9f70ca85543c717a6b13d9959b452a57d6', tx['txid'])
+        self.assertEqual(2083236893, tx['nonce'])
+        self.assertEqual('0', tx['sys_fee'])
+        neo = parse_transaction(Reader(register(0x00, '[{"lang":"zh-CN","name":"小蚁股"},{"lang":"en","name":"AntShare"}]', 0, b'\x51') + b'\x00'))
+        self.assertEqual(NEO, neo['txid'])
+        self.assertEqual({'type':'GoverningToken', 'name':[{'lang':'zh-CN','name':'小蚁股'},{'lang':'en','name':'AntShare'}],
+            'amount':'100000000', 'precision':0, 'owner':'00', 'admin':CT.scripthash_to_address(SH.hex())}, neo['asset'])
+        self.assertEqual('10000', neo['sys_fee'])
+        gas = parse_transaction(Reader(register(0x01, '[{"lang":"zh-CN","name":"小蚁币"},{"lang":"en","name":"AntCoin"}]', 8, b'\x00') + b'\x00'))
+        self.assertEqual(GAS, gas['txid'])
+        self.assertEqual('UtilityToken', gas['asset']['type'])
+
+    def test_block(self):
+        txs = [miner(1), contract(), invocation(2 * 10**8), claim()]
+        raw, header = block(7, txs)
+        b = parse_block(raw.hex())
+        self.assertEqual('0x' + CT.hash256(header)[::-1].hex(), b['hash'])
+        self.assertEqual((7, 1468595308, len(raw), '000000007c2bac1d'), (b['index'], b['time'], b['size'], b['nonce']))
+        self.assertEqual(['MinerTransaction', 'ContractTransaction', 'InvocationTransaction', 'ClaimTransaction'], [tx['type'] for tx in b['tx']])
+        self.assertEqual([len(tx) for tx in txs], [tx['size'] for tx in b['tx']])
+        c = b['tx'][1]
+        self.assertEqual('0x' + CT.hash256(txs[1][:-len(WITNESS)])[::-1].hex(), c['txid'])
+        self.assertEqual([{'usage':'Script', 'data':SH.hex()}], c['attributes'])
+        self.assertEqual([{'txid':'0x' + SPENT[::-1].hex(), 'vout':3}], c['vin'])
+        address = CT.scripthash_to_address(SH.hex())
+        self.assertEqual([{'n':0, 'asset':NEO, 'value':'5', 'address':address}, {'n':1, 'asset':GAS, 'value':'1.5', 'address':address}], c['vout'])
+        self.assertEqual(WITNESS[2:67].hex(), c['scripts'][0]['invocation'])
+        i = b['tx'][2]
+        self.assertEqual(('0568656c6c6f', '2', '2'), (i['script'], i['gas'], i['sys_fee']))
+        self.assertEqual([{'txid':'0x' + SPENT[::-1].hex(), 'vout':0}, {'txid':'0x' + SPENT[::-1].hex(), 'vout':1}], b['tx'][3]['claims'])
+
+    def test_bad_data(self):
+        raw, header = block(1, [contract()])
+        for bad in [raw[:-1], raw + b'\x00', raw[:len(header)] + b'\x00' + raw[len(header)+1:]]:
+            with self.assertRaises(ValueError): parse_block(bad)
+
+    def test_fixed8(self):
+        self.assertEqual(['0', '1', '0.00000001', '123.4', '-0.00000001'], [fixed8(v) for v in [0, 10**8, 1, 12340000000, -1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
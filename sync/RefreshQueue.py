@@ -0,0 +1,70 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import heapq
+from CommonTool import CommonTool as CT
+
+
+class RefreshQueue:
+    '''
+    (address, asset) pairs waiting for a balance refresh, the in-memory
+    side of upt. an entry is (address, asset, update_height, since,
+    requested): since is the height it became stale at, update_height the
+    last height it changed at, requested the unix time of the last api
+    request for it. the most stale first, a pair requested through the api
+    within REQUEST_WINDOW seconds counts up to REQUEST_BOOST blocks more
+    stale, fading linearly; the boost is taken when the entry is pushed.
+    pushing a pair already queued merges the two.
+    '''
+    REQUEST_BOOST = 10000
+    REQUEST_WINDOW = 600
+
+    def __init__(self):
+        self.entries = {} #(address, asset) -> [priority, update_height, since, requested]
+        self.heap = [] #(priority, address, asset), outdated ones are skipped
+
+    def __len__(self):
+        return len(self.entries)
+
+    def priority(self, since, requested, now=None):
+        if now is None: now = CT.now()
+        boost = self.REQUEST_BOOST * max(0.0, 1 - (now - requested) / self.REQUEST_WINDOW) if requested else 0
+        return since - boost
+
+    def push(self, address, asset, update_height, since, requested=0):
+        key = (address, asset)
+        e = self.entries.get(key)
+        if e is not None:
+            update_height = max(update_height, e[1])
+            since = min(since, e[2])
+            requested = max(requested, e[3])
+        p = self.priority(since, requested)
+        if e is None or p != e[0]: heapq.heappush(self.heap, (p, address, asset))
+        self.entries[key] = [p, update_height, since, requested]
+
+    def pop(self, n, height):
+        '''up to n entries changed before height, most urgent first'''
+        result = []
+        later = []
+        while self.heap and len(result) < n:
+            p, address, asset = heapq.heappop(self.heap)
+            e = self.entries.get((address, asset))
+            if e is None or e[0] != p: continue
+            if e[1] >= height:
+                later.append((p, address, asset))
+                continue
+            del self.entries[(address, asset)]
+            result.append((address, asset, e[1], e[2], e[3]))
+        for item in later: heapq.heappush(self.heap, item)
+        if len(self.heap) > 2 * len(self.entries) + 1000:
+            self.heap = [(e[0],) + k for k, e in self.entries.items()]
+            heapq.heapify(self.heap)
+        return result
+
+    def percentiles(self, height, ps=(50, 90, 99)):
+        '''blocks the entries have been stale for'''
+        ages = sorted(height - e[2] for e in self.entries.values())
+        if not ages: return [0 for p in ps]
+        return [ages[min(len(ages) - 1, len(ages) * p // 100)] for p in ps]
@@ -0,0 +1,48 @@
+import unittest
+
+from RefreshQueue import RefreshQueue
+from CommonTool import CommonTool as CT
+
+
+class TestRefreshQueue(unittest.TestCase):
+    def test_most_stale_first(self):
+        q = RefreshQueue()
+        q.push('A', 'x', 500, 500)
+        q.push('B', 'x', 100, 100)
+        q.push('C', 'x', 300, 300)
+        self.assertEqual(['B', 'C', 'A'], [e[0] for e in q.pop(10, 1000)])
+        self.assertEqual(0, len(q))
+
+    def test_coalesce(self):
+        q = RefreshQueue()
+        q.push('A', 'x', 100, 100)
+        q.push('B', 'x', 200, 200)
+        q.push('A', 'x', 900, 900) #touched again, still stale since 100
+        self.assertEqual(2, len(q))
+        self.assertEqual([('A', 'x', 900, 100, 0)], q.pop(1, 1000))
+        self.assertEqual([('B', 'x', 200, 200, 0)], q.pop(5, 1000))
+
+    def test_not_before_height(self):
+        q = RefreshQueue()
+        q.push('A', 'x', 50, 10)
+        q.push('B', 'x', 20, 20)
+        self.assertEqual(['B'], [e[0] for e in q.pop(5, 30)])
+        self.assertEqual(['A'], [e[0] for e in q.pop(5, 51)])
+
+    def test_requested_jumps_ahead(self):
+        q = RefreshQueue()
+        for i in range(100): q.push('dust%s' % i, 'x', 1000 + i, 1000 + i)
+        q.push('popular', 'x', 5000, 5000, int(CT.now()))
+        self.assertEqual('popular', q.pop(1, 10000)[0][0])
+        q.push('old', 'x', 5000, 5000, int(CT.now()) - 2 * q.REQUEST_WINDOW)
+        self.assertEqual('dust0', q.pop(1, 10000)[0][0])
+
+    def test_percentiles(self):
+        q = RefreshQueue()
+        self.assertEqual([0, 0, 0], q.percentiles(100))
+        for i in range(100): q.push('A%s' % i, 'x', i, i)
+        self.assertEqual([51, 91, 100], q.percentiles(100)) #stale for 1 to 100 blocks
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import random
+import asyncio
+from logzero import logger
+from CommonTool import CommonTool as CT
+from Metrics import metrics
+
+
+class GiveUp(Exception):
+    '''every attempt of a Retry failed, the last error is the __cause__'''
+    pass
+
+
+class Retry:
+    '''
+    bounded retries with full jitter exponential backoff and a deadline.
+    func is a coroutine function called once per attempt; the deadline
+    covers all attempts and the sleeps between them, an attempt still
+    running when it passes is cancelled. errors for which transient(e) is
+    false are raised at once. counters:
+        <name>.retries      attempts after the first
+        <name>.giveups      calls which ran out of attempts or time
+        <name>.time_lost    seconds spent in failed attempts and backoff
+    '''
+    def __init__(self, name, attempts=3, backoff=0.5, max_backoff=30, deadline=None, transient=None):
+        self.name = name
+        self.attempts = max(1, int(attempts))
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.transient = transient or (lambda e:True)
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def run(self, func, pause=None):
+        '''pause() tells whether to back off before the next attempt, default always'''
+        time_a = CT.now()
+        for attempt in range(self.attempts):
+            time_b = CT.now()
+            try:
+                if self.deadline is None: return await func()
+                return await asyncio.wait_for(func(), max(0, self.deadline - (time_b - time_a)))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.incr('%s.time_lost' % self.name, CT.now() - time_b)
+                if not self.transient(e): raise
+                error = e
+            left = None if self.deadline is None else self.deadline - (CT.now() - time_a)
+            if attempt + 1 == self.attempts or (left is not None and left <= 0): break
+            metrics.incr('%s.retries' % self.name)
+            if pause is None or pause():
+                wait = self.delay(attempt)
+                if left is not None: wait = min(wait, left)
+                metrics.incr('%s.time_lost' % self.name, wait)
+                await asyncio.sleep(wait)
+        metrics.incr('%s.giveups' % self.name)
+        logger.error('%s give up after %.3fs: %s' % (self.name, CT.now() - time_a, error))
+        raise GiveUp('{} give up: {}'.format(self.name, error)) from error
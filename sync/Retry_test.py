@@ -0,0 +1,76 @@
+import unittest
+import asyncio
+
+from Retry import Retry, GiveUp
+from Metrics import metrics
+
+loop = asyncio.new_event_loop()
+
+def async_test(coro):
+    def wrapper(*args, **kwargs):
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+class Flaky:
+    '''fails the first n calls, optionally by hanging'''
+    def __init__(self, n, error=ValueError, hang=0):
+        self.n = n
+        self.error = error
+        self.hang = hang
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.calls <= self.n:
+            if self.hang: await asyncio.sleep(self.hang)
+            raise self.error('call %s' % self.calls)
+        return self.calls
+
+
+class TestRetry(unittest.TestCase):
+    def counters(self, name):
+        return [metrics.counters.get('%s.%s' % (name, c), 0) for c in ['retries', 'giveups']]
+
+    def test_jitter_is_bounded(self):
+        r = Retry('t.jitter', backoff=1, max_backoff=5)
+        delays = [r.delay(a) for a in range(10) for i in range(20)]
+        self.assertTrue(all(0 <= d <= 5 for d in delays))
+        self.assertGreater(len(set(delays)), 100)
+
+    @async_test
+    async def test_retry_then_succeed(self):
+        f = Flaky(2)
+        self.assertEqual(3, await Retry('t.ok', attempts=3, backoff=0.01).run(f))
+        self.assertEqual([2, 0], self.counters('t.ok'))
+        self.assertGreater(metrics.counters['t.ok.time_lost'], 0)
+
+    @async_test
+    async def test_give_up(self):
+        f = Flaky(5)
+        with self.assertRaises(GiveUp) as cm:
+            await Retry('t.giveup', attempts=3, backoff=0.01).run(f, pause=lambda:False)
+        self.assertEqual(3, f.calls)
+        self.assertIsInstance(cm.exception.__cause__, ValueError)
+        self.assertEqual([2, 1], self.counters('t.giveup'))
+
+    @async_test
+    async def test_permanent_error_is_not_retried(self):
+        f = Flaky(5, error=KeyError)
+        with self.assertRaises(KeyError):
+            await Retry('t.permanent', attempts=3, backoff=0.01, transient=lambda e:isinstance(e, ValueError)).run(f)
+        self.assertEqual(1, f.calls)
+        self.assertEqual([0, 0], self.counters('t.permanent'))
+
+    @async_test
+    async def test_deadline(self):
+        f = Flaky(5, hang=1)
+        time_a = loop.time()
+        with self.assertRaises(GiveUp) as cm:
+            await Retry('t.deadline', attempts=5, backoff=0.01, deadline=0.1).run(f)
+        self.assertLess(loop.time() - time_a, 0.5)
+        self.assertEqual(1, f.calls)
+        self.assertIsInstance(cm.exception.__cause__, asyncio.TimeoutError)
+
+
+if __name__ == '__main__':
+    unittest.main()
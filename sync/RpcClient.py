@@ -0,0 +1,68 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import asyncio
+from logzero import logger
+from Codec import codec
+
+
+class RpcError(Exception):
+    pass
+
+
+class RpcAppError(RpcError):
+    '''the node answered with a JSON-RPC error object: the request is wrong, not the node'''
+    pass
+
+
+class RpcClient:
+    '''JSON-RPC client which packs many calls of one method into array requests'''
+    def __init__(self, session, uri, batch_size=100, timeout=60):
+        self.session = session
+        self.uri = uri
+        self.batch_size = max(1, int(batch_size))
+        self.timeout = timeout
+        self.batch_supported = True
+
+    async def post(self, payload):
+        async with self.session.post(self.uri, timeout=self.timeout, json=payload) as resp:
+            if 200 != resp.status:
+                raise RpcError('visit {} get http status {}'.format(self.uri, resp.status))
+            return codec.loads(await resp.read())
+
+    @staticmethod
+    def get_result(j):
+        if isinstance(j, dict) and 'result' not in j and j.get('error'):
+            raise RpcAppError('error response {}'.format(j['error']))
+        if not isinstance(j, dict) or 'result' not in j:
+            raise RpcError('bad response {}'.format(j))
+        return j['result']
+
+    async def call(self, method, params, id=1):
+        j = await self.post({'jsonrpc':'2.0','method':method,'params':params,'id':id})
+        return self.get_result(j)
+
+    async def call_many(self, method, params_list):
+        results = await asyncio.gather(*[self.call(method, p) for p in params_list])
+        return list(results)
+
+    async def batch_chunk(self, method, params_list):
+        if self.batch_supported and len(params_list) > 1:
+            payload = [{'jsonrpc':'2.0','method':method,'params':params_list[i],'id':i} for i in range(len(params_list))]
+            #http errors and timeouts are raised for a retry, only a reply which is no batch turns batching off
+            j = await self.post(payload)
+            if isinstance(j, list) and len(j) == len(payload):
+                results = {r.get('id'):r for r in j if isinstance(r, dict)}
+                if len(results) == len(payload):
+                    return [self.get_result(results[i]) for i in range(len(payload))]
+            logger.warning('{} rejects batch requests, fall back to single calls'.format(self.uri))
+            self.batch_supported = False
+        return await self.call_many(method, params_list)
+
+    async def batch(self, method, params_list):
+        '''results come back in the same order as params_list'''
+        chunks = [params_list[i:i+self.batch_size] for i in range(0, len(params_list), self.batch_size)]
+        results = await asyncio.gather(*[self.batch_chunk(method, c) for c in chunks])
+        return [r for chunk in results for r in chunk]
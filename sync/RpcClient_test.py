@@ -0,0 +1,79 @@
+import unittest
+import asyncio
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from RpcClient import RpcClient, RpcError
+
+loop = asyncio.new_event_loop()
+
+def async_test(coro):
+    def wrapper(*args, **kwargs):
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+def fake_node(support_batch=True, hiccups=0):
+    '''getblock returns {"index":height}, counts http requests, the first hiccups get a 500'''
+    requests = []
+    def answer(j):
+        if 'getblock' != j['method']:
+            return {'jsonrpc':'2.0','id':j['id'],'error':{'code':-32601,'message':'Method not found'}}
+        return {'jsonrpc':'2.0','id':j['id'],'result':{'index':j['params'][0]}}
+    async def handler(request):
+        j = await request.json()
+        requests.append(j)
+        if len(requests) <= hiccups: return web.Response(status=500)
+        if isinstance(j, list):
+            if not support_batch:
+                return web.json_response({'jsonrpc':'2.0','id':None,'error':{'code':-32600,'message':'Invalid Request'}})
+            return web.json_response([answer(i) for i in reversed(j)])
+        return web.json_response(answer(j))
+    app = web.Application()
+    app.router.add_post('/', handler)
+    return TestServer(app), requests
+
+
+class TestRpcClient(unittest.TestCase):
+    async def run_batch(self, support_batch, method='getblock', n=25, hiccups=0):
+        server, requests = fake_node(support_batch, hiccups)
+        await server.start_server()
+        try:
+            async with aiohttp.ClientSession() as session:
+                rpc = RpcClient(session, str(server.make_url('/')), batch_size=10)
+                if hiccups:
+                    with self.assertRaises(RpcError):
+                        await rpc.batch_chunk(method, [[h,1] for h in range(10)])
+                results = await rpc.batch(method, [[h,1] for h in range(n)])
+                return rpc, results, requests
+        finally:
+            await server.close()
+
+    @async_test
+    async def test_batch(self):
+        rpc, results, requests = await self.run_batch(True)
+        self.assertEqual([{'index':h} for h in range(25)], results)
+        self.assertEqual(3, len(requests))
+        self.assertTrue(rpc.batch_supported)
+
+    @async_test
+    async def test_fallback(self):
+        rpc, results, requests = await self.run_batch(False)
+        self.assertEqual([{'index':h} for h in range(25)], results)
+        self.assertFalse(rpc.batch_supported)
+
+    @async_test
+    async def test_hiccup_keeps_batching(self):
+        rpc, results, requests = await self.run_batch(True, hiccups=1)
+        self.assertEqual([{'index':h} for h in range(25)], results)
+        self.assertTrue(rpc.batch_supported)
+        self.assertEqual(4, len(requests))
+
+    @async_test
+    async def test_error(self):
+        with self.assertRaises(RpcError):
+            await self.run_batch(True, method='getblockhash')
+
+
+if __name__ == '__main__':
+    unittest.main()
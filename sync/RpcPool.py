@@ -0,0 +1,164 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import asyncio
+from collections import deque
+from logzero import logger
+from CommonTool import CommonTool as CT
+from RpcClient import RpcClient, RpcError, RpcAppError
+from Retry import Retry
+
+
+class Endpoint:
+    LATENCY_SAMPLES = 256
+
+    def __init__(self, client):
+        self.client = client
+        self.height = 0
+        self.latencies = deque(maxlen=self.LATENCY_SAMPLES)
+        self.inflight = 0
+        self.calls = 0
+        self.errors = 0
+        self.failures = 0 #consecutive
+        self.ejected_until = 0
+
+    @property
+    def uri(self):
+        return self.client.uri
+
+    def percentile(self, p):
+        if not self.latencies: return 0
+        s = sorted(self.latencies)
+        return s[min(len(s)-1, int(len(s)*p))]
+
+    def healthy(self, now):
+        return now >= self.ejected_until
+
+    def score(self):
+        '''expected wait, lower is better; unknown nodes score 0 so they get tried'''
+        return (self.inflight + 1) * (self.percentile(0.5) + self.percentile(0.99) / 10)
+
+    def succeed(self, cost):
+        self.calls += 1
+        self.failures = 0
+        self.latencies.append(cost)
+
+    def fail(self, now, backoff, max_backoff):
+        self.calls += 1
+        self.errors += 1
+        self.failures += 1
+        self.ejected_until = now + min(max_backoff, backoff * 2 ** (self.failures - 1))
+
+    def stats(self):
+        return {
+                'uri':self.uri,
+                'height':self.height,
+                'p50':round(self.percentile(0.5), 6),
+                'p99':round(self.percentile(0.99), 6),
+                'calls':self.calls,
+                'errors':self.errors,
+                'ejected':not self.healthy(CT.now()),
+                }
+
+
+class RpcPool:
+    '''
+    route each RPC to the best healthy endpoint, eject failing ones with
+    exponential backoff. a failed call moves on to the next untried healthy
+    endpoint at once and only sleeps (jittered) when none is left; deadline
+    bounds one call including its retries, counters are rpc.retries,
+    rpc.giveups and rpc.time_lost. an error object from the node
+    (RpcAppError: unknown txid, bad address, ...) is the answer to that
+    request, it is raised at once and the endpoint stays healthy.
+    '''
+    def __init__(self, session, uris, batch_size=100, timeout=60, retries=3, backoff=1, max_backoff=60, deadline=None):
+        self.session = session
+        self.batch_size = max(1, int(batch_size))
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry = Retry('rpc', retries, backoff, max_backoff, deadline, lambda e:not isinstance(e, RpcAppError))
+        self.endpoints = {}
+        for uri in uris: self.add(uri)
+
+    def add(self, uri):
+        if uri not in self.endpoints.keys():
+            self.endpoints[uri] = Endpoint(RpcClient(self.session, uri, self.batch_size, self.timeout))
+            logger.info('add rpc endpoint {}'.format(uri))
+
+    @property
+    def height(self):
+        now = CT.now()
+        heights = [e.height for e in self.endpoints.values() if e.healthy(now)]
+        if not heights: heights = [e.height for e in self.endpoints.values()]
+        return max(heights)
+
+    def pick(self, min_height=0, exclude=()):
+        now = CT.now()
+        candidates = [e for e in self.endpoints.values() if e not in exclude]
+        if not candidates: candidates = list(self.endpoints.values())
+        synced = [e for e in candidates if e.height >= min_height]
+        if synced: candidates = synced
+        healthy = [e for e in candidates if e.healthy(now)]
+        if healthy: return min(healthy, key=lambda e:(e.score(), e.inflight))
+        return min(candidates, key=lambda e:e.ejected_until)
+
+    async def request(self, endpoint, coro):
+        endpoint.inflight += 1
+        time_a = CT.now()
+        try:
+            result = await coro
+            endpoint.succeed(CT.now() - time_a)
+            return result
+        except asyncio.CancelledError:
+            raise
+        except RpcAppError:
+            endpoint.succeed(CT.now() - time_a)
+            raise
+        except Exception as e:
+            endpoint.fail(CT.now(), self.backoff, self.max_backoff)
+            logger.warning('rpc endpoint {} failure({} in a row): {}'.format(endpoint.uri, endpoint.failures, e))
+            raise
+        finally:
+            endpoint.inflight -= 1
+
+    def fresh(self, min_height, tried):
+        '''an endpoint not tried yet is healthy and synced, no need to wait before the next attempt'''
+        now = CT.now()
+        return any(e.healthy(now) and e.height >= min_height for e in self.endpoints.values() if e not in tried)
+
+    async def with_retry(self, min_height, func):
+        tried = []
+        async def attempt():
+            endpoint = self.pick(min_height, tried)
+            tried.append(endpoint)
+            return await self.request(endpoint, func(endpoint.client))
+        return await self.retry.run(attempt, pause=lambda:not self.fresh(min_height, tried))
+
+    async def call(self, method, params, min_height=0):
+        return await self.with_retry(min_height, lambda c:c.call(method, params))
+
+    async def batch(self, method, params_list, min_height=0):
+        '''chunks are routed one by one, so a big batch spreads over all healthy nodes'''
+        chunks = [params_list[i:i+self.batch_size] for i in range(0, len(params_list), self.batch_size)]
+        results = await asyncio.gather(*[self.with_retry(min_height, lambda c,chunk=chunk:c.batch_chunk(method, chunk)) for chunk in chunks])
+        return [r for chunk in results for r in chunk]
+
+    async def update_height(self, endpoint):
+        endpoint.height = await self.request(endpoint, endpoint.client.call('getblockcount', []))
+
+    async def get_block_count(self):
+        '''probe every healthy endpoint, return the best height'''
+        now = CT.now()
+        endpoints = [e for e in self.endpoints.values() if e.healthy(now)]
+        if not endpoints: endpoints = [self.pick()]
+        results = await asyncio.gather(*[self.update_height(e) for e in endpoints], return_exceptions=True)
+        if all(isinstance(r, Exception) for r in results):
+            raise RpcError('Unable to fetch blockcount from any endpoint')
+        return self.height
+
+    def stats(self):
+        return [e.stats() for e in self.endpoints.values()]
@@ -0,0 +1,134 @@
+import unittest
+import asyncio
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from RpcPool import RpcPool
+from RpcClient import RpcAppError
+from Retry import GiveUp
+from Metrics import metrics
+
+loop = asyncio.new_event_loop()
+
+def async_test(coro):
+    def wrapper(*args, **kwargs):
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+class FakeNode:
+    '''answers getblockcount/getblock, can be made slow or broken'''
+    def __init__(self, height, delay=0, broken=False):
+        self.height = height
+        self.delay = delay
+        self.broken = broken
+        self.requests = 0
+        app = web.Application()
+        app.router.add_post('/', self.handler)
+        self.server = TestServer(app)
+
+    def answer(self, j):
+        if 'getblockcount' == j['method']:
+            return {'jsonrpc':'2.0','id':j['id'],'result':self.height}
+        if 'getrawtransaction' == j['method']:
+            return {'jsonrpc':'2.0','id':j['id'],'error':{'code':-100,'message':'Unknown transaction'}}
+        return {'jsonrpc':'2.0','id':j['id'],'result':{'index':j['params'][0]}}
+
+    async def handler(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        if self.broken: return web.Response(status=500)
+        j = await request.json()
+        if isinstance(j, list): return web.json_response([self.answer(i) for i in j])
+        return web.json_response(self.answer(j))
+
+    @property
+    def uri(self):
+        return str(self.server.make_url('/'))
+
+
+class TestRpcPool(unittest.TestCase):
+    async def run_pool(self, nodes, func, **kwargs):
+        for n in nodes: await n.server.start_server()
+        try:
+            async with aiohttp.ClientSession() as session:
+                pool = RpcPool(session, [n.uri for n in nodes], **kwargs)
+                return pool, await func(pool)
+        finally:
+            for n in nodes: await n.server.close()
+
+    @async_test
+    async def test_height(self):
+        nodes = [FakeNode(100), FakeNode(120), FakeNode(130, broken=True)]
+        async def func(pool):
+            height = await pool.get_block_count()
+            block = await pool.call('getblock', [110,1], min_height=111)
+            return height, block
+        pool, (height, block) = await self.run_pool(nodes, func)
+        self.assertEqual(120, height)
+        self.assertEqual({'index':110}, block)
+        self.assertEqual(1, nodes[0].requests)
+        self.assertEqual(2, nodes[1].requests)
+        self.assertTrue(pool.stats()[2]['ejected'])
+
+    @async_test
+    async def test_eject_and_retry(self):
+        nodes = [FakeNode(100, broken=True), FakeNode(100)]
+        async def func(pool):
+            return [await pool.call('getblock', [i,1]) for i in range(5)]
+        pool, blocks = await self.run_pool(nodes, func, backoff=60)
+        self.assertEqual([{'index':i} for i in range(5)], blocks)
+        self.assertEqual(1, nodes[0].requests)
+        self.assertEqual(5, nodes[1].requests)
+
+    @async_test
+    async def test_error_reply_keeps_endpoint(self):
+        nodes = [FakeNode(100), FakeNode(100)]
+        async def func(pool):
+            for params in [['aa',1], [['aa',1], ['bb',1]]]:
+                with self.assertRaises(RpcAppError):
+                    if isinstance(params[0], list): await pool.batch('getrawtransaction', params)
+                    else: await pool.call('getrawtransaction', params)
+            return await pool.call('getblock', [1,1])
+        pool, block = await self.run_pool(nodes, func, backoff=60)
+        self.assertEqual({'index':1}, block)
+        self.assertEqual(3, nodes[0].requests + nodes[1].requests) #not retried on the other node
+        self.assertEqual([False, False], [s['ejected'] for s in pool.stats()])
+        self.assertEqual(0, sum(s['errors'] for s in pool.stats()))
+
+    @async_test
+    async def test_spread_and_latency(self):
+        nodes = [FakeNode(100, delay=0.05), FakeNode(100, delay=0.05)]
+        async def func(pool):
+            return await pool.batch('getblock', [[i,1] for i in range(40)])
+        pool, blocks = await self.run_pool(nodes, func, batch_size=10)
+        self.assertEqual([{'index':i} for i in range(40)], blocks)
+        self.assertEqual(2, nodes[0].requests)
+        self.assertEqual(2, nodes[1].requests)
+        for s in pool.stats(): self.assertGreaterEqual(s['p99'], 0.05)
+
+    @async_test
+    async def test_give_up_with_counters(self):
+        nodes = [FakeNode(100, broken=True)]
+        before = [metrics.counters.get(c, 0) for c in ['rpc.retries', 'rpc.giveups']]
+        async def func(pool):
+            with self.assertRaises(GiveUp):
+                await pool.call('getblock', [1,1])
+        await self.run_pool(nodes, func, retries=3, backoff=0.01)
+        self.assertEqual(3, nodes[0].requests)
+        self.assertEqual([before[0] + 2, before[1] + 1], [metrics.counters.get(c, 0) for c in ['rpc.retries', 'rpc.giveups']])
+
+    @async_test
+    async def test_deadline(self):
+        nodes = [FakeNode(100, delay=1)]
+        async def func(pool):
+            time_a = loop.time()
+            with self.assertRaises(GiveUp):
+                await pool.call('getblock', [1,1])
+            return loop.time() - time_a
+        pool, cost = await self.run_pool(nodes, func, deadline=0.2)
+        self.assertLess(cost, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
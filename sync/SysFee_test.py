@@ -0,0 +1,56 @@
+import os
+import unittest
+import shutil
+import tempfile
+
+from SysFee import SysFee
+
+
+class TestSysFee(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_memory(self):
+        s = SysFee()
+        self.assertEqual(0, s.get(-1))
+        self.assertIsNone(s.get(0))
+        self.assertEqual(3, s.extend([(0, 0), (1, 10), (2, 10)]))
+        self.assertEqual(1, s.extend([(1, 10), (2, 10), (3, 2**40)]))
+        self.assertEqual(0, s.extend([(5, 50)])) #gap
+        self.assertEqual(1, s.extend([(4, 2**40), (6, 60)]))
+        self.assertEqual([0, 10, 10, 2**40, 2**40], [s.get(h) for h in range(5)])
+        self.assertIsNone(s.get(5))
+
+    def test_shared_file(self):
+        f = os.path.join(self.path, 'sys_fee')
+        writer, reader = SysFee(f), SysFee(f)
+        writer.extend([(h, h * 10) for h in range(100)])
+        self.assertEqual(990, reader.get(99))
+        self.assertEqual(100, reader.extend([(h, h * 10) for h in range(200)]))
+        self.assertEqual(1990, writer.get(199))
+        writer.close()
+        reader.close()
+        s = SysFee(f)
+        self.assertEqual(200, len(s))
+        self.assertEqual(os.path.getsize(f), 200 * 8)
+        s.close()
+
+    def test_partial_record(self):
+        f = os.path.join(self.path, 'sys_fee')
+        s = SysFee(f)
+        s.extend([(h, h * 10) for h in range(10)])
+        with open(f, 'ab') as crashed: crashed.write(b'\x01\x02\x03')
+        reader = SysFee(f)
+        self.assertEqual(10, len(reader))
+        self.assertEqual(5, reader.extend([(h, h * 10) for h in range(15)]))
+        self.assertEqual(os.path.getsize(f), 15 * 8)
+        self.assertEqual(140, s.get(14))
+        s.close()
+        reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import dbm
+from binascii import unhexlify
+from collections import OrderedDict
+from Block import Vout
+from Codec import codec
+from Metrics import metrics
+
+
+class TxCache:
+    '''
+    txid -> vouts (tuple of Vout by n) of transactions, least recently used
+    first out. with a path, what falls out of memory goes to a dbm file
+    and is read back from there on a miss; the file outlives the process.
+    counters <name>.hits, <name>.disk_hits and <name>.misses.
+    '''
+    def __init__(self, name, capacity=500000, path=None):
+        self.name = name
+        self.capacity = capacity
+        self.txs = OrderedDict()
+        self.disk = dbm.open(path, 'c') if path else None
+
+    def __len__(self):
+        return len(self.txs)
+
+    @staticmethod
+    def key(txid):
+        if txid.startswith('0x'): txid = txid[2:]
+        return unhexlify(txid)
+
+    def put(self, txid, vouts):
+        k = self.key(txid)
+        self.txs[k] = tuple(vouts)
+        self.txs.move_to_end(k)
+        while len(self.txs) > self.capacity:
+            k, v = self.txs.popitem(last=False)
+            if self.disk is not None: self.disk[k] = codec.dumps(v)
+
+    def get(self, txid):
+        '''None when neither tier has it'''
+        k = self.key(txid)
+        v = self.txs.get(k)
+        if v is not None:
+            self.txs.move_to_end(k)
+            metrics.incr('%s.hits' % self.name)
+            return v
+        if self.disk is not None and k in self.disk:
+            metrics.incr('%s.disk_hits' % self.name)
+            v = tuple(Vout(*o) for o in codec.loads(self.disk[k]))
+            self.put(txid, v)
+            return v
+        metrics.incr('%s.misses' % self.name)
+        return None
+
+    def close(self):
+        '''move what is in memory to the file too'''
+        if self.disk is None: return
+        for k, v in self.txs.items(): self.disk[k] = codec.dumps(v)
+        self.disk.close()
+        self.disk = None
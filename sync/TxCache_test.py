@@ -0,0 +1,49 @@
+import os
+import unittest
+import shutil
+import tempfile
+
+from Block import Vout
+from TxCache import TxCache
+from Metrics import metrics
+
+
+def txid(i):
+    return '0x%064x' % i
+
+def vouts(i):
+    return (Vout(0, '0x' + 'c5' * 32, str(i), 'AK2nJJpJr6o664CWJKi1QRXjqeic2zRp8y'), Vout(1, '0x' + '60' * 32, '0.1', 'AK2nJJpJr6o664CWJKi1QRXjqeic2zRp8y'))
+
+
+class TestTxCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_lru(self):
+        c = TxCache('t.lru', 3)
+        for i in range(3): c.put(txid(i), vouts(i))
+        self.assertEqual(vouts(0), c.get(txid(0))) #0 is now the most recent
+        c.put(txid(3), vouts(3))
+        self.assertIsNone(c.get(txid(1)))
+        self.assertEqual([vouts(i) for i in [0, 2, 3]], [c.get(txid(i)) for i in [0, 2, 3]])
+        self.assertEqual(3, len(c))
+        self.assertEqual((4, 1), (metrics.counters['t.lru.hits'], metrics.counters['t.lru.misses']))
+
+    def test_disk_tier(self):
+        path = os.path.join(self.path, 'vouts')
+        c = TxCache('t.disk', 2, path)
+        for i in range(5): c.put(txid(i), vouts(i))
+        self.assertEqual(vouts(0), c.get(txid(0)))
+        self.assertEqual(1, metrics.counters['t.disk.disk_hits'])
+        c.close()
+        c = TxCache('t.disk', 2, path)
+        self.assertEqual([vouts(i) for i in range(5)], [c.get(txid(i)) for i in range(5)])
+        self.assertEqual(vouts(4)[1].value, c.get(txid(4))[1].value)
+        c.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import struct
+from itertools import islice
+from binascii import hexlify, unhexlify
+from decimal import Decimal as D
+from CommonTool import CommonTool as CT
+
+
+class UtxoIndex:
+    '''
+    unspent outputs (txid, n) -> (address, asset, value) kept in memory.
+    key: 32 bytes txid + 2 bytes n; value: 14 bytes packed
+    (address id, asset id, value in Fixed8). addresses and assets are
+    interned once. When full, the oldest outputs are evicted first.
+    '''
+    VALUE = struct.Struct('<IHq')
+    FIXED8 = D(100000000)
+
+    def __init__(self, capacity=20000000):
+        self.capacity = capacity
+        self.outputs = {}
+        self.addresses = []
+        self.address_ids = {}
+        self.assets = []
+        self.asset_ids = {}
+
+    def __len__(self):
+        return len(self.outputs)
+
+    @staticmethod
+    def key(txid, n):
+        if txid.startswith('0x'): txid = txid[2:]
+        return unhexlify(txid) + struct.pack('<H', n)
+
+    @staticmethod
+    def intern(value, values, ids):
+        i = ids.get(value)
+        if i is None:
+            i = ids[value] = len(values)
+            values.append(value)
+        return i
+
+    def add(self, txid, n, address, asset, value):
+        '''asset without 0x, value as the decimal string of vout'''
+        if self.capacity <= 0: return
+        if len(self.outputs) >= self.capacity: self.evict()
+        self.outputs[self.key(txid, n)] = self.VALUE.pack(
+                self.intern(address, self.addresses, self.address_ids),
+                self.intern(asset, self.assets, self.asset_ids),
+                int(D(value) * self.FIXED8))
+
+    def evict(self):
+        '''drop the oldest eighth at once, deleting one by one from the front of a dict is quadratic'''
+        for k in list(islice(self.outputs, max(1, self.capacity // 8))):
+            del self.outputs[k]
+
+    def unpack(self, v):
+        address_id, asset_id, fixed8 = self.VALUE.unpack(v)
+        return self.addresses[address_id], self.assets[asset_id], CT.sci_to_str(str(D(fixed8) / self.FIXED8))
+
+    def get(self, txid, n):
+        v = self.outputs.get(self.key(txid, n))
+        if v is None: return None
+        return self.unpack(v)
+
+    def pop(self, txid, n):
+        v = self.outputs.pop(self.key(txid, n), None)
+        if v is None: return None
+        return self.unpack(v)
+
+    def items(self):
+        for k, v in self.outputs.items():
+            yield ('0x' + hexlify(k[:32]).decode('ascii'), struct.unpack('<H', k[32:])[0]), self.unpack(v)
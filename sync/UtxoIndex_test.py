@@ -0,0 +1,39 @@
+import unittest
+
+from UtxoIndex import UtxoIndex
+
+NEO = 'c56f33fc6ecfcd0c225c4ab356fee59390af8560be0e930faebe74a6daff7c9b'
+GAS = '602c79718b16e442de58778e148d0b1084e3b2dffd5de6b7b16cee7969282de7'
+ADDRESS = 'AJnNUn6HynVcco1p8LER72s4zXtNFYDnys'
+
+
+class TestUtxoIndex(unittest.TestCase):
+    def test_add_get_pop(self):
+        index = UtxoIndex()
+        txid = '0x' + 'ab' * 32
+        index.add(txid, 0, ADDRESS, NEO, '100')
+        index.add(txid, 1, ADDRESS, GAS, '0.00000001')
+        self.assertEqual((ADDRESS, NEO, '100'), index.get(txid, 0))
+        self.assertEqual((ADDRESS, GAS, '0.00000001'), index.get(txid[2:], 1))
+        self.assertIsNone(index.get(txid, 2))
+        self.assertEqual((ADDRESS, NEO, '100'), index.pop(txid, 0))
+        self.assertIsNone(index.get(txid, 0))
+        self.assertEqual([((txid, 1), (ADDRESS, GAS, '0.00000001'))], list(index.items()))
+        self.assertEqual(1, len(index.addresses))
+
+    def test_capacity(self):
+        index = UtxoIndex(capacity=16)
+        for i in range(20):
+            index.add('0x%064x' % i, 0, ADDRESS, NEO, str(i))
+        self.assertLessEqual(len(index), 16)
+        self.assertIsNone(index.get('0x%064x' % 0, 0))
+        self.assertEqual((ADDRESS, NEO, '19'), index.get('0x%064x' % 19, 0))
+
+    def test_disabled(self):
+        index = UtxoIndex(capacity=0)
+        index.add('0x%064x' % 1, 0, ADDRESS, NEO, '1')
+        self.assertEqual(0, len(index))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import os
+import asyncio
+from logzero import logger
+
+
+class AdaptiveWindow:
+    '''
+    AIMD controller for the crawl window: the number of blocks in flight or
+    waiting to be processed. It grows by `step` after every full batch that
+    finished under `target` seconds, and is cut by `decrease` on fetch
+    failures or memory pressure. Besides the block count, the raw block
+    bytes held are capped by `byte_budget`.
+    '''
+    def __init__(self, size, minimum=10, maximum=20000, step=None, decrease=0.5,
+                    target=30.0, byte_budget=512*1024*1024, max_rss=None):
+        self.size = max(minimum, size)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step or max(1, size // 10)
+        self.decrease = decrease
+        self.target = target
+        self.byte_budget = byte_budget
+        self.max_rss = max_rss
+        self.held = 0
+        self.bytes = 0
+        self.changed = asyncio.Event()
+
+    def available(self):
+        return self.held < self.size and self.bytes < self.byte_budget
+
+    def hold(self, blocks=1):
+        self.held += blocks
+
+    async def wait(self):
+        '''until something is released, resized or woken'''
+        self.changed.clear()
+        await self.changed.wait()
+
+    def wake(self):
+        self.changed.set()
+
+    def add_bytes(self, n):
+        self.bytes += n
+
+    def release(self, blocks, nbytes=0):
+        self.held -= blocks
+        self.bytes -= nbytes
+        self.changed.set()
+
+    @staticmethod
+    def rss():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def pressure(self):
+        if self.bytes >= self.byte_budget: return True
+        if self.max_rss is None: return False
+        rss = self.rss()
+        return rss is not None and rss > self.max_rss
+
+    def resize(self, size):
+        size = max(self.minimum, min(self.maximum, int(size)))
+        if size != self.size:
+            logger.info('crawl window %s -> %s blocks' % (self.size, size))
+            self.size = size
+            self.changed.set()
+
+    def success(self, latency, full):
+        '''a batch is done; only full batches say anything about a bigger window'''
+        if self.pressure(): self.failure()
+        elif full and latency <= self.target: self.resize(self.size + self.step)
+
+    def failure(self):
+        self.resize(self.size * self.decrease)
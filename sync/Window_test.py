@@ -0,0 +1,38 @@
+import unittest
+
+from Window import AdaptiveWindow
+
+
+class TestAdaptiveWindow(unittest.TestCase):
+    def test_aimd(self):
+        w = AdaptiveWindow(100, minimum=10, maximum=130, step=10, target=1.0)
+        w.success(0.5, True)
+        self.assertEqual(110, w.size)
+        w.success(0.5, False)
+        w.success(2.0, True)
+        self.assertEqual(110, w.size)
+        w.success(0.5, True)
+        w.success(0.5, True)
+        w.success(0.5, True)
+        self.assertEqual(130, w.size)
+        w.failure()
+        self.assertEqual(65, w.size)
+        for i in range(10): w.failure()
+        self.assertEqual(10, w.size)
+
+    def test_budget(self):
+        w = AdaptiveWindow(4, minimum=2, step=1, byte_budget=1000)
+        for i in range(3): w.hold()
+        self.assertTrue(w.available())
+        w.add_bytes(1000)
+        self.assertFalse(w.available())
+        w.success(0.1, True)
+        self.assertEqual(2, w.size)
+        w.release(3, 1000)
+        self.assertTrue(w.available())
+        self.assertEqual(0, w.held)
+        self.assertEqual(0, w.bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
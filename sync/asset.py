@@ -8,6 +8,7 @@ import asyncio
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 from logzero import logger
 from Crawler import Crawler
+from Block import is_deploy
 from Config import Config as C
 from binascii import unhexlify
 
@@ -20,12 +21,11 @@ class Asset(Crawler):
         if key.startswith('0x'): key = key[2:]
         if 'c56f33fc6ecfcd0c225c4ab356fee59390af8560be0e930faebe74a6daff7c9b' == key: asset['name'][0]['name'] = 'NEO'
         if '602c79718b16e442de58778e148d0b1084e3b2dffd5de6b7b16cee7969282de7' == key: asset['name'][0]['name'] = 'GAS'
-        sql="INSERT IGNORE INTO assets(asset,type,name,symbol,version,decimals,contract_name) VALUES ('%s','%s','%s','%s','%s',%s,'%s');" % (key,asset['type'],asset['name'][0]['name'],'','',asset['precision'],'')
-        await self.mysql_insert_one(sql)
+        await self.mysql_execute('assets.insert', (key,asset['type'],asset['name'][0]['name'],'','',asset['precision'],''))
 
     async def update_a_nep5_asset(self, key, asset):
         funcs = ['decimals','totalSupply','name','symbol']
-        results = await asyncio.gather(*[self.get_invokefunction(key, func) for func in funcs])
+        results = await self.get_invokefunctions(key, funcs)
         for i in range(len(funcs)):
             func = funcs[i]
             r = results[i]
@@ -42,20 +42,19 @@ class Asset(Crawler):
             if func in ['name', 'symbol']:
                 asset[func] = unhexlify(r['stack'][0]['value']).decode('utf8')
         if len(asset['symbol']) <= 1: return
-        sql="INSERT IGNORE INTO assets(asset,type,name,symbol,version,decimals,contract_name) VALUES ('%s','NEP5','%s','%s','%s',%s,'%s');" % (key,asset['name'],asset['symbol'],asset['version'],asset['decimals'],asset['contract_name'])
-        await self.mysql_insert_one(sql)
+        await self.mysql_execute('assets.insert', (key,'NEP5',asset['name'],asset['symbol'],asset['version'],asset['decimals'],asset['contract_name']))
 
     async def deal_with(self):
         global_assets = {}
         nep5_assets = {}
         for block in self.cache.values():
-            for tx in block['tx']:
-                if 'RegisterTransaction' == tx['type']:
-                    global_assets[tx['txid']] = tx['asset']
-                if 'InvocationTransaction' == tx['type'] and 490 <= int(float(tx['sys_fee'])):
-                    if tx['script'].endswith('68134e656f2e436f6e74726163742e437265617465'):
+            for tx in block.tx:
+                if 'RegisterTransaction' == tx.type:
+                    global_assets[tx.txid] = tx.asset
+                if 'InvocationTransaction' == tx.type and 490 <= tx.sys_fee:
+                    if is_deploy(tx.script):
                         try:
-                            asset = self.parse_script(tx['script'])
+                            asset = self.parse_script(tx.script)
                         except Exception as e:
                             print('parse error:',e)
                             continue
@@ -0,0 +1,49 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+'''
+memory held by Crawler.cache for one window of blocks: the getblock json
+dicts against the Block model, measured with tracemalloc on synthetic
+verbose blocks of txs ContractTransactions (the common case on mainnet).
+    python3 bench_block_model.py [blocks=1000] [txs=20]
+'''
+
+import sys
+import gc
+import tracemalloc
+from logzero import logger
+from CommonTool import CommonTool as CT
+from Codec import codec
+from Block import Block
+from bench_raw_block import synthetic
+
+
+def held(decode, replies):
+    '''bytes still allocated once every reply is decoded into the cache, peak while decoding, seconds'''
+    gc.collect()
+    tracemalloc.start()
+    time_a = CT.now()
+    cache = {i:decode(r) for i,r in enumerate(replies)}
+    cost = CT.now() - time_a
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del cache
+    return current, peak, cost
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    txs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    replies, _ = synthetic(blocks, txs)
+    logger.info('%s blocks of %s txs, %s bytes of json' % (blocks, txs, sum(map(len, replies))))
+    dicts = held(lambda r:codec.loads(r)['result'], replies)
+    models = held(lambda r:Block.from_json(codec.loads(r)['result']), replies)
+    for name, (current, peak, cost) in [('json', dicts), ('Block', models)]:
+        logger.info('%-5s held %7.1fMB, peak %7.1fMB, decode %.3fs, per 1000 blocks %.1fMB' % (name,
+            current / 2**20, peak / 2**20, cost, current / 2**20 * 1000 / blocks))
+    logger.info('Block/json held %.2f, peak %.2f' % (models[0] / dicts[0], models[1] / dicts[1]))
+
+
+if __name__ == "__main__":
+    main()
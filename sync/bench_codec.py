@@ -0,0 +1,72 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+'''
+compare the standard library json with the Codec backends on the payloads
+the services spend their time in: verbose getblock replies decoded by the
+crawlers, and the /v2/{net}/asset response encoded by www, with Decimal
+balances like the address endpoints return.
+    python3 bench_codec.py [blocks=200] [txs=100] [assets=2000] [rounds=20]
+'''
+
+import sys
+import json
+from decimal import Decimal
+from logzero import logger
+from CommonTool import CommonTool as CT
+from Codec import Codec
+from bench_raw_block import synthetic
+
+
+def asset_payload(n):
+    '''shaped like app.py cache['assets'] wrapped by format_result'''
+    assets = {'GLOBAL':{}, 'NEP5':{}, 'ONTNATIVE':{}, 'OEP4':{}}
+    for i in range(n):
+        kind = ['GLOBAL', 'NEP5', 'ONTNATIVE', 'OEP4'][i % 4]
+        aid = '%064x' % i if 'GLOBAL' == kind else '%040x' % i
+        assets[kind][aid] = {'type':kind, 'name':'token %s 资产' % i, 'symbol':'T%s' % i, 'decimals':8}
+    return {'result':True, 'data':assets}
+
+def address_payload(n):
+    return {'result':True, 'data':[{'id':'%040x' % i, 'chain':'NEO', 'symbol':'T%s' % i,
+        'decimals':8, 'balance':Decimal(i) / 10**8 + 12345} for i in range(n)]}
+
+def stdlib_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, default=lambda o:format(o, 'f') if isinstance(o, Decimal) else o.__dict__).encode('utf-8')
+
+def timed(func, items, rounds):
+    time_a = CT.now()
+    for i in range(rounds):
+        for item in items: func(item)
+    return CT.now() - time_a
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    txs = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    n = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    rounds = int(sys.argv[4]) if len(sys.argv) > 4 else 20
+
+    verbose, _ = synthetic(blocks, txs)
+    responses = [asset_payload(n), address_payload(n // 10)]
+    codecs = [Codec(name) for name in Codec.BACKENDS]
+    codecs = [c for i, c in enumerate(codecs) if c.name not in [d.name for d in codecs[:i]]]
+    logger.info('%s blocks %s bytes, responses %s bytes' % (blocks, sum(map(len, verbose)), sum(len(stdlib_dumps(r)) for r in responses)))
+
+    base_loads = timed(json.loads, verbose, 1)
+    base_dumps = timed(stdlib_dumps, responses, rounds)
+    logger.info('stdlib:  loads blocks %.3fs, dumps responses %.3fs' % (base_loads, base_dumps))
+    for c in codecs:
+        if 'json' == c.name: continue
+        loads = timed(c.loads, verbose, 1)
+        dumps = timed(c.dumps, responses, rounds)
+        logger.info('%-8s loads blocks %.3fs (%.1fx), dumps responses %.3fs (%.1fx)' % (c.name + ':',
+            loads, base_loads / max(loads, 1e-9), dumps, base_dumps / max(dumps, 1e-9)))
+        bad = [i for i, v in enumerate(verbose) if c.loads(v) != json.loads(v)]
+        bad += ['response %s' % i for i, r in enumerate(responses) if json.loads(c.dumps(r)) != json.loads(stdlib_dumps(r))]
+        if bad: logger.error('%s differs from stdlib at %s' % (c.name, bad))
+
+
+if __name__ == "__main__":
+    main()
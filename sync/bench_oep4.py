@@ -0,0 +1,81 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+'''
+OEP4 balanceOf throughput: the ontology sdk called one after another (what
+OEP4UPT did, the sdk blocks the loop) against Oep4Client concurrently
+through the rpc pool. a fake ONT node in a thread of its own answers every
+pre-exec after latency milliseconds:
+    python3 bench_oep4.py [calls=500] [latency=20] [concurrency=20]
+'''
+
+import sys
+import asyncio
+import aiohttp
+import threading
+from aiohttp import web
+from logzero import logger
+from CommonTool import CommonTool as CT
+from RpcPool import RpcPool
+from Oep4Client import Oep4Client
+from ontology.sdk import Ontology
+from ontology.contract.neo.oep4 import Oep4
+
+ASSET = '6c80f3a5c183edee7693a038ca8c476fb0d6ac91'
+ADDRESS = 'AQf4Mzu1YJrhz9f3aRkkwSm9n3qhXGSh4p'
+PORT = 20399
+
+
+def fake_node(latency, started):
+    async def handle(request):
+        j = await request.json()
+        if 'sendrawtransaction' == j['method']:
+            await asyncio.sleep(latency)
+            result = {'State':1, 'Gas':20000, 'Result':'00e1f505', 'Notify':[]}
+        else:
+            result = 1
+        return web.json_response({'desc':'SUCCESS', 'error':0, 'id':j['id'], 'jsonrpc':'2.0', 'result':result})
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    app = web.Application()
+    app.router.add_post('/', handle)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', PORT).start())
+    started.set()
+    loop.run_forever()
+
+def sdk_serial(uri, calls):
+    sdk = Ontology(rpc_address=uri)
+    time_a = CT.now()
+    for i in range(calls): Oep4(ASSET, sdk=sdk).balance_of(ADDRESS)
+    return CT.now() - time_a
+
+async def client_concurrent(uri, calls, concurrency):
+    async with aiohttp.ClientSession() as session:
+        client = Oep4Client(RpcPool(session, [uri]), concurrency)
+        time_a = CT.now()
+        results = await asyncio.gather(*[client.balance_of(ASSET, ADDRESS) for i in range(calls)])
+        t = CT.now() - time_a
+    if any(100000000 != r for r in results): logger.error('wrong balances %s' % set(results))
+    return t
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.02
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    started = threading.Event()
+    threading.Thread(target=fake_node, args=(latency, started), daemon=True).start()
+    started.wait()
+    uri = 'http://127.0.0.1:%s' % PORT
+
+    serial = sdk_serial(uri, calls)
+    logger.info('sdk, one after another:   %s calls %.3fs, %.1f calls/s' % (calls, serial, calls / serial))
+    concurrent = asyncio.get_event_loop().run_until_complete(client_concurrent(uri, calls, concurrency))
+    logger.info('Oep4Client, %s at once:   %s calls %.3fs, %.1f calls/s (%.1fx)' % (concurrency, calls, concurrent, calls / concurrent, serial / concurrent))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+'''
+what OEP4History fetches for a range of heights where few have events:
+getblock [h,1] of every height plus getsmartcodeevent of every height (the
+old way) against OEP4History.rpc_get_blocks (events of every height, the
+raw header only of heights with events). a fake ONT node serves synthetic
+blocks, a share of density of them with events of txs transactions:
+    python3 bench_oep4_events.py [heights=5000] [density=0.05] [txs=3]
+'''
+
+import sys
+import json
+import random
+import struct
+import asyncio
+from aiohttp import web
+from logzero import logger
+from CommonTool import CommonTool as CT
+from oep4_history import OEP4History
+
+PORT = 20398
+ONG = '0200000000000000000000000000000000000000'
+
+
+def synthetic(heights, density, txs):
+    '''height -> (verbose block, raw hex, events)'''
+    blocks = {}
+    for h in range(heights):
+        n = txs if random.random() < density else 0
+        timestamp = 1530000000 + h
+        header = {'Version':0, 'PrevBlockHash':'%064x' % (h-1), 'TransactionsRoot':'%064x' % h, 'BlockRoot':'%064x' % h,
+                'Timestamp':timestamp, 'Height':h, 'ConsensusData':h, 'ConsensusPayload':'',
+                'NextBookkeeper':'A' * 34, 'Bookkeepers':['02' + '%064x' % i for i in range(7)],
+                'SigData':['%0130x' % i for i in range(5)], 'Hash':'%064x' % h}
+        transactions = [{'Version':0, 'Nonce':i, 'GasPrice':500, 'GasLimit':20000, 'Payer':'A' * 34, 'TxType':209,
+                'Payload':{'Code':'00' * 200}, 'Attributes':[], 'Sigs':[{'PubKeys':['02' + '%064x' % i], 'M':1, 'SigData':['%0130x' % i]}],
+                'Hash':'%064x' % (h * 100 + i), 'Height':h} for i in range(n)]
+        verbose = {'Hash':'%064x' % h, 'Size':700 + 500 * n, 'Header':header, 'Transactions':transactions}
+        raw = struct.pack('<I', 0) + b'\x11' * 96 + struct.pack('<II', timestamp, h) + b'\x22' * (600 + 500 * n)
+        events = [{'TxHash':'%064x' % (h * 100 + i), 'State':1, 'GasConsumed':10000000,
+                'Notify':[{'ContractAddress':ONG, 'States':['transfer', 'A' * 34, 'A' * 34, 10000000]}]} for i in range(n)]
+        blocks[h] = (verbose, raw.hex(), events)
+    return blocks
+
+async def fake_node(blocks, stats):
+    def answer(j):
+        h = j['params'][0]
+        if 'getsmartcodeevent' == j['method']: result = blocks[h][2] or None
+        elif 'getblock' == j['method']: result = blocks[h][0] if j['params'][1] else blocks[h][1]
+        else: result = len(blocks)
+        stats['calls'][j['method']] = stats['calls'].get(j['method'], 0) + 1
+        return {'desc':'SUCCESS', 'error':0, 'id':j['id'], 'jsonrpc':'2.0', 'result':result}
+    async def handle(request):
+        j = await request.json()
+        body = json.dumps([answer(x) for x in j] if isinstance(j, list) else answer(j)).encode('utf-8')
+        stats['bytes'] += len(body)
+        return web.Response(body=body, content_type='application/json')
+    app = web.Application()
+    app.router.add_post('/', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', PORT).start()
+    return runner
+
+async def old_way(crawler, heights):
+    blocks = await crawler.rpc.batch('getblock', [[h,1] for h in heights], min_height=max(heights)+1)
+    events = await crawler.get_smartcodeevents(heights)
+    return [{'events':e, 'timestamp':b['Header']['Timestamp']} for b, e in zip(blocks, events)]
+
+async def run(way, heights, batch):
+    result = []
+    for i in range(0, len(heights), batch):
+        result.extend(await way(heights[i:i+batch]))
+    return result
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    density = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    txs = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    blocks = synthetic(n, density, txs)
+    stats = {'bytes':0, 'calls':{}}
+    runner = await fake_node(blocks, stats)
+    crawler = OEP4History('bench', {}, 'http://127.0.0.1:%s' % PORT, asyncio.get_event_loop(), 'ONT', 1000)
+    heights = list(range(n))
+    logger.info('%s heights, %s with events' % (n, sum(1 for b in blocks.values() if b[2])))
+    try:
+        results = []
+        for name, way in [('getblock + events', lambda hs:old_way(crawler, hs)), ('rpc_get_blocks', crawler.rpc_get_blocks)]:
+            stats['bytes'] = 0
+            stats['calls'] = {}
+            time_a = CT.now()
+            results.append(await run(way, heights, crawler.rpc.batch_size))
+            logger.info('%-18s %.3fs, %.1fMB from the node, calls %s' % (name + ':', CT.now() - time_a, stats['bytes'] / 1024 / 1024, stats['calls']))
+        busy = [i for i in heights if blocks[i][2]]
+        if any(results[0][i]['events'] != results[1][i]['events'] for i in heights) or \
+                any(results[0][i]['timestamp'] != results[1][i]['timestamp'] for i in busy):
+            logger.error('the two ways differ')
+    finally:
+        await crawler.session.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(main())
@@ -0,0 +1,96 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+'''
+compare getblock [h,1] (node decodes, verbose json) with getblock [h,0]
+(raw hex, decoded by RawBlock): bytes on the wire and client parse time.
+against the node in .env, blocks from start, every txid and the fields the
+crawlers read are checked to be the same on both paths:
+    python3 bench_raw_block.py [start=2000000] [blocks=200]
+without a node, on synthetic blocks of txs ContractTransactions each:
+    python3 bench_raw_block.py synthetic [blocks=200] [txs=100]
+'''
+
+import sys
+import json
+import struct
+import hashlib
+import asyncio
+import aiohttp
+from logzero import logger
+from Config import Config as C
+from CommonTool import CommonTool as CT
+from RawBlock import parse_block, NEO, GAS
+
+FIELDS = ['txid', 'type', 'vin', 'vout', 'claims', 'script']
+
+
+def same(verbose, raw):
+    '''the parts of a block deal_with reads'''
+    if verbose['index'] != raw['index'] or verbose['time'] != raw['time'] or len(verbose['tx']) != len(raw['tx']): return False
+    for a, b in zip(verbose['tx'], raw['tx']):
+        if any(a.get(f) != b.get(f) for f in FIELDS): return False
+        if float(a['sys_fee']) != float(b['sys_fee']): return False
+        if 'asset' in a and (a['asset']['type'], a['asset']['precision']) != (b['asset']['type'], b['asset']['precision']): return False
+    return True
+
+async def post(session, uri, method, params):
+    async with session.post(uri, json={'jsonrpc':'2.0','method':method,'params':params,'id':1}) as resp:
+        return await resp.read()
+
+async def from_node(start, blocks):
+    uri = C.get_neo_uri()
+    verbose, raw = [], []
+    async with aiohttp.ClientSession() as session:
+        for h in range(start, start + blocks):
+            verbose.append(await post(session, uri, 'getblock', [h,1]))
+            raw.append(await post(session, uri, 'getblock', [h,0]))
+    return verbose, raw
+
+def synthetic(blocks, txs):
+    def varbytes(b): return bytes([len(b)]) + b
+    sh = hashlib.new('ripemd160', hashlib.sha256(b'\x51').digest()).digest()
+    witness = b'\x01' + varbytes(b'\x40' + b'\x11' * 64) + varbytes(b'\x21' + b'\x02' * 33 + b'\xac')
+    def tx(i):
+        prev = CT.hash256(struct.pack('<I', i))
+        return (b'\x80\x00\x00\x01' + prev + b'\x00\x00\x02' +
+                bytes.fromhex(NEO[2:])[::-1] + struct.pack('<q', i * 10**8) + sh +
+                bytes.fromhex(GAS[2:])[::-1] + struct.pack('<q', i * 12345) + sh + witness)
+    verbose, raw = [], []
+    for h in range(blocks):
+        body = b''.join(tx(h * txs + i) for i in range(txs))
+        b = struct.pack('<I', 0) + b'\x00' * 64 + struct.pack('<IIQ', h, h, h) + sh + witness + b'\xfd' + struct.pack('<H', txs) + body
+        raw.append(json.dumps({'jsonrpc':'2.0','id':1,'result':b.hex()}).encode())
+        verbose.append(json.dumps({'jsonrpc':'2.0','id':1,'result':parse_block(b)}).encode())
+    return verbose, raw
+
+def main():
+    if len(sys.argv) > 1 and 'synthetic' == sys.argv[1]:
+        blocks = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+        txs = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+        verbose, raw = synthetic(blocks, txs)
+    else:
+        start = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+        blocks = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+        verbose, raw = asyncio.get_event_loop().run_until_complete(from_node(start, blocks))
+
+    time_a = CT.now()
+    vblocks = [json.loads(v)['result'] for v in verbose]
+    time_b = CT.now()
+    rblocks = [parse_block(json.loads(r)['result']) for r in raw]
+    time_c = CT.now()
+
+    vbytes, rbytes = sum(map(len, verbose)), sum(map(len, raw))
+    txs = sum(len(b['tx']) for b in vblocks)
+    logger.info('%s blocks %s txs' % (len(vblocks), txs))
+    logger.info('verbose: %10s bytes, parse %.3fs' % (vbytes, time_b - time_a))
+    logger.info('raw:     %10s bytes, parse %.3fs' % (rbytes, time_c - time_b))
+    logger.info('raw/verbose: bytes %.2f, parse time %.2f' % (rbytes / vbytes, (time_c - time_b) / max(time_b - time_a, 1e-9)))
+    bad = [v['index'] for v, r in zip(vblocks, rblocks) if not same(v, r)]
+    if bad: logger.error('raw blocks differ from verbose at %s' % bad)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+'''
+compare per-row and bulk utxo writes on synthetic data.
+runs in its own database (BENCHDB, default sea_bench) which is dropped afterwards:
+    python3 bench_utxo_write.py [txs=20000]
+'''
+
+import sys
+import uvloop
+import asyncio
+asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+import aiomysql
+from logzero import logger
+from Config import Config as C
+from CommonTool import CommonTool as CT
+from utxo import UTXO
+
+UTXOS_DDL = """CREATE TABLE utxos (
+  id INT UNSIGNED AUTO_INCREMENT,
+  txid CHAR(66) NOT NULL,
+  index_n SMALLINT UNSIGNED NOT NULL,
+  address VARCHAR(34) NOT NULL,
+  value VARCHAR(40) NOT NULL,
+  asset VARCHAR(64) NOT NULL,
+  height INT UNSIGNED NOT NULL,
+  spent_txid CHAR(66) DEFAULT NULL,
+  spent_height INT UNSIGNED DEFAULT NULL,
+  claim_txid CHAR(66) DEFAULT NULL,
+  claim_height INT UNSIGNED DEFAULT NULL,
+  status TINYINT UNSIGNED DEFAULT 1 NOT NULL,
+  PRIMARY KEY (id),
+  UNIQUE INDEX uidx_txid_index (txid, index_n),
+  INDEX idx_address_asset_status_value_index_txid (address, asset, status, value, index_n, txid)
+);"""
+NEO = '0xc56f33fc6ecfcd0c225c4ab356fee59390af8560be0e930faebe74a6daff7c9b'
+
+
+def synthetic(txs, prefix):
+    '''every tx spends output 0 of the previous tx and creates 2 outputs'''
+    vouts, vins, claims = [], [], []
+    for i in range(txs):
+        txid = '0x%s%060x' % (prefix, i)
+        for n in range(2):
+            vouts.append([{'n':n,'address':'AJnNUn6HynVcco1p8LER72s4zXtNFYDnys','value':str(i+n),'asset':NEO}, txid, i])
+        if i:
+            prev = '0x%s%060x' % (prefix, i-1)
+            vins.append([{'txid':prev,'vout':0}, txid, i])
+            claims.append([{'txid':prev,'vout':1}, txid, i])
+    return vouts, vins, claims
+
+async def per_row(u, vouts, vins, claims):
+    await asyncio.wait([u.update_a_vout(*v) for v in vouts])
+    await asyncio.wait([u.update_a_vin(*v) for v in vins])
+    await asyncio.wait([u.update_a_claim(*c) for c in claims])
+
+async def bulk(u, vouts, vins, claims):
+    await u.update_vouts(vouts)
+    await u.update_vins(vins)
+    await u.update_claims(claims)
+
+async def run(u, mysql_args, txs):
+    db = mysql_args['db']
+    conn = await aiomysql.connect(**dict(mysql_args, db=None))
+    async with conn.cursor() as cur:
+        await cur.execute('DROP DATABASE IF EXISTS %s;' % db)
+        await cur.execute('CREATE DATABASE %s;' % db)
+        await cur.execute('USE %s;' % db)
+        await cur.execute(UTXOS_DDL)
+    u.pool = await u.get_mysql_pool()
+    try:
+        for name, func, prefix in [('per-row', per_row, 'aaaa'), ('bulk', bulk, 'bbbb')]:
+            vouts, vins, claims = synthetic(txs, prefix)
+            time_a = CT.now()
+            await func(u, vouts, vins, claims)
+            cost = CT.now() - time_a
+            logger.info('%-8s %s vouts %s vins %s claims: %.3fs, %.0f rows/s' % (name, len(vouts), len(vins), len(claims), cost, (len(vouts)+len(vins)+len(claims))/cost))
+    finally:
+        u.pool.close()
+        await u.pool.wait_closed()
+        await u.session.close()
+        async with conn.cursor() as cur:
+            await cur.execute('DROP DATABASE IF EXISTS %s;' % db)
+        conn.close()
+
+
+if __name__ == "__main__":
+    txs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    mysql_args = {
+                    'host':     C.get_mysql_host(),
+                    'port':     C.get_mysql_port(),
+                    'user':     C.get_mysql_user(),
+                    'password': C.get_mysql_pass(),
+                    'db':       C.get_bench_db(),
+                    'autocommit':True
+                }
+    loop = asyncio.get_event_loop()
+    u = UTXO('bench', mysql_args, C.get_neo_uri(), loop, C.get_super_node(), 'NEO')
+    loop.run_until_complete(run(u, mysql_args, txs))
+    loop.close()
@@ -0,0 +1,81 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import sys
+import uvloop
+import asyncio
+asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+from logzero import logger
+from Crawler import Crawler
+from BlockFeed import BlockFeed
+from Config import Config as C
+from utxo import UTXO
+from history import History
+from asset import Asset
+
+
+class Engine(Crawler):
+    '''fetch every block once and hand it to all registered handlers, each keeps its own status row'''
+    KEEP_FACTOR = 8 #blocks kept for trailing handlers = KEEP_FACTOR * max_tasks
+    def __init__(self, name, mysql_args, neo_uri, loop, super_node_uri, tasks='1000'):
+        super(Engine,self).__init__(name, mysql_args, neo_uri, loop, super_node_uri, tasks)
+        self.handlers = []
+        self.feed = BlockFeed(self.get_blocks, self.KEEP_FACTOR * self.max_tasks)
+
+    def register(self, handler):
+        handler.share_io(self)
+        self.handlers.append(handler)
+
+    async def crawl(self):
+        self.pool = await self.get_mysql_pool()
+        if not self.pool:
+            sys.exit(1)
+        try:
+            for h in self.handlers:
+                h.pool = self.pool
+                await h.prepare()
+                h.start = await h.get_status() + 1
+                self.feed.register(h.name, h.start)
+                logger.info('handler %s start from height: %s' % (h.name, h.start))
+            tasks = [asyncio.ensure_future(h.infinite_loop()) for h in self.handlers]
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for t in pending: t.cancel()
+            for t in done: t.result()
+        except Exception as e:
+            logger.error('CRAWL EXCEPTION: {}'.format(e.args[0]))
+        finally:
+            await self.close_io()
+
+
+if __name__ == "__main__":
+    mysql_args = {
+                    'host':     C.get_mysql_host(),
+                    'port':     C.get_mysql_port(),
+                    'user':     C.get_mysql_user(),
+                    'password': C.get_mysql_pass(),
+                    'db':       C.get_mysql_db(), 
+                    'autocommit':True
+                }
+    neo_uri         = C.get_neo_uri()
+    loop            = asyncio.get_event_loop()
+    super_node_uri  = C.get_super_node()
+    net             = C.get_net()
+    tasks           = C.get_tasks()
+
+    e = Engine('engine', mysql_args, neo_uri, loop, super_node_uri, tasks)
+    handlers = {
+            'utxo':     lambda:UTXO('utxo', mysql_args, neo_uri, loop, super_node_uri, 'NEO', tasks),
+            'history':  lambda:History('history', mysql_args, neo_uri, loop, super_node_uri, net, 'NEO', tasks),
+            'asset':    lambda:Asset('asset', mysql_args, neo_uri, loop, super_node_uri, tasks),
+            }
+    for name in C.get_handlers():
+        e.register(handlers[name]())
+
+    try:
+        loop.run_until_complete(e.crawl())
+    except Exception as ex:
+        logger.error('LOOP EXCEPTION: {}'.format(ex))
+    finally:
+        loop.close()
@@ -9,9 +9,17 @@ import asyncio
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 from logzero import logger
 from Crawler import Crawler
+from binascii import unhexlify
 from decimal import Decimal as D
 from Config import Config as C
 from CommonTool import CommonTool as CT
+from Block import vouts_from_json
+from TxCache import TxCache
+from AppLog import AppLog
+from AssetRegistry import registry
+from Ledger import Ledger
+from Nep5Batch import Nep5Batch, stack_units
+from Metrics import metrics
 
 
 class History(Crawler):
@@ -21,92 +29,146 @@ class History(Crawler):
         self.chain = chain
         self.cache_utxo = {}
         self.cache_log = {}
-        self.cache_decimals = {}
+        self.tx_cache = TxCache('tx_cache', C.get_tx_cache_size(), C.get_tx_cache_file())
+        self.ledger = Ledger(self, C.get_nep5_flagged())
+        self.verify = C.get_nep5_verify()
+        self.replaying = False
+        self.written = {}
 
-    async def cache_utxo_vouts(self, txid):
-        tx = await self.get_transaction(txid)
-        self.cache_utxo[txid] = tx['vout']
+    async def cache_utxo_vouts(self, txids):
+        '''
+        from tx_cache, which has the vouts of every tx in the blocks processed
+        lately, the rest from the node. a txid the node can not give is left
+        out, the txs spending it become dead letters
+        '''
+        missing = []
+        for txid in txids:
+            vouts = self.tx_cache.get(txid)
+            if vouts is None: missing.append(txid)
+            else: self.cache_utxo[txid] = vouts
+        if not missing: return
+        try:
+            txs = await self.get_transactions(missing)
+        except Exception as e:
+            logger.warning('get {} transactions failure: {}, get them one by one'.format(len(missing), e))
+            txs = await asyncio.gather(*[self.get_transaction(txid) for txid in missing], return_exceptions=True)
+        for i in range(len(missing)):
+            if isinstance(txs[i], Exception): continue
+            self.cache_utxo[missing[i]] = vouts_from_json(txs[i]['vout'])
+            self.tx_cache.put(missing[i], self.cache_utxo[missing[i]])
 
     async def get_cache_decimals(self, contract):
-        if contract not in self.cache_decimals.keys():
-            self.cache_decimals[contract] = await self.get_decimals(contract)
-        return self.cache_decimals[contract]
-
-    async def cache_applicationlog(self, txid):
-        url = self.super_node_uri + '/' + self.net + '/log/' + txid
-        async with self.session.get(url, timeout=120) as resp:
-            if 200 != resp.status:
-                logger.error('Visit %s get status %s' % (url, resp.status))
-                return None
-            j = await resp.json()
-            if 'error' in j.keys():
-                logger.error('Visit %s return error %s' % (url, j['error']))
-                return None
-            self.cache_log[txid] = j
-
-    async def update_a_gvin(self, vin, txid, index, utc_time):
-        sql="""INSERT IGNORE INTO history(txid,operation,index_n,address,value,timepoint,asset) VALUES ('%s','%s',%s,'%s','%s',%s,'%s');""" % (txid,'out',index,vin['address'],vin['value'],utc_time,vin['asset'][2:])
-        await self.mysql_insert_one(sql)
-
-    async def update_a_gvout(self, vout, txid, index, utc_time):
-        sql="""INSERT IGNORE INTO history(txid,operation,index_n,address,value,timepoint,asset) VALUES ('%s','%s',%s,'%s','%s',%s,'%s');""" % (txid,'in',index,vout['address'],vout['value'],utc_time,vout['asset'][2:])
-        await self.mysql_insert_one(sql)
-
-    async def update_a_svin(self, asset, txid, index, address, value, utc_time):
-        sql="""INSERT IGNORE INTO history(txid,operation,index_n,address,value,timepoint,asset) VALUES ('%s','%s',%s,'%s','%s',%s,'%s');""" % (txid,'out',index,address,value,utc_time,asset)
-        await self.mysql_insert_one(sql)
-
-    async def update_a_svout(self, asset, txid, index, address, value, utc_time):
-        sql="""INSERT IGNORE INTO history(txid,operation,index_n,address,value,timepoint,asset) VALUES ('%s','%s',%s,'%s','%s',%s,'%s');""" % (txid,'in',index,address,value,utc_time,asset)
-        await self.mysql_insert_one(sql)
+        return await registry.get_decimals(self, contract, self.get_decimals)
+
+    async def prepare(self):
+        #after share_io, which may swap the session and rpc pool
+        self.applog = AppLog(self.session, self.super_node_uri, self.net,
+                self.rpc if C.get_applog_node() else None, C.get_applog_concurrency(), C.get_applog_file(),
+                C.get_rpc_retries(), C.get_rpc_deadline())
+        await registry.refresh(self)
+        self.nep5_batch = Nep5Batch(self, C.get_nep5_batch())
+        if C.get_nep5_ledger(): await self.ledger.enable()
+        else: await self.ledger.disable()
+
+    async def update_histories(self, gvins, gvouts, svins, svouts):
+        rows = [(txid,'out',index,vin['address'],vin['value'],utc_time,vin['asset'][2:]) for vin,txid,index,utc_time in gvins]
+        rows.extend([(txid,'in',index,vout['address'],vout['value'],utc_time,vout['asset'][2:]) for vout,txid,index,utc_time in gvouts])
+        rows.extend([(txid,'out',index,address,value,utc_time,asset) for asset,txid,index,address,value,utc_time in svins])
+        rows.extend([(txid,'in',index,address,value,utc_time,asset) for asset,txid,index,address,value,utc_time in svouts])
+        await self.mysql_execute_many('history.insert', rows)
+
+    async def update_ledger_balances(self):
+        '''the ledger sums of the batch to balance; a replay adds the transfers of its dead letters only'''
+        txids = None
+        if self.replaying:
+            rows = await self.mysql_fetchall('dead_letter.open_txs', [self.name] + self.processing, n=len(self.processing))
+            txids = set(r[0] for r in rows)
+        units = await self.ledger.write(txids)
+        data = []
+        for k, u in units.items():
+            decimals = await self.get_cache_decimals(k[1])
+            if decimals is None: continue
+            data.append((k[0],k[1],self.integer_to_num_str(str(u), decimals=decimals),self.max_height))
+        await self.update_address_balances(data)
+        self.written = units
+
+    async def reconcile(self, units):
+        '''balanceOf of up to self.verify of the keys just written, only when the node is at the same height'''
+        if await self.get_block_count() != self.max_height + 1: return
+        keys = Ledger.sample(units.keys(), self.verify)
+        stacks = await self.nep5_batch.get_balances([(k[1], k[0]) for k in keys])
+        for k in keys:
+            b = stacks.get((k[1], k[0]))
+            node = None if b is None else stack_units(b)
+            if node is None: continue
+            metrics.incr('%s.ledger_checks' % self.name)
+            if node == units[k]: continue
+            logger.warning('ledger balance of %s %s is %s, balanceOf gives %s' % (k[0], k[1], units[k], node))
+            metrics.incr('%s.ledger_mismatches' % self.name)
+            #every holder of the asset to upt, not only this one
+            await self.ledger.flag(k[1], lambda uas:self.update_addresses(self.max_height, uas, self.chain))
+
+    async def run_batch(self, replay=False):
+        '''samples of the ledger balances are reconciled once the batch is committed'''
+        self.replaying = replay
+        self.written = {}
+        await super(History,self).run_batch(replay)
+        if self.verify <= 0 or not self.written: return
+        try:
+            await self.reconcile(self.written)
+        except Exception as e:
+            logger.error('reconcile ledger failure: {}'.format(e))
 
     async def deal_with(self):
+        self.cache_utxo = {}
+        self.cache_log = {}
+        self.ledger.clear()
         gtxids = [] #global
         stxids = [] #smart contract
         for block in self.cache.values():
-            for tx in block['tx']:
-                for vin in tx['vin']:
-                    gtxids.append(vin['txid'])
-                if 'InvocationTransaction' == tx['type']:
-                    stxids.append(tx['txid'])
+            for tx in block.tx:
+                self.tx_cache.put(tx.txid, tx.vout) #spent by this batch or a later one
+                for vin in tx.vin:
+                    gtxids.append(vin.txid)
+                if 'InvocationTransaction' == tx.type:
+                    stxids.append(tx.txid)
         gtxids = list(set(gtxids))
         if gtxids:
-            await asyncio.wait([self.cache_utxo_vouts(txid) for txid in gtxids])
-        if sorted(gtxids) != sorted(self.cache_utxo.keys()):
-            msg = 'cache utxo error'
-            logger.error(msg)
-            sys.exit(1)
+            await self.cache_utxo_vouts(gtxids)
         if stxids:
-            await asyncio.wait([self.cache_applicationlog(txid) for txid in stxids])
-        if sorted(stxids) != sorted(self.cache_log.keys()):
-            msg = 'cache log error'
-            logger.error(msg)
-            sys.exit(1)
+            self.cache_log = await self.applog.get_many(stxids)
 
         gvins= []
         gvouts = []
         svins = [] #froms
         svouts = [] #tos
         for block in self.cache.values():
-            block_time = block['time']
-            for tx in block['tx']:
+            block_time = block.time
+            for tx in block.tx:
+                missing = [vin.txid for vin in tx.vin if vin.txid not in self.cache_utxo.keys()]
+                if missing:
+                    self.add_dead_letter('tx', tx.txid, block.index, 'transaction {} not found'.format(missing[0]))
+                    continue
+                if 'InvocationTransaction' == tx.type and tx.txid not in self.cache_log.keys():
+                    self.add_dead_letter('tx', tx.txid, block.index, 'application log not found')
+                    continue
                 #global
                 utxo_dict = {}
-                for vin in tx['vin']:
-                    utxo = self.cache_utxo[vin['txid']][vin['vout']]
-                    key = utxo['asset'] + '_' + utxo['address']
+                for vin in tx.vin:
+                    utxo = self.cache_utxo[vin.txid][vin.vout]
+                    key = utxo.asset + '_' + utxo.address
                     if key in utxo_dict.keys():
-                        utxo_dict[key]['value'] = CT.sci_to_str(str(D(utxo_dict[key]['value'])+D(utxo['value'])))
+                        utxo_dict[key]['value'] = CT.sci_to_str(str(D(utxo_dict[key]['value'])+D(utxo.value)))
                     else:
-                        utxo_dict[key] = utxo
+                        utxo_dict[key] = utxo._asdict()
 
                 vout_dict = {}
-                for vout in tx['vout']:
-                    key = vout['asset'] + '_' + vout['address']
+                for vout in tx.vout:
+                    key = vout.asset + '_' + vout.address
                     if key in vout_dict.keys():
-                        vout_dict[key]['value'] = CT.sci_to_str(str(D(vout_dict[key]['value'])+D(vout['value'])))
+                        vout_dict[key]['value'] = CT.sci_to_str(str(D(vout_dict[key]['value'])+D(vout.value)))
                     else:
-                        vout_dict[key] = vout
+                        vout_dict[key] = vout._asdict()
 
                 if 1 == len(utxo_dict) == len(vout_dict) and utxo_dict.keys() == vout_dict.keys():
                     key = list(utxo_dict.keys())[0]
@@ -121,16 +183,16 @@ class History(Crawler):
                         if D(utxo['value']) > D(vout_dict[key]['value']):
                             utxo['value'] = CT.sci_to_str(str(D(utxo['value'])-D(vout_dict[key]['value'])))
                             del vout_dict[key]
-                    gvins.append([utxo, tx['txid'], i, block_time])
+                    gvins.append([utxo, tx.txid, i, block_time])
 
                 voutx = list(vout_dict.values())
                 for k in range(len(voutx)):
                     vout = voutx[k]
-                    gvouts.append([vout, tx['txid'], k, block_time])
+                    gvouts.append([vout, tx.txid, k, block_time])
 
                 #smart contract
-                txid = tx['txid']
-                if 'InvocationTransaction' == tx['type']:
+                txid = tx.txid
+                if 'InvocationTransaction' == tx.type:
                     log = self.cache_log[txid]
                     if ('vmstate' in log.keys() and log['vmstate'].startswith('HALT')) or ('executions' in log.keys() and 'vmstate' in log['executions'][0].keys() and log['executions'][0]['vmstate'].startswith('HALT')):
                         if 'executions' in log.keys(): log['notifications'] = log['executions'][0]['notifications']
@@ -141,32 +203,31 @@ class History(Crawler):
                                     isinstance(n['state']['value'],list) and \
                                     4 == len(n['state']['value']) and \
                                     '7472616e73666572' == n['state']['value'][0]['value']:
-                                decimals = await self.get_cache_decimals(asset)
-                                if decimals is None: continue
-                                if 'Integer' == n['state']['value'][3]['type']:
-                                    value = self.integer_to_num_str(n['state']['value'][3]['value'], decimals=decimals)
-                                else:
-                                    value = self.hex_to_num_str(n['state']['value'][3]['value'], decimals=decimals)
+                                amount = n['state']['value'][3]
+                                if 'Integer' == amount['type']: units = int(amount['value'] or 0)
+                                else: units = self.bytes_to_num(unhexlify(amount['value']))
                                 from_sh = n['state']['value'][1]['value']
-                                if from_sh:
-                                    from_address = self.scripthash_to_address(from_sh)
-                                    if self.validate_address(from_address): svins.append([asset, txid, i+len(utxos), from_address, value, block_time])
+                                from_address = self.scripthash_to_address(from_sh) if from_sh else None
+                                if from_address is not None and not self.validate_address(from_address): from_address = None
                                 to_sh = n['state']['value'][2]['value']
                                 to_address = self.scripthash_to_address(to_sh)
-                                if self.validate_address(to_address): svouts.append([asset, txid, i+len(voutx), to_address, value, block_time])
+                                if not self.validate_address(to_address): to_address = None
+                                #in units, the ledger does not need the decimals
+                                if self.ledger.is_kept(asset): self.ledger.add(txid, block.index, asset, from_address, to_address, units)
+                                decimals = await self.get_cache_decimals(asset)
+                                if decimals is None: continue
+                                if 'Integer' == amount['type']: value = self.integer_to_num_str(amount['value'], decimals=decimals)
+                                else: value = self.hex_to_num_str(amount['value'], decimals=decimals)
+                                if from_address is not None: svins.append([asset, txid, i+len(utxos), from_address, value, block_time])
+                                if to_address is not None: svouts.append([asset, txid, i+len(voutx), to_address, value, block_time])
                     
-        if gvins:
-            await asyncio.wait([self.update_a_gvin(*vin) for vin in gvins])
-        if gvouts:
-            await asyncio.wait([self.update_a_gvout(*vout) for vout in gvouts])
-        uas = []
-        if svins:
-            await asyncio.wait([self.update_a_svin(*vin) for vin in svins])
-            uas = [(vin[3],vin[0]) for vin in svins]
-        if svouts:
-            await asyncio.wait([self.update_a_svout(*vout) for vout in svouts])
-            uas.extend([(vout[3],vout[0]) for vout in svouts])
+        await self.update_histories(gvins, gvouts, svins, svouts)
+        uas = [(vin[3],vin[0]) for vin in svins]
+        uas.extend([(vout[3],vout[0]) for vout in svouts])
         uas = list(set(uas))
+        if self.ledger.enabled:
+            await self.update_ledger_balances()
+            uas = [ua for ua in uas if not self.ledger.is_kept(ua[1])]
         if uas:
             await self.update_addresses(self.max_height, uas, self.chain)
 
@@ -5,21 +5,34 @@
 
 import sys
 import math
+import struct
 import uvloop
 import asyncio
 import aiohttp
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 from logzero import logger
+from binascii import unhexlify
 from Crawler import Crawler
 from decimal import Decimal as D
 from Config import Config as C
 from CommonTool import CommonTool as CT
-from ontology.sdk import Ontology
-from ontology.contract.neo.oep4 import Oep4
-from ontology.exception.exception import SDKException
+from RpcPool import RpcPool
+from AssetRegistry import registry
+from Oep4Client import Oep4Client
+from Metrics import metrics
+from Ledger import Ledger
 
 
 class OEP4History(Crawler):
+    FIXED_DECIMALS = {
+            "0000000000000000000000000000000000000001":0,#ONT
+            "0000000000000000000000000000000000000002":9,#ONG
+            "6c80f3a5c183edee7693a038ca8c476fb0d6ac91":1
+            }
+    ONT = "0000000000000000000000000000000000000001"
+    ONG = "0000000000000000000000000000000000000002"
+    NATIVE = {"0100000000000000000000000000000000000000":ONT, "0200000000000000000000000000000000000000":ONG, ONT:ONT, ONG:ONG}
+
     def __init__(self, name, mysql_args, ont_uri, loop, chain, tasks='1000'):
         self.name = name
         self.start_time = CT.now()
@@ -32,56 +45,137 @@ class OEP4History(Crawler):
         self.cache = {}
         self.sem = asyncio.Semaphore(value=self.max_tasks)
         self.session = aiohttp.ClientSession(loop=loop)
-        self.cache_event = {}
-        self.cache_decimals = {
-                "0000000000000000000000000000000000000001":0,#ONT
-                "0000000000000000000000000000000000000002":9,#ONG
-                "6c80f3a5c183edee7693a038ca8c476fb0d6ac91":1
-                }
-        self.sdk = Ontology(rpc_address=self.neo_uri)
+        self.rpc = RpcPool(self.session, [self.neo_uri], C.get_rpc_batch(), retries=C.get_rpc_retries(), deadline=C.get_rpc_deadline())
+        self.store = None
+        self.feed = None
+        self.transactional = C.get_transactional()
+        self.txn = None
+        self.oep4 = Oep4Client(self.rpc, C.get_oep4_concurrency())
+        self.ledger = Ledger(self, assets=[self.ONT, self.ONG])
+        self.verify = C.get_ont_verify()
+        self.replaying = False
+        self.written = {}
+
+    async def get_smartcodeevents(self, heights):
+        results = await self.rpc.batch('getsmartcodeevent', [[h] for h in heights], min_height=max(heights)+1)
+        return [r if r else [] for r in results]
+
+    @staticmethod
+    def raw_header(raw):
+        '''(Timestamp, Height) of getblock [h,0]: Version, PrevBlockHash, TransactionsRoot and BlockRoot come first'''
+        return struct.unpack('<II', unhexlify(raw[200:216]))
 
-    async def get_smartcodeevent(self, height):
-        async with self.session.post(self.neo_uri, timeout=60,
-                json={'jsonrpc':'2.0','method':'getsmartcodeevent','params':[height],'id':3}) as resp:
-            if 200 != resp.status:
-                logger.error('Unable to fetch smartcodeevent {}, http status: {}'.format(height, resp.status))
-                sys.exit(1)
-            j = await resp.json()
-            if not j['result']: return []
-            return j['result']
+    async def get_timestamps(self, heights):
+        raws = await self.rpc.batch('getblock', [[h,0] for h in heights], min_height=max(heights)+1)
+        timestamps = []
+        for h, raw in zip(heights, raws):
+            timestamp, height = self.raw_header(raw)
+            if height != h: #not the layout expected, let the node decode it
+                timestamp = (await self.rpc.call('getblock', [h,1], min_height=h+1))['Header']['Timestamp']
+            timestamps.append(timestamp)
+        return timestamps
 
-    async def cache_smartcodeevent(self, height):
-        self.cache_event[height] = await self.get_smartcodeevent(height)
+    async def rpc_get_blocks(self, heights):
+        '''
+        {'events', 'timestamp'} of the heights instead of their blocks: the
+        events of all of them in one batch, the timestamp only of the ones
+        with events, from the header in front of the raw block. most heights
+        have none, they cost no getblock and no work in deal_with.
+        '''
+        events = await self.get_smartcodeevents(heights)
+        busy = [h for h, e in zip(heights, events) if e]
+        timestamps = dict(zip(busy, await self.get_timestamps(busy))) if busy else {}
+        metrics.incr('%s.empty_heights' % self.name, len(heights) - len(busy))
+        return [{'events':e, 'timestamp':timestamps.get(h), 'size':256 + 1024 * len(e)} for h, e in zip(heights, events)]
 
-    async def update_a_oep4history(self, txid, operation, index, address, value, dest, timepoint, asset):
-        sql="""INSERT IGNORE INTO %s(txid,operation,index_n,address,value,dest,timepoint,asset) VALUES ('%s','%s',%s,'%s','%s','%s',%s,'%s');""" % (self.name,txid,operation,index,address,value,dest,timepoint,asset)
-        await self.mysql_insert_one(sql)
+    async def update_oep4histories(self, his):
+        await self.mysql_execute_many('oep4_history.insert', his)
 
     async def mysql_new_oep4(self, asset, decimals, symbol, name):
-        sql = """INSERT IGNORE INTO assets(asset,type,name,symbol,version,decimals,contract_name) VALUES('%s','OEP4','%s','%s','0',%s,'%s');""" % (asset,name,symbol,decimals,name)
-        await self.mysql_insert_one(sql)
+        await self.mysql_execute('assets.insert', (asset,'OEP4',name,symbol,'0',decimals,name))
+
+    async def sync_oep4_asset(self, asset):
+        '''decimals of an OEP4 asset new to assets, after saving it; None if it is not one'''
+        info = await self.oep4.info(asset)
+        if info is None: return None
+        decimals, name, symbol = info[0], info[1].strip(), info[2].strip()
+        if 255>= decimals >= 0 and len(symbol) >= 2 and len(name) >= 2:
+            await self.mysql_new_oep4(asset, decimals, symbol, name)
+            return decimals
+        return None
+
+    async def prepare(self):
+        await registry.refresh(self)
+        if C.get_ont_ledger(): await self.ledger.enable()
+        else: await self.ledger.disable()
+
+    @staticmethod
+    def native_address(address):
+        return address if isinstance(address, str) and CT.validate_address(address) else None
+
+    def add_native_transfers(self, e, height):
+        '''ONT and ONG transfers of an event to the ledger, of a failed tx too: its ONG fee is still paid'''
+        for n in e['Notify']:
+            asset = self.NATIVE.get(n['ContractAddress'])
+            if asset is None or not self.ledger.is_kept(asset): continue
+            states = n['States']
+            if not isinstance(states, list) or 4 != len(states) or 'transfer' != states[0]: continue
+            self.ledger.add(e['TxHash'], height, asset, self.native_address(states[1]), self.native_address(states[2]), int(states[3]))
+
+    async def update_ledger_balances(self):
+        '''the ledger sums of the batch to balance; a replay adds the transfers of its dead letters only'''
+        txids = None
+        if self.replaying:
+            rows = await self.mysql_fetchall('dead_letter.open_txs', [self.name] + self.processing, n=len(self.processing))
+            txids = set(r[0] for r in rows)
+        units = await self.ledger.write(txids)
+        data = [(k[0],k[1],self.integer_to_num_str(str(u), decimals=self.FIXED_DECIMALS[k[1]]),self.max_height) for k, u in units.items()]
+        await self.update_address_balances(data)
+        self.written = units
+
+    async def reconcile(self, units):
+        '''getbalance of up to self.verify of the addresses just written, only when the node is at the same height'''
+        if await self.get_block_count() != self.max_height + 1: return
+        keys = Ledger.sample(units.keys(), self.verify)
+        addresses = sorted(set(k[0] for k in keys))
+        balances = dict(zip(addresses, await self.rpc.batch('getbalance', [[a] for a in addresses])))
+        for k in keys:
+            b = balances.get(k[0])
+            if not isinstance(b, dict): continue
+            node = int(b['ont'] if self.ONT == k[1] else b['ong'])
+            metrics.incr('%s.ledger_checks' % self.name)
+            if node == units[k]: continue
+            logger.warning('ledger balance of %s %s is %s, getbalance gives %s' % (k[0], k[1], units[k], node))
+            metrics.incr('%s.ledger_mismatches' % self.name)
+            #every holder of the asset to upt, not only this one
+            await self.ledger.flag(k[1], lambda uas:self.update_addresses(self.max_height, uas, self.chain))
+
+    async def run_batch(self, replay=False):
+        '''samples of the ledger balances are reconciled once the batch is committed'''
+        self.replaying = replay
+        self.written = {}
+        await super(OEP4History,self).run_batch(replay)
+        if self.verify <= 0 or not self.written: return
+        try:
+            await self.reconcile(self.written)
+        except Exception as e:
+            logger.error('reconcile ledger failure: {}'.format(e))
+
+    def get_known_decimals(self, asset):
+        if asset in self.FIXED_DECIMALS: return self.FIXED_DECIMALS[asset]
+        return registry.decimals.get(asset)
 
     async def deal_with(self):
-        #step 0: extract timestamp
-        #step 1: get the smartcodeevent
-        #step 2: convert transfer event to history
+        #step 0: the events and timestamps came with the blocks, see rpc_get_blocks
+        #step 1: convert transfer event to history
         #   A.collect asset
         #   B.sync asset
         #   C.sync history
-
-        #step 0:
-        for k in self.processing:
-            self.cache[k]['timestamp'] = self.cache[k]['Header']['Timestamp']
-        #step 1:
-        await asyncio.wait([self.cache_smartcodeevent(h) for h in self.processing])
-        if sorted(self.cache_event.keys()) != self.processing:
-            msg = 'cache smartcodeevent error'
-            logger.error(msg)
-            sys.exit(1)
-        #step 2:
         his = []
+        self.ledger.clear()
         for h in self.processing:
-            for e in self.cache_event[h]:
+            for e in self.cache[h]['events']:
+                if self.ledger.enabled: self.add_native_transfers(e, h)
                 if 1 == e['State']:
                     txid = e['TxHash']
                     timepoint = self.cache[h]['timestamp']
@@ -90,28 +184,21 @@ class OEP4History(Crawler):
                         asset = n['ContractAddress']
                         if asset in ['0100000000000000000000000000000000000000','0200000000000000000000000000000000000000']:
                             asset = CT.big_or_little(n['ContractAddress'])
-                        if asset not in self.cache_decimals.keys() and n['States'][0] in ["7472616e73666572", "5452414e53464552"]:
+                        decimals = self.get_known_decimals(asset)
+                        if decimals is None and n['States'][0] in ["7472616e73666572", "5452414e53464552"]:
                             #sync asset to db
-                            o4 = Oep4(asset, sdk=self.sdk)
                             try:
-                                decimals = o4.decimals()
-                                name = o4.name().strip()
-                                symbol = o4.symbol().strip()
-                                if 255>= decimals >= 0 and len(symbol) >= 2 and len(name) >= 2:
-                                    await self.mysql_new_oep4(asset, decimals, symbol, name)
-                                    self.cache_decimals[asset] = decimals #update cache_decimals
-                            except SDKException:
-                                pass
-                            except Exception as e:
-                                logger.error('ONT SYNC ASSET ERROR: {}'.format(e.args[0]))
-                                sys.exit(1)
-                            finally:
-                                del o4
-                        if asset in self.cache_decimals.keys():
+                                decimals = await registry.get_decimals(self, asset, self.sync_oep4_asset)
+                            except Exception as ex:
+                                logger.error('ONT SYNC ASSET ERROR: {}'.format(ex))
+                                self.add_dead_letter('tx', txid, h, 'sync asset {} failure: {}'.format(asset, ex))
+                                self.ledger.discard(txid)
+                                break
+                        if decimals is not None:
                             if asset in ['0000000000000000000000000000000000000001','0000000000000000000000000000000000000002']:
                                 address = n['States'][1]
                                 dest = n['States'][2]
-                                value = CT.sci_to_str(str(D(n['States'][3])/D(math.pow(10,self.cache_decimals[asset]))))
+                                value = CT.sci_to_str(str(D(n['States'][3])/D(math.pow(10,decimals))))
                             else:
                                 if asset in ["6c80f3a5c183edee7693a038ca8c476fb0d6ac91"]:
                                     address = n['States'][0]
@@ -124,20 +211,20 @@ class OEP4History(Crawler):
                                 address = CT.scripthash_to_address(address)
                                 dest = CT.scripthash_to_address(dest)
                                 value = CT.hex_to_biginteger(value)
-                                value = CT.sci_to_str(str(D(value)/D(math.pow(10,self.cache_decimals[asset]))))
+                                value = CT.sci_to_str(str(D(value)/D(math.pow(10,decimals))))
                             if False in map(CT.validate_address, [address,dest]): break
                             index = index + 1
                             index_n = index
                             his.append([txid, 'out', index_n, address, value, dest,    timepoint, asset])
                             his.append([txid, 'in',  index_n, dest,    value, address, timepoint, asset])
                 
-        if his: await asyncio.wait([self.update_a_oep4history(*h) for h in his])
+        if his: await self.update_oep4histories(his)
         uas = list(set([(h[3],h[7]) for h in his]))
+        if self.ledger.enabled:
+            await self.update_ledger_balances()
+            uas = [ua for ua in uas if not self.ledger.is_kept(ua[1])]
         if uas: await self.update_addresses(self.max_height, uas, self.chain)
 
-        del self.cache_event
-        self.cache_event = {}
-
 
 if __name__ == "__main__":
     mysql_args = {
@@ -15,12 +15,18 @@ from Config import Config as C
 from decimal import Decimal as D
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 from CommonTool import CommonTool as CT
-from ontology.sdk import Ontology
-from ontology.contract.neo.oep4 import Oep4
-from ontology.exception.exception import SDKException
+from RpcPool import RpcPool
+from Metrics import metrics
+from AssetRegistry import registry
+from Codec import codec
+from Oep4Client import Oep4Client
+from Ledger import Ledger
 
 
 class OEP4UPT(Crawler):
+    ONT = '0000000000000000000000000000000000000001'
+    ONG = '0000000000000000000000000000000000000002'
+
     def __init__(self, name, mysql_args, ont_uri, loop, chain, tasks='100'):
         self.name = name
         self.start_time = CT.now()
@@ -34,32 +40,30 @@ class OEP4UPT(Crawler):
         self.cache = {}
         self.sem = asyncio.Semaphore(value=self.max_tasks)
         self.session = aiohttp.ClientSession(loop=loop)
-        self.sdk = Ontology(rpc_address=self.neo_uri)
-        self.cache_decimals = {}
+        self.rpc = RpcPool(self.session, [self.neo_uri], C.get_rpc_batch(), retries=C.get_rpc_retries(), deadline=C.get_rpc_deadline())
+        self.txn = None
+        self.oep4 = Oep4Client(self.rpc, C.get_oep4_concurrency())
+        self.ledger = Ledger(self, assets=[self.ONT, self.ONG], name='oep4_history') #the native balances OEP4History keeps
 
     async def get_oep4_decimals(self, asset):
-        if self.cache_decimals.get(asset): return self.cache_decimals[asset]
-        sql = "SELECT decimals FROM assets WHERE asset='%s';" % (asset)
-        r = await self.mysql_query_one(sql)
-        if r: self.cache_decimals[asset] = r[0][0]
-        else: self.cache_decimals[asset] = -1
-        return self.cache_decimals[asset]
+        '''-1 for an asset not in assets'''
+        d = await registry.get_decimals(self, asset)
+        return -1 if d is None else d
 
     async def get_address_info_to_update(self, height):
-        sql = "SELECT address,asset FROM upt where chain='%s' AND update_height < %s limit %s;" % (self.chain, height, self.max_tasks)
-        return await self.mysql_query_one(sql)
+        return await self.mysql_fetchall('upt.stale', (self.chain, height, self.max_tasks))
 
     async def get_rpc_ont(self, method, params):
         async with self.session.post(self.ont_uri,
                 json={'jsonrpc':'2.0','method':method,'params':params,'id':1}) as resp:
             if 200 != resp.status:
                 msg = 'Unable to visit %s %s' % (self.ont_uri, method)
-                logging.error(msg)
+                logger.error(msg)
                 return None,msg
-            j = await resp.json()
+            j = codec.loads(await resp.read())
             if 'SUCCESS' != j['desc']:
                 msg = 'result error when %s %s:%s' % (self.ont_uri, method, j['error'])
-                logging.error(msg)
+                logger.error(msg)
                 return None,msg
             return j['result'],None
 
@@ -72,51 +76,73 @@ class OEP4UPT(Crawler):
     
     async def get_balance(self, address, asset):
         if 40 == len(asset):#nep5
-            if '0000000000000000000000000000000000000001' == asset:
+            if self.ONT == asset:
                 return await self.get_ont_balance(address,'ont')
-            elif '0000000000000000000000000000000000000002' == asset:
+            elif self.ONG == asset:
                 return await self.get_ont_balance(address,'ong')
             else:
-                try:
-                    o4 = Oep4(asset, sdk=self.sdk)
-                    b = o4.balance_of(address)
-                except SDKException:
-                    return '-1'
-                finally:
-                    del o4
+                b = await self.oep4.balance_of(asset, address)
+                if b is None: return '-1'
                 d = await self.get_oep4_decimals(asset)
                 if d >= 0: return CT.sci_to_str(str(D(b)/D(math.pow(10, d))))
                 else: return '-1'
         return '-1'
 
 
+    async def drop_kept(self, upts, height):
+        '''upts of ONT and ONG OEP4History keeps in its ledger are done without a getbalance, the rest'''
+        await self.ledger.load() #what OEP4History persisted, not the settings here
+        kept = [upt for upt in upts if self.ledger.is_kept(upt[1])]
+        if not kept: return upts
+        metrics.incr('%s.ledger_kept' % self.name, len(kept))
+        await self.update_upts(kept, height)
+        return [upt for upt in upts if upt not in kept]
+
+    async def retry_upts(self, upts, height):
+        '''failed upts go behind the rest of upt.stale instead of heading it every round'''
+        await self.mysql_execute_many('upt.retry', [(height, upt[0], upt[1], height) for upt in upts])
+
+    async def refresh(self, upts, current_height):
+        upts = await self.drop_kept(upts, current_height)
+        if not upts: return
+        result = await asyncio.gather(*[self.get_balance(*upt) for upt in upts], return_exceptions=True)
+        data = []
+        done = []
+        failed = []
+        for i in range(len(upts)):
+            upt = upts[i]
+            address = upt[0]
+            asset = upt[1]
+            r = result[i]
+            if isinstance(r, Exception): #stays in upt, retried after a block
+                logger.error('get balance of {} {} failure: {}'.format(address, asset, r))
+                metrics.incr('%s.failures' % self.name)
+                failed.append(upt)
+                continue
+            if r!= '-1': data.append((address,asset,r,current_height))
+            done.append(upt)
+        await self.update_address_balances(data)
+        await self.update_upts(done, current_height)
+        if failed: await self.retry_upts(failed, current_height)
+
     async def infinite_loop(self):
         while True:
             current_height = await self.get_block_count()
             upts = await self.get_address_info_to_update(current_height)
             if upts:
-                result = []
-                for upt in upts:
-                    result.append(await self.get_balance(*upt))
-                #result = await asyncio.gather(*[self.get_balance(*upt) for upt in upts]) 
-                data = []
-                for i in range(len(upts)):
-                    upt = upts[i]
-                    address = upt[0]
-                    asset = upt[1]
-                    r = result[i]
-                    if r!= '-1': data.append((address,asset,r,current_height,r,current_height))
-                await self.update_address_balances(data)
-                await self.update_upts(upts, current_height)
-
+                await self.refresh(upts, current_height)
             else:
                await asyncio.sleep(0.5)
 
+    async def prepare(self):
+        await registry.refresh(self)
+
     async def crawl(self):
         self.pool = await self.get_mysql_pool()
         if not self.pool:
             sys.exit(1)
         try:
+            await self.prepare()
             await self.infinite_loop()
         except Exception as e:
             logger.error('CRAWL EXCEPTION: {}'.format(e.args[0]))
@@ -10,6 +10,12 @@ asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 from logzero import logger
 from Crawler import Crawler
 from Config import Config as C
+from Metrics import metrics
+from AssetRegistry import registry
+from RefreshQueue import RefreshQueue
+from Nep5Batch import Nep5Batch
+from Ledger import Ledger
+from CommonTool import CommonTool as CT
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
 
@@ -17,27 +23,64 @@ class UPT(Crawler):
     def __init__(self, name, mysql_args, neo_uri, loop, super_node_uri, chain, tasks='100'):
         super(UPT,self).__init__(name, mysql_args, neo_uri, loop, super_node_uri, tasks)
         self.chain = chain
-        self.cache_decimals = {}
         self.cache_balances = {}
+        self.nep5_balances = {}
+        self.nep5_batch = Nep5Batch(self, C.get_nep5_batch())
+        self.ledger = Ledger(self, C.get_nep5_flagged(), name='history') #the NEP5 balances History keeps
+        self.queue = RefreshQueue()
+        self.changed = 0 #unix time of the last change to upt seen, by the mysql clock
+        self.stats_time = 0
 
+    async def poll_upts(self):
+        '''changes to upt since the last poll into the queue, all of upt on the first'''
+        rows = await self.mysql_fetchall('upt.changed', (self.chain, self.changed))
+        for r in rows:
+            self.queue.push(r[0], r[1], r[2], r[3], r[4])
+            self.changed = max(self.changed, int(r[5]))
+
+    def log_queue(self, height):
+        if CT.now() - self.stats_time < 60: return
+        self.stats_time = CT.now()
+        p50, p90, p99 = self.queue.percentiles(height)
+        metrics.gauge('%s.queue_depth' % self.name, len(self.queue))
+        metrics.gauge('%s.queue_age_p50' % self.name, p50)
+        metrics.gauge('%s.queue_age_p90' % self.name, p90)
+        metrics.gauge('%s.queue_age_p99' % self.name, p99)
 
     async def get_address_info_to_update(self, height):
-        sql = "SELECT address,asset FROM upt where chain='%s' AND update_height < %s limit %s;" % (self.chain, height, self.max_tasks)
-        return await self.mysql_query_one(sql)
+        await self.poll_upts()
+        self.log_queue(height)
+        return self.queue.pop(self.max_tasks, height)
 
     async def get_cache_decimals(self, contract):
-        if contract not in self.cache_decimals.keys():
-            self.cache_decimals[contract] = await self.get_decimals(contract)
-        return self.cache_decimals[contract]
+        return await registry.get_decimals(self, contract, self.get_decimals)
     
     async def get_cache_global_balance(self, address):
         if address not in self.cache_balances.keys():
             self.cache_balances[address] = await self.get_global_balance(address)
         return self.cache_balances[address]
 
+    async def cache_global_balances(self, upts):
+        addresses = list(set([upt[0] for upt in upts if 64 == len(upt[1])]))
+        addresses = [a for a in addresses if a not in self.cache_balances.keys()]
+        if not addresses: return
+        balances = await self.get_global_balances(addresses)
+        for i in range(len(addresses)):
+            self.cache_balances[addresses[i]] = balances[i]
+
+    async def get_cache_nep5_balance(self, address, asset):
+        b = self.nep5_balances.get((asset, address))
+        if b is None: b = await self.get_nep5_balance(asset, address)
+        return b
+
+    async def cache_nep5_balances(self, upts):
+        pairs = [(upt[1], upt[0]) for upt in upts if 40 == len(upt[1])]
+        if not pairs: return
+        self.nep5_balances = await self.nep5_batch.get_balances(pairs)
+
     async def get_balance(self, address, asset):
         if 40 == len(asset):#nep5
-            b = await self.get_nep5_balance(asset,address)
+            b = await self.get_cache_nep5_balance(address, asset)
             if 0 == len(b['value']): return '0'
             decimals = await self.get_cache_decimals(asset)
             if decimals is None: return '0'
@@ -45,41 +88,75 @@ class UPT(Crawler):
                 return self.hex_to_num_str(b['value'], decimals=decimals)
             if 'Integer' == b['type']:
                 return self.integer_to_num_str(b['value'], decimals=decimals)
-            sys.exit(1)
+            raise ValueError('wrong type for balance {}'.format(b))
         if 64 == len(asset):#global
             asset = '0x' + asset
             b = await self.get_cache_global_balance(address)
             for i in b:
                 if asset == i['asset']: return i['value']
             return '0'
-        sys.exit(1)
+        raise ValueError('wrong asset {}'.format(asset))
+
+
+    async def drop_kept(self, upts, height):
+        '''upts of NEP5 History keeps in its ledger are done without a balanceOf, the rest'''
+        await self.ledger.load() #flags come before the upts of the holders
+        kept = [upt for upt in upts if 40 == len(upt[1]) and self.ledger.is_kept(upt[1])]
+        if not kept: return upts
+        metrics.incr('%s.ledger_kept' % self.name, len(kept))
+        await self.update_upts(kept, height)
+        return [upt for upt in upts if upt not in kept]
 
+    async def refresh(self, upts, current_height):
+        upts = await self.drop_kept(upts, current_height)
+        if not upts: return
+        try:
+            await self.cache_global_balances(upts)
+        except Exception as e:
+            logger.warning('get {} account states failure: {}, get them one by one'.format(len(upts), e))
+        try:
+            await self.cache_nep5_balances(upts)
+        except Exception as e:
+            logger.warning('invoke balanceOf of {} upts failure: {}, get them one by one'.format(len(upts), e))
+        result = await asyncio.gather(*[self.get_balance(upt[0], upt[1]) for upt in upts], return_exceptions=True)
+        data = []
+        done = []
+        for i in range(len(upts)):
+            upt = upts[i]
+            address = upt[0]
+            asset = upt[1]
+            r = result[i]
+            if isinstance(r, Exception): #stays in upt for the next round
+                logger.error('get balance of {} {} failure: {}'.format(address, asset, r))
+                metrics.incr('%s.failures' % self.name)
+                self.queue.push(*upt)
+                continue
+            data.append((address,asset,r,current_height))
+            done.append(upt)
+        await self.update_address_balances(data)
+        await self.update_upts(done, current_height)
+
+        self.cache_balances = {}
+        self.nep5_balances = {}
 
     async def infinite_loop(self):
         while True:
             current_height = await self.get_block_count()
             upts = await self.get_address_info_to_update(current_height)
             if upts:
-                result = await asyncio.gather(*[self.get_balance(*upt) for upt in upts]) 
-                data = []
-                for i in range(len(upts)):
-                    upt = upts[i]
-                    address = upt[0]
-                    asset = upt[1]
-                    r = result[i]
-                    data.append((address,asset,r,current_height,r,current_height))
-                await self.update_address_balances(data)
-                await self.update_upts(upts, current_height)
-
-                self.cache_balances = {}
+                await self.refresh(upts, current_height)
             else:
                await asyncio.sleep(0.5)
 
+    async def prepare(self):
+        await registry.refresh(self)
+
     async def crawl(self):
         self.pool = await self.get_mysql_pool()
         if not self.pool:
             sys.exit(1)
         try:
+            await self.prepare()
             await self.infinite_loop()
         except Exception as e:
             logger.error('CRAWL EXCEPTION: {}'.format(e.args[0]))
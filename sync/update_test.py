@@ -0,0 +1,105 @@
+import os
+import unittest
+import asyncio
+from unittest import mock
+
+from update import UPT
+from Ledger import Ledger
+from RefreshQueue import RefreshQueue
+from Nep5Batch import Nep5Batch
+from Nep5Batch_test import FakeNode, CONTRACT, address
+
+loop = asyncio.new_event_loop()
+
+def async_test(coro):
+    def wrapper(*args, **kwargs):
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+KEPT = 'a' * 40
+FLAGGED = 'b' * 40
+NEO = 'c' * 64
+
+
+class FakeUPT(UPT):
+    '''UPT without a node or mysql: History keeps KEPT and has flagged FLAGGED'''
+    def __init__(self, ledger=Ledger.ON):
+        self.name = 'upt'
+        self.transactional = False
+        self.cache_balances = {}
+        self.nep5_balances = {}
+        self.queue = RefreshQueue()
+        self.ledger = Ledger(self, name='history')
+        self.status = {} if ledger is None else {'history_ledger':ledger}
+        self.written = {}
+        self.balance_ofs = []
+
+    async def mysql_fetchone(self, name, args):
+        return (self.status[args[0]],) if args[0] in self.status else None
+
+    async def mysql_fetchall(self, name, args, n=None, width=1):
+        return [(FLAGGED,)] if 'ledger_flag.get' == name else []
+
+    async def mysql_execute_many(self, name, rows):
+        self.written.setdefault(name, []).extend(rows)
+
+    async def get_cache_decimals(self, contract):
+        return 8
+
+    async def get_global_balances(self, addresses):
+        return [[{'asset':'0x' + NEO, 'value':'1'}] for a in addresses]
+
+    async def cache_nep5_balances(self, upts):
+        pass
+
+    async def get_nep5_balance(self, contract, address):
+        self.balance_ofs.append(contract)
+        return {'type':'Integer', 'value':'100000000'}
+
+
+class TestUPT(unittest.TestCase):
+    UPTS = [('A1', KEPT, 5, 5, 0), ('A1', FLAGGED, 5, 5, 0), ('A1', NEO, 5, 5, 0)]
+
+    @async_test
+    async def test_kept_never_invoked(self):
+        u = FakeUPT() #what History persisted decides, not the settings of UPT
+        with mock.patch.dict(os.environ, {'NEP5LEDGER':'false', 'TRANSACTIONAL':'false'}):
+            await u.refresh(self.UPTS, 10)
+        self.assertEqual([FLAGGED], u.balance_ofs)
+        self.assertEqual([('A1', FLAGGED, '1', 10), ('A1', NEO, '1', 10)], sorted(u.written['balance.set']))
+        self.assertEqual(3, len(u.written['upt.done'])) #the kept one is done too
+
+    @async_test
+    async def test_without_the_ledger(self):
+        for u in [FakeUPT(Ledger.OFF), FakeUPT(None)]:
+            with mock.patch.dict(os.environ, {'NEP5LEDGER':'true', 'TRANSACTIONAL':'true'}):
+                await u.refresh(self.UPTS, 10)
+            self.assertEqual([KEPT, FLAGGED], sorted(u.balance_ofs))
+
+
+class BatchUPT(FakeUPT):
+    '''FakeUPT with the real cache_nep5_balances, Nep5Batch invoking on a fake node'''
+    cache_nep5_balances = UPT.cache_nep5_balances
+
+    def __init__(self):
+        super(BatchUPT,self).__init__(None)
+        self.rpc = FakeNode(100)
+        self.nep5_batch = Nep5Batch(self, 40)
+
+
+class TestBatch(unittest.TestCase):
+    @async_test
+    async def test_one_invokescript(self):
+        u = BatchUPT()
+        upts = [(address(i), CONTRACT, 5, 5, 0) for i in range(30)]
+        await u.refresh(upts, 10)
+        self.assertEqual(1, u.rpc.scripts)
+        self.assertEqual([], u.balance_ofs) #no balanceOf one by one
+        balances = {r[0]:r[2] for r in u.written['balance.set']}
+        self.assertEqual(30, len(balances))
+        self.assertEqual(UPT.integer_to_num_str(str(12 + 40)), balances[address(12)])
+        self.assertEqual({}, u.nep5_balances)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,63 +4,169 @@
 # Licensed under the MIT License.
 
 import sys
+import random
 import uvloop
 import asyncio
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+import aiomysql
 from logzero import logger
+from CommonTool import CommonTool as CT
 from Crawler import Crawler
 from Config import Config as C
+from UtxoIndex import UtxoIndex
+from SysFee import SysFee
+from GlobalBalances import GlobalBalances
+from Metrics import metrics
+from Query import query
 
 
 class UTXO(Crawler):
+    MISS_CHUNK = 1000
+    SYS_FEE_CHUNK = 100000
+
     def __init__(self, name, mysql_args, neo_uri, loop, super_node_uri, chain, tasks='1000'):
         super(UTXO,self).__init__(name, mysql_args, neo_uri, loop, super_node_uri, tasks)
         self.chain = chain
+        self.index = UtxoIndex(C.get_utxo_index_size())
+        self.sys_fee = SysFee(C.get_sys_fee_file())
+        self.balances = GlobalBalances(C.get_global_balance_size())
+        self.verify = C.get_global_verify()
+        self.replaying = False
+        self.staged = {}
+
+    async def prepare(self):
+        await self.load_utxo_index()
+        await self.load_sys_fee()
+
+    async def load_sys_fee(self):
+        '''the heights of block not in self.sys_fee yet'''
+        time_a = CT.now()
+        start = len(self.sys_fee)
+        while True:
+            rows = await self.mysql_fetchall('block.total_sys_fees', (len(self.sys_fee), self.SYS_FEE_CHUNK))
+            if not rows or self.sys_fee.extend(rows) < len(rows): break
+        logger.info('load total_sys_fee of heights %s-%s, cost %.3fs' % (start, len(self.sys_fee)-1, CT.now()-time_a))
+
+    async def load_utxo_index(self):
+        if self.index.capacity <= 0: return
+        time_a = CT.now()
+        conn = await self.pool.acquire()
+        try:
+            async with conn.cursor(aiomysql.SSCursor) as cur:
+                await query.execute(cur, 'utxos.unspent')
+                while True:
+                    rows = await cur.fetchmany(10000)
+                    if not rows: break
+                    for r in rows: self.index.add(*r)
+        finally:
+            await self.pool.release(conn)
+        logger.info('load %s unspent outputs into index, cost %.3fs' % (len(self.index), CT.now()-time_a))
 
     async def update_a_vin(self, vin, txid, height):
-        sql="""UPDATE utxos SET spent_txid='%s',spent_height=%s,status=0 WHERE txid='%s' AND index_n=%s;""" % (txid,height,vin['txid'],vin['vout'])
-        await self.mysql_insert_one(sql)
+        await self.mysql_execute('utxos.spend', (txid,height,vin.txid,vin.vout))
 
     async def update_a_vout(self, vout, txid, height):
-        sql="""INSERT IGNORE INTO utxos(txid,index_n,address,value,asset,height) VALUES ('%s',%s,'%s','%s','%s',%s);""" % (txid,vout['n'],vout['address'],vout['value'],vout['asset'][2:],height)
-        await self.mysql_insert_one(sql)
+        await self.mysql_execute('utxos.insert', (txid,vout.n,vout.address,vout.value,vout.asset[2:],height))
 
     async def update_a_claim(self, claim, txid, height):
-        sql="""UPDATE utxos SET claim_txid='%s',claim_height=%s WHERE txid='%s' AND index_n=%s;""" % (txid,height,claim['txid'],claim['vout'])
-        await self.mysql_insert_one(sql)
+        await self.mysql_execute('utxos.claim', (txid,height,claim.txid,claim.vout))
+
+    async def update_vouts(self, vouts):
+        rows = [(txid,vout.n,vout.address,vout.value,vout.asset[2:],height) for vout,txid,height in vouts]
+        await self.mysql_execute_many('utxos.insert', rows)
+
+    async def update_vins(self, vins):
+        rows = [(vin.txid,vin.vout,txid,height) for vin,txid,height in vins]
+        await self.mysql_join_update('tmp_vins', rows)
+
+    async def update_claims(self, claims):
+        rows = [(claim.txid,claim.vout,txid,height) for claim,txid,height in claims]
+        await self.mysql_join_update('tmp_claims', rows)
 
     async def update_block(self, block):
-        sql="INSERT IGNORE INTO block(height,sys_fee,total_sys_fee) VALUES (%s,%s,%s) ;" % (block['index'],block['sys_fee'],block['total_sys_fee'])
-        await self.mysql_insert_one(sql)
+        await self.mysql_execute('block.insert', (block.index,block.sys_fee,block.total_sys_fee))
+
+    async def update_blocks(self, blocks):
+        rows = [(block.index,block.sys_fee,block.total_sys_fee) for block in blocks]
+        await self.mysql_execute_many('block.insert', rows)
 
     async def update_sys_fee(self):
-        base_sys_fee = await self.get_total_sys_fee(self.min_height - 1)
+        base_sys_fee = self.sys_fee.get(self.min_height - 1)
+        if base_sys_fee is None: base_sys_fee = await self.get_total_sys_fee(self.min_height - 1)
         for h in self.processing:
             block = self.cache[h]
-            block['sys_fee'] = 0
-            block['total_sys_fee'] = base_sys_fee
-            for tx in block['tx']:
-                block['sys_fee'] += int(float(tx['sys_fee']))
-            block['total_sys_fee'] += block['sys_fee']
-            base_sys_fee = block['total_sys_fee']
-
-    async def get_address_info_from_vin(self, vin):
-        conn, cur = await self.get_mysql_cursor()
+            block.sys_fee = sum(tx.sys_fee for tx in block.tx)
+            block.total_sys_fee = base_sys_fee + block.sys_fee
+            base_sys_fee = block.total_sys_fee
+
+    async def get_address_info_from_vins(self, vins):
+        '''(address, asset, value) of every vin: from the index, misses from utxos in chunks of MISS_CHUNK'''
+        found = {}
+        misses = []
+        for vin in vins:
+            o = self.index.get(vin.txid, vin.vout)
+            if o is None: misses.append(vin)
+            else: found[vin] = o
+        for i in range(0, len(misses), self.MISS_CHUNK):
+            chunk = misses[i:i+self.MISS_CHUNK]
+            args = [x for m in chunk for x in m]
+            for r in await self.mysql_fetchall('utxos.by_outpoints', args, n=len(chunk), width=2):
+                found[(r[0], r[1])] = (r[2], r[3], r[4])
+        if misses: logger.info('%s of %s vins missed the utxo index' % (len(misses), len(vins)))
+        result = []
+        for vin in vins:
+            if vin not in found.keys():
+                raise ValueError('Unable to get utxos {} {}'.format(vin.txid, vin.vout))
+            result.append(found[vin])
+        return result
+
+    async def update_global_balances(self, deltas):
+        '''
+        new sums of the changed (address, asset) to balance, the ones not in
+        self.balances summed from utxos after this batch's own writes. on a
+        replay every key is summed, its changes may be in utxos already.
+        '''
+        if self.replaying: sums, unknown = {}, list(deltas)
+        else: sums, unknown = self.balances.apply(deltas)
+        for i in range(0, len(unknown), self.MISS_CHUNK):
+            chunk = unknown[i:i+self.MISS_CHUNK]
+            for k in chunk: sums[k] = 0
+            args = [x for k in chunk for x in k]
+            for r in await self.mysql_fetchall('utxos.sums', args, n=len(chunk), width=2):
+                sums[(r[0], r[1])] = GlobalBalances.fixed8(r[2])
+        metrics.incr('%s.balance_sums' % self.name, len(unknown))
+        await self.update_address_balances([(k[0],k[1],GlobalBalances.to_str(v),self.max_height) for k, v in sums.items()])
+        self.staged = sums
+
+    async def verify_global_balances(self, keys):
+        '''getaccountstate of up to self.verify of the addresses just written, only when the node is at the same height'''
+        if await self.get_block_count() != self.max_height + 1: return
+        addresses = sorted(set(k[0] for k in keys))
+        addresses = random.sample(addresses, min(self.verify, len(addresses)))
+        states = await self.get_global_balances(addresses)
+        for address, balances in zip(addresses, states):
+            node = {b['asset'][2:]:GlobalBalances.fixed8(b['value']) for b in balances}
+            for k in keys:
+                if address != k[0] or k not in self.balances: continue
+                metrics.incr('%s.balance_checks' % self.name)
+                if node.get(k[1], 0) == self.balances.get(k): continue
+                logger.warning('balance of %s %s is %s, the node says %s' % (address, k[1],
+                    GlobalBalances.to_str(self.balances.get(k)), GlobalBalances.to_str(node.get(k[1], 0))))
+                metrics.incr('%s.balance_mismatches' % self.name)
+                self.balances.discard(k) #summed from utxos the next time it changes
+
+    async def run_batch(self, replay=False):
+        '''the sums of the batch go to self.balances and its totals to sys_fee once it is committed'''
+        self.replaying = replay
+        self.staged = {}
+        await super(UTXO,self).run_batch(replay)
+        self.balances.update(self.staged)
+        self.sys_fee.extend([(h, self.cache[h].total_sys_fee) for h in self.processing])
+        if self.verify <= 0 or not self.staged: return
         try:
-            await cur.execute("select address,asset from utxos where txid='%s' and index_n=%s;" % (vin['txid'],vin['vout']))
-            result = await cur.fetchone()
-            if result:
-                addr = result[0]
-                asset = result[1]
-                #logger.info('from utxos get address:%s, asset:%s' % (addr,asset))
-                return addr,asset
-            logger.error('Unable to get utxos {}'.format(vin['txid']))
-            sys.exit(1)
+            await self.verify_global_balances(list(self.staged))
         except Exception as e:
-            logger.error("mysql SELECT failure:{}".format(e.args[0]))
-            sys.exit(1)
-        finally:
-            await self.pool.release(conn)
+            logger.error('verify balances failure: {}'.format(e))
 
     async def deal_with(self):
         await self.update_sys_fee()
@@ -68,30 +174,29 @@ class UTXO(Crawler):
         vouts = []
         claims = []
         for block in self.cache.values():
-            for tx in block['tx']:
-                txid = tx['txid']
-                height = block['index']
-                for vin in tx['vin']:
+            for tx in block.tx:
+                txid = tx.txid
+                height = block.index
+                for vin in tx.vin:
                     vins.append([vin, txid, height])
-                for vout in tx['vout']:
+                for vout in tx.vout:
                     vouts.append([vout, txid, height])
-                if 'claims' in tx.keys():
-                    for claim in tx['claims']:
-                        claims.append([claim, txid, height])
-        if vouts:
-            await asyncio.wait([self.update_a_vout(*vout) for vout in vouts])
-        if vins:
-            await asyncio.wait([self.update_a_vin(*vin) for vin in vins])
-        if claims:
-            await asyncio.wait([self.update_a_claim(*claim) for claim in claims])
-
-        uas = []
-        vinas = await asyncio.gather(*[self.get_address_info_from_vin(vin[0]) for vin in vins])
-        voutas = [(vout[0]['address'],vout[0]['asset'][2:]) for vout in vouts]
-        uas = list(set(vinas + voutas))
-        if uas: await self.update_addresses(self.max_height, uas, self.chain)
-
-        await asyncio.wait([self.update_block(block) for block in self.cache.values()])
+                for claim in tx.claims:
+                    claims.append([claim, txid, height])
+        for vout, txid, height in vouts:
+            self.index.add(txid, vout.n, vout.address, vout.asset[2:], vout.value)
+        vinas = await self.get_address_info_from_vins([vin[0] for vin in vins])
+        for vin in vins: self.index.pop(vin[0].txid, vin[0].vout)
+
+        if vouts: await self.update_vouts(vouts)
+        if vins: await self.update_vins(vins)
+        if claims: await self.update_claims(claims)
+
+        outputs = [(vout[0].address,vout[0].asset[2:],vout[0].value) for vout in vouts]
+        deltas = GlobalBalances.deltas(outputs, vinas)
+        if deltas: await self.update_global_balances(deltas)
+
+        await self.update_blocks(self.cache.values())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,53 @@
+import sqlite3
+import unittest
+import asyncio
+
+from utxo import UTXO
+from GlobalBalances import GlobalBalances
+from Query import query
+
+loop = asyncio.new_event_loop()
+
+def async_test(coro):
+    def wrapper(*args, **kwargs):
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+
+class FakeUTXO(UTXO):
+    '''UTXO with utxos in sqlite, running the real utxos.sums'''
+    def __init__(self, rows):
+        self.name = 'utxo'
+        self.balances = GlobalBalances()
+        self.replaying = False
+        self.max_height = 0
+        self.written = {}
+        self.db = sqlite3.connect(':memory:')
+        self.db.execute('CREATE TABLE utxos (address TEXT, asset TEXT, value TEXT, status INT)')
+        self.db.executemany('INSERT INTO utxos VALUES (?,?,?,?)', rows)
+
+    async def mysql_fetchall(self, name, args=None, n=None, width=1):
+        return self.db.execute(query.sql(name, n, width).replace('%s', '?'), args).fetchall()
+
+    async def update_address_balances(self, data):
+        for address, asset, value, height in data: self.written[(address, asset)] = value
+
+    async def batch(self, outputs, spent):
+        self.staged = {}
+        await self.update_global_balances(GlobalBalances.deltas(outputs, spent))
+        self.balances.update(self.staged)
+
+
+class TestUTXO(unittest.TestCase):
+    @async_test
+    async def test_frozen_output(self):
+        #A has 10 unspent and 5 frozen by www: a tx spending it was broadcast, not confirmed yet
+        u = FakeUTXO([('A', 'neo', '10', 1), ('A', 'neo', '5', 2), ('A', 'neo', '7', 0), ('A', 'neo', '1', 1)])
+        await u.batch([('A', 'neo', '1')], []) #its new output is in utxos already
+        self.assertEqual('16', u.written[('A', 'neo')])
+        await u.batch([], [('A', 'neo', '5')]) #the spend confirms
+        self.assertEqual('11', u.written[('A', 'neo')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,7 @@
 
 import sys
 import math
+import time
 import asyncio
 from coreweb import get, post, options
 from decimal import Decimal as D
@@ -12,6 +13,8 @@ from binascii import hexlify, unhexlify
 from .tools import Tool, check_decimal, sci_to_str, big_or_little
 from .assets import NEO, GAS, SEAS, SEAC, CSEAS, CSEAC, ONT_ASSETS
 import logging
+from query import query
+from codec import codec
 logging.basicConfig(level=logging.DEBUG)
 from copy import deepcopy
 
@@ -70,7 +73,7 @@ async def get_rpc(request,method,params):
         if 200 != resp.status:
             logging.error('Unable to visit %s %s' % (request.app['neo_uri'], method))
             return '404'
-        j = await resp.json()
+        j = codec.loads(await resp.read())
         if 'error' in j.keys():
             logging.error('result error when %s %s' % (request.app['neo_uri'], method))
             return '404'
@@ -83,7 +86,7 @@ async def send_raw_transaction(tx, request):
         if 200 != resp.status:
             logging.error('Unable to visit %s %s' % (request.app['neo_uri'], method))
             return False,'404'
-        j = await resp.json()
+        j = codec.loads(await resp.read())
         if 'error' in j.keys():
             logging.error('result error when %s %s' % (request.app['neo_uri'], method))
             return False, j['error']['message']
@@ -104,7 +107,7 @@ async def get_rpc_ont(request,method,params):
             msg = 'Unable to visit %s %s' % (request.app['ont_uri'], method)
             logging.error(msg)
             return None,msg
-        j = await resp.json()
+        j = codec.loads(await resp.read())
         if 'SUCCESS' != j['desc']:
             msg = 'result error when %s %s:%s' % (request.app['ont_uri'], method, j['error'])
             logging.error(msg)
@@ -126,21 +129,19 @@ async def get_mysql_cursor(pool):
     cur  = await conn.cursor()
     return conn, cur
 
-async def mysql_query_one(pool, sql):
+async def mysql_query_one(pool, name, args=None, n=None):
     conn, cur = await get_mysql_cursor(pool)
-    logging.info('SQL:%s' % sql)
     try:
-        await cur.execute(sql)
+        await query.execute(cur, name, args, n)
         return await cur.fetchall()
     except Exception as e:
-        logging.error("mysql QUERY failure:{}".format(e.args[0]))
+        logging.error("mysql QUERY {} failure:{} args:{}".format(name, e.args[0], args))
         sys.exit(1)
     finally:
         await pool.release(conn)
 
 async def mysql_get_block(pool, b):
-    sql = "SELECT sys_fee,total_sys_fee FROM block WHERE height=%s;" % b
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'block.get', (b,))
     if r: return {'sys_fee':r[0][0], 'total_sys_fee':r[0][1]}
     return None
 
@@ -155,15 +156,13 @@ async def mysql_freeze_utxo(request, txid):
     utxos = cache.get(txid, [])
     if utxos:
         pool = request.app['pool']
-        sql = "UPDATE utxos SET status=2 where txid='%s' and index_n=%s and status=1"
         data = [('0x'+u['prevHash'],u['prevIndex']) for u in utxos]
-        await asyncio.gather(*[mysql_insert_one(pool, sql % d) for d in data])
+        await mysql_insert_many(pool, 'utxos.freeze', data)
         cache.delete(txid)
 
 async def mysql_get_neo_balance(request, address):
     assets = request.app['cache'].get('assets')
-    sql = "SELECT asset,value FROM balance WHERE address='%s';" % address
-    result = await mysql_query_one(request.app['pool'], sql)
+    result = await mysql_query_one(request.app['pool'], 'balance.by_address', (address,))
     result = dict(result)
     balance = {}
     for g in assets['GLOBAL']:
@@ -176,8 +175,7 @@ async def mysql_get_neo_balance(request, address):
 
 async def mysql_get_balance(request, address):
     assets = request.app['cache'].get('assets')
-    sql = "SELECT asset,value FROM balance WHERE address='%s';" % address
-    result = await mysql_query_one(request.app['pool'], sql)
+    result = await mysql_query_one(request.app['pool'], 'balance.by_address', (address,))
     result = dict(result)
     balance = {}
     for g in assets['GLOBAL']:
@@ -195,9 +193,8 @@ async def mysql_get_balance(request, address):
     return balance
 
 async def mysql_get_all_unclaim_utxo(pool, address, height):
-    sql = "SELECT txid,index_n,height,spent_txid,spent_height,value,status FROM utxos WHERE address='%s' AND asset='%s' AND claim_height IS NULL;" % (address, NEO[2:])
     result = {}
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'utxos.unclaimed', (address, NEO[2:]))
     for i in r:
         if 0 == i[6]:#available
             result[i[0][2:]+'_'+str(i[1])] = {'startIndex':i[2],'stopHash':i[3],'stopIndex':i[4],'value':i[5],'status':True}
@@ -206,42 +203,47 @@ async def mysql_get_all_unclaim_utxo(pool, address, height):
     return result
 
 async def mysql_get_block_total_sys_fee(pool, heights):
-    s = ''
-    for i in range(len(heights)):
-        if 0 == i: s += str(heights[i])
-        else: s += ',' + str(heights[i])
-    sql = "SELECT total_sys_fee FROM block WHERE height IN (%s);" % s
     result = {-1:0,0:0}
-    r = await mysql_query_one(pool, sql)
-    for i in range(len(heights)):
-        result[heights[i]] = r[i][0]
+    r = await mysql_query_one(pool, 'block.total_sys_fee', heights, n=len(heights))
+    for i in r:
+        result[i[0]] = i[1]
+    return result
+
+async def get_block_total_sys_fee(request, heights):
+    '''from app['sys_fee'], the heights it does not have yet from block'''
+    sys_fee = request.app['sys_fee']
+    result = {-1:0,0:0}
+    missing = []
+    for h in heights:
+        total = sys_fee.get(h)
+        if total is None: missing.append(h)
+        else: result[h] = total
+    if missing: result.update(await mysql_get_block_total_sys_fee(request.app['pool'], missing))
     return result
 
 async def mysql_get_nep5_asset_balance(pool, address, asset):
-    sql = "SELECT value FROM balance WHERE address='%s' AND asset='%s';" % (address, asset)
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'balance.get', (address, asset))
     if r: return r[0][0]
     return '0'
 
 async def mysql_get_history(pool, address, asset, offset, length):
     if asset:
         if asset['type'] in ['ONTNATIVE','OEP4']:
-            sql = "SELECT txid,timepoint,operation,value,asset FROM oep4_history WHERE address='%s' AND asset='%s' ORDER BY timepoint DESC limit %s,%s;" % (address, asset['id'], offset, length)
+            name, args = 'oep4_history.by_asset', (address, asset['id'], offset, length)
         else:
-            sql = "SELECT txid,timepoint,operation,value,asset FROM history WHERE address='%s' AND asset='%s' ORDER BY timepoint DESC limit %s,%s;" % (address, asset['id'], offset, length)
+            name, args = 'history.by_asset', (address, asset['id'], offset, length)
     else:
-        sql = "SELECT txid,timepoint,operation,value,asset FROM history WHERE address='%s' ORDER BY timepoint DESC limit %s,%s;" % (address, offset, length)
+        name, args = 'history.by_address', (address, offset, length)
     result = []
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, name, args)
     for i in r:
         if 64==len(i[4]): result.append({'txid':i[0],'time':i[1],'asset':'0x'+i[4],'value':i[3],'operation':i[2]})
         else: result.append({'txid':i[0],'time':i[1],'asset':i[4],'value':i[3],'operation':i[2]})
     return result
 
 async def mysql_get_platform(pool, p):
-    sql = "SELECT version,download_url,force_update,sha1,sha256,release_time,update_notes_zh,update_notes_en FROM platform WHERE name='%s' ORDER BY release_time DESC limit 1;" % p
     result = {'platform':p}
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'platform.latest', (p,))
     if r:
         result['version']           = r[0][0]
         result['download_url']      = r[0][1]
@@ -255,22 +257,18 @@ async def mysql_get_platform(pool, p):
 
 async def mysql_get_utxo(pool, address, asset):
     if asset.startswith('0x'): asset = asset[2:]
-    sql = "SELECT value,index_n,txid FROM utxos WHERE address='%s' AND asset='%s' AND status=1;" % (address,asset)
     result = []
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'utxos.unspent', (address,asset))
     for i in r:
         result.append({'value':i[0],'prevIndex':i[1],'prevHash':i[2][2:]})
     return result
 
-async def mysql_insert_one(pool, sql):
+async def mysql_insert_many(pool, name, data):
     conn, cur = await get_mysql_cursor(pool)
-    logging.info('SQL:%s' % sql)
     try:
-        await cur.execute(sql)
-        num = cur.rowcount
-        return num
+        return await query.executemany(cur, name, data)
     except Exception as e:
-        logger.error("mysql INSERT failure:{}".format(e.args[0]))
+        logging.error("mysql INSERT {} failure:{}".format(name, e.args[0]))
         sys.exit(1)
     finally:
         await pool.release(conn)
@@ -279,9 +277,9 @@ async def mysql_update_nep5(request, address):
     pool = request.app['pool']
     upt_height = request.app['cache'].get('height') - 1
     nep5 = get_all_nep5(request)
-    sql = "INSERT IGNORE INTO upt(address,asset,update_height) VALUES ('%s','%s',%s)"
-    data = [(address,n,upt_height) for n in nep5.keys()]
-    await asyncio.gather(*[mysql_insert_one(pool, sql % d) for d in data])
+    now = int(time.time())
+    data = [(address,n,upt_height,upt_height,now) for n in nep5.keys()]
+    await mysql_insert_many(pool, 'upt.add', data)
 
 def get_all_asset(request):
     return request.app['cache'].get('assets')
@@ -407,7 +405,7 @@ async def claim(net, address, request):
             [v['startIndex']-1 for v in claims.values() if v['startIndex'] != 0] + 
             [v['stopIndex']-1 for v in claims.values()]))
         heights.sort()
-        fees = await mysql_get_block_total_sys_fee(request.app['pool'], heights)
+        fees = await get_block_total_sys_fee(request, heights)
         return await Tool.compute_gas(claims, fees)
     return {'result':True, 'available':'0', 'unavailable':'0', 'claims':[]}
 
@@ -565,7 +563,7 @@ async def gas(net, request, *, publicKey, **kw):
             [v['startIndex']-1 for v in claims.values() if v['startIndex'] != 0] + 
             [v['stopIndex']-1 for v in claims.values()]))
         heights.sort()
-        fees = await mysql_get_block_total_sys_fee(request.app['pool'], heights)
+        fees = await get_block_total_sys_fee(request, heights)
         details = await Tool.compute_gas(claims, fees)
         tx,result,msg = Tool.claim_transaction(address, details)
     if result:
@@ -11,6 +11,8 @@ from decimal import Decimal as D
 from decimal import ROUND_DOWN, ROUND_UP
 from coreweb import get, post, options
 import logging
+from query import query
+from codec import codec
 logging.basicConfig(level=logging.DEBUG)
 from .decorator import *
 from .tools import Tool
@@ -96,34 +98,39 @@ async def get_mysql_cursor(pool):
     cur  = await conn.cursor()
     return conn, cur
 
-async def mysql_insert_one(pool, sql):
+async def mysql_insert_one(pool, name, args):
     conn, cur = await get_mysql_cursor(pool)
-    logging.info('SQL:%s' % sql)
     try:
-        await cur.execute(sql)
-        num = cur.rowcount
-        return num
+        return await query.execute(cur, name, args)
     except Exception as e:
-        logging.error("mysql INSERT failure:{}".format(e))
+        logging.error("mysql INSERT {} failure:{}".format(name, e))
         return 0
     finally:
         await pool.release(conn)
 
-async def mysql_query_one(pool, sql):
+async def mysql_insert_many(pool, name, data):
     conn, cur = await get_mysql_cursor(pool)
-    logging.info('SQL:%s' % sql)
     try:
-        await cur.execute(sql)
+        return await query.executemany(cur, name, data)
+    except Exception as e:
+        logging.error("mysql INSERT {} failure:{}".format(name, e))
+        return 0
+    finally:
+        await pool.release(conn)
+
+async def mysql_query_one(pool, name, args=None):
+    conn, cur = await get_mysql_cursor(pool)
+    try:
+        await query.execute(cur, name, args)
         return await cur.fetchall()
     except Exception as e:
-        logging.error("mysql QUERY failure:{}".format(e))
+        logging.error("mysql QUERY {} failure:{}".format(name, e))
         return None
     finally:
         await pool.release(conn)
 
 async def mysql_get_node_status(pool, address):
-    sql = "SELECT status,referrer,amount,days,referrals,performance,nodelevel,penalty,teamlevelinfo,burned,smallareaburned,signin,levelchange,teamcurlevelcount FROM node WHERE address = '%s';" % address
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'node.status', (address,))
     if r: return {
                 'status':r[0][0],
                 'referrer':r[0][1],
@@ -143,8 +150,7 @@ async def mysql_get_node_status(pool, address):
     return None
 
 async def mysql_get_node_referrals(pool, address, info=None):
-    sql = "SELECT address,amount,days,nodelevel,status FROM node WHERE referrer='%s';" % address
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'node.referrals', (address,))
     x = {'info':info,'referrals':[]}
     if r:
         for i in r:
@@ -155,14 +161,12 @@ async def mysql_get_node_referrals(pool, address, info=None):
     return x
 
 async def mysql_query_node_exist(pool, address):
-    sql = "SELECT address FROM node WHERE address='%s';" % address
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'node.exist', (address,))
     if r: return True
     return None
 
 async def mysql_query_node_status(pool, address):
-    sql = "SELECT status FROM node WHERE address='%s';" % address
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'node.status_code', (address,))
     if r:
         status = r[0][0]
         if status == -7: return 'UNLOCK_ENSURED'
@@ -174,14 +178,12 @@ async def mysql_query_node_status(pool, address):
     return None
 
 async def mysql_query_node_update_exist(pool, address):
-    sql = "SELECT operation FROM node_update WHERE address='%s';" % address
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'node_update.operation', (address,))
     if r: return UPDATE_STATUS[r[0][0]]
     return None
 
 async def mysql_node_can_unlock(pool, address):
-    sql = "SELECT status,days FROM node WHERE address='%s';" % address
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'node.days', (address,))
     if r:
         status,days = r[0][0],r[0][1]
         if status < 0: return False
@@ -190,8 +192,7 @@ async def mysql_node_can_unlock(pool, address):
     return False
 
 async def mysql_node_can_signin(pool, address):
-    sql = "SELECT status,days,signin FROM node WHERE address='%s';" % address
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'node.signin', (address,))
     if r:
         status,days,signin = r[0][0],r[0][1],r[0][2]
         if status >= 0 and status < days:
@@ -200,20 +201,17 @@ async def mysql_node_can_signin(pool, address):
     return None
 
 async def mysql_get_node_bonus_remain(pool, address):
-    sql = "SELECT remain FROM node_bonus WHERE address='%s' ORDER BY bonustime DESC limit 1;" % address
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'node_bonus.remain', (address,))
     if r: return r[0][0]
     return '0'
 
 async def mysql_get_node_bonus_history(pool, address, offset, length):
-    sql = "SELECT lockedbonus,referralsbonus,teambonus,signinbonus,amount,total,remain,bonustime FROM node_bonus WHERE address='%s' ORDER BY bonustime DESC limit %s,%s;" % (address, offset, length)
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'node_bonus.history', (address, offset, length))
     if r: return [{'lockedbonus':i[0],'referralsbonus':i[1],'teambonus':i[2],'signinbonus':i[3],'amount':i[4],'total':i[5],'remain':i[6],'bonustime':i[7]} for i in r]
     return []
 
 async def mysql_get_node_signinbonus_history(pool, address):
-    sql = "SELECT signinbonus,bonustime FROM node_bonus WHERE address='%s' ORDER BY bonustime DESC limit 31;" % address
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'node_bonus.signin', (address,))
     result = []
     if r:
         m = datetime.datetime.now().month
@@ -228,15 +226,13 @@ async def mysql_get_node_signinbonus_history(pool, address):
     return result
 
 async def mysql_get_nep5_asset_balance(pool, address, asset):
-    sql = "SELECT value FROM balance WHERE address='%s' AND asset='%s';" % (address, asset)
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'balance.get', (address, asset))
     if r: return r[0][0]
     return '0'
 
 async def mysql_get_utxo(pool, address, asset):
     if asset.startswith('0x'): asset = asset[2:]
-    sql = "SELECT value,index_n,txid FROM utxos WHERE address='%s' AND asset='%s' AND status=1;" % (address,asset)
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'utxos.unspent', (address,asset))
     if r: return [{'value':i[0],'prevIndex':i[1],'prevHash':i[2][2:]} for i in r]
     return []
 
@@ -274,9 +270,8 @@ async def mysql_freeze_utxo(request, txid):
     utxos = cache.get(txid, [])
     if utxos:
         pool = request.app['pool']
-        sql = "UPDATE utxos SET status=2 where txid='%s' and index_n=%s and status=1"
         data = [('0x'+u['prevHash'],u['prevIndex']) for u in utxos]
-        await asyncio.gather(*[mysql_insert_one(pool, sql % d) for d in data])
+        await mysql_insert_many(pool, 'utxos.freeze', data)
         cache.delete(txid)
 
 def get_now_timepoint():
@@ -284,29 +279,25 @@ def get_now_timepoint():
 
 async def mysql_node_update_new_node(pool, address, referrer, amount, days, txid, operation):
     timepoint = get_now_timepoint()
-    sql = "INSERT INTO node_update(address,operation,referrer,amount,days,txid,timepoint) VALUES ('%s',%s,'%s','%s',%s,'%s',%s)" % (address,operation,referrer,amount,days,txid,timepoint)
-    n = await mysql_insert_one(pool, sql)
+    n = await mysql_insert_one(pool, 'node_update.new', (address,operation,referrer,amount,days,txid,timepoint))
     if n: return True
     return False
 
 async def mysql_node_update_history_new_record(pool, address, referrer, amount, days, txid, operation):
     timepoint = get_now_timepoint()
-    sql = "INSERT INTO node_update_history(address,operation,referrer,amount,days,txid,timepoint) VALUES ('%s',%s,'%s','%s',%s,'%s',%s)" % (address,operation,referrer,amount,days,txid,timepoint)
-    n = await mysql_insert_one(pool, sql)
+    n = await mysql_insert_one(pool, 'node_update_history.new', (address,operation,referrer,amount,days,txid,timepoint))
     if n: return True
     return False
 
 async def mysql_node_update_unlock(pool, address):
     timepoint = get_now_timepoint()
-    sql = "INSERT INTO node_update(address,operation,timepoint) VALUES ('%s',2,%s)" % (address,timepoint)
-    n = await mysql_insert_one(pool, sql)
+    n = await mysql_insert_one(pool, 'node_update.unlock', (address,timepoint))
     if n: return True
     return False
 
 async def mysql_node_update_withdraw(pool, address, amount):
     timepoint = get_now_timepoint()
-    sql = "INSERT INTO node_update(address,operation,amount,timepoint) VALUES ('%s',3,'%s',%s);" % (address,amount,timepoint)
-    n = await mysql_insert_one(pool, sql)
+    n = await mysql_insert_one(pool, 'node_update.withdraw', (address,amount,timepoint))
     if n: return True
     return False
 
@@ -321,20 +312,17 @@ def get_withdraw_fee(amount,fee_rate):
     return fee
 
 async def mysql_get_node_withdraw_status_0(pool, address):
-    sql = "SELECT id,timepoint FROM node_withdraw where address='%s' and status=0;" % address
-    n = await mysql_query_one(pool, sql)
+    n = await mysql_query_one(pool, 'node_withdraw.pending', (address,))
     return n
 
 async def mysql_node_update_signin(pool, address):
     timepoint = get_now_timepoint()
-    sql = "INSERT INTO node_update(address,operation,timepoint) VALUES ('%s',4,%s);" % (address,timepoint)
-    n = await mysql_insert_one(pool, sql)
+    n = await mysql_insert_one(pool, 'node_update.signin', (address,timepoint))
     if n: return True
     return False
 
 async def mysql_node_signature_add(pool, address, signature):
-    sql = "INSERT INTO node_signature(address,signature) VALUES ('%s','%s');" % (address, signature)
-    n = await mysql_insert_one(pool, sql)
+    n = await mysql_insert_one(pool, 'node_signature.add', (address, signature))
     if n: return True
     return False
 
@@ -345,7 +333,7 @@ async def send_raw_transaction(tx, request):
         if 200 != resp.status:
             logging.error('Unable to visit %s %s' % (request.app['neo_uri'], method))
             return False,'404'
-        j = await resp.json()
+        j = codec.loads(await resp.read())
         if 'error' in j.keys():
             logging.error('result error when %s %s' % (request.app['neo_uri'], method))
             return False, j['error']['message']
@@ -9,6 +9,8 @@ from decimal import Decimal as D
 from coreweb import get, post, options
 from .tools import Tool, check_decimal, sci_to_str, big_or_little
 import logging
+from query import query
+from codec import codec
 logging.basicConfig(level=logging.DEBUG)
 
 
@@ -50,7 +52,7 @@ async def get_rpc_ont(request,method,params):
             msg = 'Unable to visit %s %s' % (request.app['ont_uri'], method)
             logging.error(msg)
             return None,msg
-        j = await resp.json()
+        j = codec.loads(await resp.read())
         if 'SUCCESS' != j['desc']:
             msg = 'result error when %s %s:%s' % (request.app['ont_uri'], method, j['error'])
             logging.error(msg)
@@ -72,21 +74,19 @@ async def get_mysql_cursor(pool):
     cur  = await conn.cursor()
     return conn, cur
 
-async def mysql_query_one(pool, sql):
+async def mysql_query_one(pool, name, args=None, n=None):
     conn, cur = await get_mysql_cursor(pool)
-    logging.info('SQL:%s' % sql)
     try:
-        await cur.execute(sql)
+        await query.execute(cur, name, args, n)
         return await cur.fetchall()
     except Exception as e:
-        logging.error("mysql QUERY failure:{}".format(e.args[0]))
+        logging.error("mysql QUERY {} failure:{} args:{}".format(name, e.args[0], args))
         sys.exit(1)
     finally:
         await pool.release(conn)
 
 async def mysql_get_oep4_balance(pool, address, asset):
-    sql = "SELECT value FROM balance WHERE address='%s' AND asset='%s';" % (address, asset)
-    r = await mysql_query_one(pool, sql)
+    r = await mysql_query_one(pool, 'balance.get', (address, asset))
     if r: return r[0][0]
     return '0'
 
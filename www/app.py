@@ -11,13 +11,15 @@ import aiomysql
 from cacheout import Cache
 import os
 import sys
-import json
 import time
 from pytz import utc
 from aiohttp import web
-from random import randint
 from datetime import datetime
 from coreweb import add_routes
+from rpcpool import RpcPool
+from query import query
+from codec import codec
+from sysfee import SysFee
 from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv(), override=True)
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -66,6 +68,9 @@ get_listen_ip = lambda:os.environ.get('LISTENIP')
 get_listen_port = lambda:os.environ.get('LISTENPORT')
 get_net = lambda:os.environ.get('NET')
 get_ont_genesis_block_timestamp = lambda:int(os.environ.get('ONTGENESISBLOCKTIMESTAMP'))
+get_slow_query = lambda:float(os.environ.get('SLOWQUERY') or 1)
+get_json_codec = lambda:os.environ.get('JSONCODEC')
+get_sys_fee_file = lambda:os.environ.get('SYSFEEFILE')
 
 
 async def get_mysql_cursor(pool):
@@ -91,7 +96,7 @@ async def get_block_count(app):
         if 200 != resp.status:
             logging.error('Unable to fetch blockcount')
             sys.exit(1)
-        j = await resp.json()
+        j = codec.loads(await resp.read())
         return j['result']
 
 async def get_super_node_info(app):
@@ -99,21 +104,20 @@ async def get_super_node_info(app):
         if 200 != resp.status:
             logging.error('Unable to fetch supernode info')
             sys.exit(1)
-        j = await resp.json()
+        j = codec.loads(await resp.read())
         return j
 
 async def update_neo_uri(app):
-    heightA = await get_block_count(app)
     info = await get_super_node_info(app)
-    heightB = info['height']
-    if heightA < heightB:
-        app['neo_uri'] = info['fast'][randint(0,len(info['fast'])-1)]
-    logging.info('heightA:%s heightB:%s neo_uri:%s' % (heightA,heightB,app['neo_uri']))
+    for uri in info['fast']: app['rpc_pool'].add(uri)
+    await app['rpc_pool'].refresh()
+    app['neo_uri'] = app['rpc_pool'].best()
+    logging.info('supernode height:%s neo_uri:%s endpoints:%s' % (info['height'],app['neo_uri'],app['rpc_pool'].stats()))
 
 async def get_height(pool, name):
     conn, cur = await get_mysql_cursor(pool)
     try:
-        await cur.execute("select update_height from status where name='%s';" % name)
+        await query.execute(cur, 'status.get', (name,))
         result = await cur.fetchone()
         if result:
             uh = result[0]
@@ -138,10 +142,23 @@ async def update_height(pool, cache):
     if old is None or int(old) < height:
         cache.set('height',height)
 
+async def update_sys_fee(pool, sys_fee):
+    '''append the heights of block not in sys_fee yet'''
+    conn, cur = await get_mysql_cursor(pool)
+    try:
+        while True:
+            await query.execute(cur, 'block.total_sys_fees', (len(sys_fee), 100000))
+            rows = await cur.fetchall()
+            if not rows or sys_fee.extend(rows) < len(rows): break
+    except Exception as e:
+        logging.error("mysql SELECT failure:{}".format(e.args[0]))
+    finally:
+        await pool.release(conn)
+
 async def get_asset_state(pool):
     conn, cur = await get_mysql_cursor(pool)
     try:
-        await cur.execute("select update_height from status where name='asset';")
+        await query.execute(cur, 'status.get', ('asset',))
         result = await cur.fetchone()
         if result:
             uh = result[0]
@@ -164,7 +181,7 @@ async def update_assets(pool, cache):
     assets = {'state':state, 'GLOBAL':{}, 'NEP5':{}, 'ONTNATIVE':{}, 'OEP4':{}}
     conn, cur = await get_mysql_cursor(pool)
     try:
-        await cur.execute("select asset,type,name,symbol,decimals from assets;")
+        await query.execute(cur, 'assets.all')
         result = await cur.fetchall()
         if result:
             for r in result:
@@ -192,8 +209,7 @@ async def update_seas_price(pool, cache):
     seas = 'de7be47c4c93f1483a0a3fff556a885a68413d97'
     conn, cur = await get_mysql_cursor(pool)
     try:
-        sql = "SELECT price FROM node_price WHERE asset='%s';" % (seas)
-        await cur.execute(sql)
+        await query.execute(cur, 'node_price.get', (seas,))
         result = await cur.fetchone()
         if result: price = result[0]
         else: price = '0'
@@ -206,6 +222,7 @@ async def update_seas_price(pool, cache):
 
 async def init_cache(app):
     await update_height(app['pool'], app['cache'])
+    await update_sys_fee(app['pool'], app['sys_fee'])
     await update_assets(app['pool'], app['cache'])
     #await update_seas_price(app['pool'], app['cache'])
 
@@ -219,7 +236,7 @@ async def data_factory(app, handler):
     async def parse_data(request):
         if request.method == 'POST':
             if request.content_type.startswith('application/json'):
-                request.__data__ = await request.json()
+                request.__data__ = codec.loads(await request.read())
                 logging.info('request json: %s' % str(request.__data__))
             elif request.content_type.startswith('application/x-www-form-urlencoded'):
                 request.__data__ = await request.post()
@@ -249,7 +266,7 @@ async def response_factory(app, handler):
         if isinstance(r, dict):
             template = r.get('__template__')
             if template is None:
-                resp = web.Response(body=json.dumps(r, ensure_ascii=False, default=lambda o:o.__dict__).encode('utf-8'))
+                resp = web.Response(body=codec.dumps(r))
                 resp.content_type = 'Application/json;charset=utf-8'
                 resp.headers["access-control-allow-origin"] = "*"
                 resp.headers["Access-Control-Allow-Headers"] = "x-requested-with"
@@ -291,12 +308,16 @@ async def init(loop):
     listen_port = get_listen_port()
     super_node_uri = get_super_node_uri()
     app['pool'] = await get_mysql_pool(mysql_args)
+    query.slow = get_slow_query()
+    codec.use(get_json_codec())
     app['session'] = aiohttp.ClientSession(loop=loop,connector_owner=False)
     app['neo_uri'] = neo_uri
+    app['rpc_pool'] = RpcPool(app['session'], [neo_uri])
     app['ont_uri'] = ont_uri
     app['net'] = get_net()
     app['super_node_uri'] = super_node_uri
     app['cache'] = Cache(maxsize=0)
+    app['sys_fee'] = SysFee(get_sys_fee_file())
     await init_cache(app)
     app['ont_genesis_block_timestamp'] = get_ont_genesis_block_timestamp()
     app['gasaddress'] = get_gas_address()
@@ -307,7 +328,9 @@ async def init(loop):
                     'max_instances': 1,
         })
     scheduler.add_job(update_height, 'interval', seconds=2, args=[app['pool'], app['cache']], id='update_height', timezone=utc)
+    scheduler.add_job(update_sys_fee, 'interval', seconds=2, args=[app['pool'], app['sys_fee']], id='update_sys_fee', timezone=utc)
     scheduler.add_job(update_neo_uri, 'interval', seconds=20, args=[app], id='update_neo_uri', timezone=utc)
+    scheduler.add_job(query.log, 'interval', seconds=60, args=[], id='log_queries', timezone=utc)
     scheduler.add_job(update_assets, 'interval', seconds=120, args=[app['pool'], app['cache']], id='update_assets', timezone=utc)
     #scheduler.add_job(update_seas_price, 'interval', seconds=20, args=[app['pool'], app['cache']], id='update_seas_price', timezone=utc)
     scheduler._logger = logging
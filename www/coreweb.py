@@ -9,6 +9,7 @@ from urllib import parse
 from aiohttp import web
 
 from apis import APIError
+from codec import codec
 
 
 def get(path):
@@ -109,7 +110,7 @@ class RequestHandler(object):
                     return web.HTTPBadRequest('Missing Content-Type.')
                 ct = request.content_type.lower()
                 if ct.startswith('application/json'):
-                    params = await request.json()
+                    params = codec.loads(await request.read())
                     if not isinstance(params, dict):
                         return web.HTTPBadRequest('JSON body must be object.')
                     kw = params
@@ -0,0 +1,104 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import time
+import logging
+
+
+class Query:
+    '''
+    named, parameterized statements for the handlers, same scheme as
+    sync/Query.py: values are bound by the driver, "{}" is an IN list
+    expanded to n placeholders and cached per (name, n), executemany on an
+    INSERT ... VALUES (%s,...) statement becomes multi-row INSERTs.
+    every call is timed per name, calls slower than slow seconds are logged.
+    '''
+    def __init__(self, statements, slow=1.0):
+        self.statements = statements
+        self.slow = slow
+        self.cache = {}
+        self.stats = {} #name -> [calls, rows, seconds, max seconds]
+
+    def sql(self, name, n=None):
+        if n is None: return self.statements[name]
+        key = (name, n)
+        s = self.cache.get(key)
+        if s is None:
+            s = self.cache[key] = self.statements[name].format(','.join(['%s'] * n))
+        return s
+
+    def record(self, name, cost, rows, args=None):
+        s = self.stats.get(name)
+        if s is None: s = self.stats[name] = [0, 0, 0.0, 0.0]
+        s[0] += 1
+        s[1] += rows
+        s[2] += cost
+        if cost > s[3]: s[3] = cost
+        if cost > self.slow:
+            logging.warning('slow query %s %.3fs %s rows: %s %s' % (name, cost, rows, self.statements[name], '' if args is None else str(args)[:200]))
+
+    async def execute(self, cur, name, args=None, n=None):
+        sql = self.sql(name, n)
+        time_a = time.time()
+        try:
+            await cur.execute(sql, args)
+        finally:
+            self.record(name, time.time() - time_a, max(cur.rowcount, 0), args)
+        return cur.rowcount
+
+    async def executemany(self, cur, name, seq):
+        if not seq: return 0
+        time_a = time.time()
+        try:
+            await cur.executemany(self.statements[name], seq)
+        finally:
+            self.record(name, time.time() - time_a, len(seq))
+        return cur.rowcount
+
+    def log(self):
+        top = sorted(self.stats.items(), key=lambda kv: kv[1][2], reverse=True)[:10]
+        if not top: return
+        logging.info('queries: %s' % ', '.join('%s calls=%s rows=%s total=%.3fs max=%.3fs' % ((name,) + tuple(s)) for name,s in top))
+
+
+STATEMENTS = {
+    'status.get':               "SELECT update_height FROM status WHERE name=%s;",
+    'assets.all':               "SELECT asset,type,name,symbol,decimals FROM assets;",
+    'node_price.get':           "SELECT price FROM node_price WHERE asset=%s;",
+    'block.get':                "SELECT sys_fee,total_sys_fee FROM block WHERE height=%s;",
+    'block.total_sys_fee':      "SELECT height,total_sys_fee FROM block WHERE height IN ({});",
+    'block.total_sys_fees':     "SELECT height,total_sys_fee FROM block WHERE height>=%s ORDER BY height LIMIT %s;",
+    'balance.by_address':       "SELECT asset,value FROM balance WHERE address=%s;",
+    'balance.get':              "SELECT value FROM balance WHERE address=%s AND asset=%s;",
+    'balance.ranks_count':      "SELECT count(address) FROM balance WHERE asset=%s AND value<>'0';",
+    'balance.ranks':            "SELECT address,value FROM balance WHERE asset=%s AND value<>'0' ORDER BY --value DESC LIMIT %s,%s;",
+    'utxos.unclaimed':          "SELECT txid,index_n,height,spent_txid,spent_height,value,status FROM utxos WHERE address=%s AND asset=%s AND claim_height IS NULL;",
+    'utxos.unspent':            "SELECT value,index_n,txid FROM utxos WHERE address=%s AND asset=%s AND status=1;",
+    'utxos.freeze':             "UPDATE utxos SET status=2 WHERE txid=%s AND index_n=%s AND status=1;",
+    'history.by_address':       "SELECT txid,timepoint,operation,value,asset FROM history WHERE address=%s ORDER BY timepoint DESC LIMIT %s,%s;",
+    'history.by_asset':         "SELECT txid,timepoint,operation,value,asset FROM history WHERE address=%s AND asset=%s ORDER BY timepoint DESC LIMIT %s,%s;",
+    'oep4_history.by_asset':    "SELECT txid,timepoint,operation,value,asset FROM oep4_history WHERE address=%s AND asset=%s ORDER BY timepoint DESC LIMIT %s,%s;",
+    'platform.latest':          "SELECT version,download_url,force_update,sha1,sha256,release_time,update_notes_zh,update_notes_en FROM platform WHERE name=%s ORDER BY release_time DESC LIMIT 1;",
+    'upt.add':                  "INSERT INTO upt(address,asset,update_height,since,requested) VALUES (%s,%s,%s,%s,%s) ON DUPLICATE KEY UPDATE requested=VALUES(requested);",
+    'node.status':              "SELECT status,referrer,amount,days,referrals,performance,nodelevel,penalty,teamlevelinfo,burned,smallareaburned,signin,levelchange,teamcurlevelcount FROM node WHERE address=%s;",
+    'node.referrals':           "SELECT address,amount,days,nodelevel,status FROM node WHERE referrer=%s;",
+    'node.exist':               "SELECT address FROM node WHERE address=%s;",
+    'node.status_code':         "SELECT status FROM node WHERE address=%s;",
+    'node.days':                "SELECT status,days FROM node WHERE address=%s;",
+    'node.signin':              "SELECT status,days,signin FROM node WHERE address=%s;",
+    'node_bonus.remain':        "SELECT remain FROM node_bonus WHERE address=%s ORDER BY bonustime DESC LIMIT 1;",
+    'node_bonus.history':       "SELECT lockedbonus,referralsbonus,teambonus,signinbonus,amount,total,remain,bonustime FROM node_bonus WHERE address=%s ORDER BY bonustime DESC LIMIT %s,%s;",
+    'node_bonus.signin':        "SELECT signinbonus,bonustime FROM node_bonus WHERE address=%s ORDER BY bonustime DESC LIMIT 31;",
+    'node_update.operation':    "SELECT operation FROM node_update WHERE address=%s;",
+    'node_update.new':          "INSERT INTO node_update(address,operation,referrer,amount,days,txid,timepoint) VALUES (%s,%s,%s,%s,%s,%s,%s);",
+    'node_update.unlock':       "INSERT INTO node_update(address,operation,timepoint) VALUES (%s,2,%s);",
+    'node_update.withdraw':     "INSERT INTO node_update(address,operation,amount,timepoint) VALUES (%s,3,%s,%s);",
+    'node_update.signin':       "INSERT INTO node_update(address,operation,timepoint) VALUES (%s,4,%s);",
+    'node_update_history.new':  "INSERT INTO node_update_history(address,operation,referrer,amount,days,txid,timepoint) VALUES (%s,%s,%s,%s,%s,%s,%s);",
+    'node_withdraw.pending':    "SELECT id,timepoint FROM node_withdraw WHERE address=%s AND status=0;",
+    'node_signature.add':       "INSERT INTO node_signature(address,signature) VALUES (%s,%s);",
+}
+
+query = Query(STATEMENTS)
@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import time
+import asyncio
+import logging
+from collections import deque
+from codec import codec
+
+
+class Endpoint:
+    LATENCY_SAMPLES = 64
+
+    def __init__(self, uri):
+        self.uri = uri
+        self.height = 0
+        self.latencies = deque(maxlen=self.LATENCY_SAMPLES)
+        self.errors = 0
+        self.failures = 0 #consecutive
+        self.ejected_until = 0
+
+    def percentile(self, p):
+        if not self.latencies: return 0
+        s = sorted(self.latencies)
+        return s[min(len(s)-1, int(len(s)*p))]
+
+    def healthy(self, now):
+        return now >= self.ejected_until
+
+    def stats(self):
+        return {'uri':self.uri, 'height':self.height, 'p50':round(self.percentile(0.5), 6),
+                'p99':round(self.percentile(0.99), 6), 'errors':self.errors, 'ejected':not self.healthy(time.time())}
+
+
+class RpcPool:
+    '''keep height/latency/failures of every node, the best healthy one serves app['neo_uri']'''
+    def __init__(self, session, uris, timeout=5, backoff=20, max_backoff=600):
+        self.session = session
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.endpoints = {}
+        for uri in uris: self.add(uri)
+
+    def add(self, uri):
+        if uri not in self.endpoints.keys():
+            self.endpoints[uri] = Endpoint(uri)
+
+    async def probe(self, e):
+        time_a = time.time()
+        try:
+            async with self.session.post(e.uri, timeout=self.timeout,
+                    json={'jsonrpc':'2.0','method':'getblockcount','params':[],'id':1}) as resp:
+                if 200 != resp.status: raise ValueError('http status %s' % resp.status)
+                j = codec.loads(await resp.read())
+                e.height = j['result']
+            e.latencies.append(time.time() - time_a)
+            e.failures = 0
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            e.errors += 1
+            e.failures += 1
+            e.ejected_until = time.time() + min(self.max_backoff, self.backoff * 2 ** (e.failures - 1))
+            logging.warning('rpc endpoint %s failure(%s in a row): %s' % (e.uri, e.failures, ex))
+
+    async def refresh(self):
+        now = time.time()
+        endpoints = [e for e in self.endpoints.values() if e.healthy(now)]
+        if endpoints: await asyncio.gather(*[self.probe(e) for e in endpoints])
+
+    def best(self):
+        '''highest height first, then lowest p50 + p99/10'''
+        now = time.time()
+        candidates = [e for e in self.endpoints.values() if e.healthy(now)]
+        if not candidates: candidates = list(self.endpoints.values())
+        return max(candidates, key=lambda e:(e.height, -(e.percentile(0.5) + e.percentile(0.99) / 10))).uri
+
+    def stats(self):
+        return [e.stats() for e in self.endpoints.values()]
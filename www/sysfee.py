@@ -0,0 +1,66 @@
+#! /usr/bin/env python3
+# coding: utf-8
+# flow@SEA
+# Licensed under the MIT License.
+
+import os
+import fcntl
+from array import array
+
+
+class SysFee:
+    '''
+    total_sys_fee of every height from 0, as array('Q'): get(height) is a
+    list lookup. the block table is append-only, so is this; extend takes
+    (height, total_sys_fee) rows in height order and stops at a gap.
+    with a path the array is mirrored to a file of native 8 byte records
+    shared on the host: the utxo crawler and www append to it under flock,
+    each picks up what the others appended with sync(). a partial record
+    left by a crash is cut off by the next extend. same as
+    sync/SysFee.py.
+    '''
+    def __init__(self, path=None):
+        self.path = path
+        self.totals = array('Q')
+        self.fd = None
+        if path:
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+            self.sync()
+
+    def __len__(self):
+        return len(self.totals)
+
+    def sync(self):
+        '''read the records appended to the file since the last call'''
+        if self.fd is None: return
+        size = os.fstat(self.fd).st_size // self.totals.itemsize * self.totals.itemsize
+        offset = len(self.totals) * self.totals.itemsize
+        if size > offset: self.totals.frombytes(os.pread(self.fd, size - offset, offset))
+
+    def get(self, height):
+        '''None when height is not known yet'''
+        if -1 == height: return 0
+        if height >= len(self.totals): self.sync()
+        if 0 <= height < len(self.totals): return self.totals[height]
+        return None
+
+    def extend(self, rows):
+        '''rows of (height, total_sys_fee) by height, returns how many were new'''
+        if self.fd is not None: fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            self.sync()
+            start = len(self.totals)
+            for height, total in rows:
+                if height < len(self.totals): continue
+                if height > len(self.totals): break
+                self.totals.append(total)
+            if self.fd is not None and len(self.totals) > start:
+                os.ftruncate(self.fd, start * self.totals.itemsize) #appends stay aligned
+                os.write(self.fd, self.totals[start:].tobytes())
+            return len(self.totals) - start
+        finally:
+            if self.fd is not None: fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def close(self):
+        if self.fd is not None: os.close(self.fd)
+        self.fd = None